@@ -1,415 +1,460 @@
 """
 API сервер для обработки webhook-запросов от Google Таблиц.
-Принимает запросы с темой, запускает агентов асинхронно и возвращает статус.
+Принимает запросы с темой, ставит задачу в очередь и возвращает статус.
+Генерацию выполняет worker.py, поэтому API не импортирует crewai и langchain
+(crews.py) и запускается быстро, см. importtime_check.py.
 """
 import os
+import io
+import csv
+import json
+import time
+import uuid
+import queue
+import base64
+import hashlib
 import logging
+import functools
 from datetime import datetime
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify
-from crewai import Agent, Task, Crew, Process
-from crewai.tools import tool
-from langchain_openai import ChatOpenAI
-import requests
-import psycopg2
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+from flask import Flask, Response, request, jsonify, stream_with_context
+from db import get_db_connection, create_task_with_key, create_tasks_in_db, pool_stats
+from response_cache import get_response_cache
+from task_events import get_task_event_hub
+from crew_metrics import load_run_aggregates
+from queue_metrics import queue_stats, queue_metric_families
+from prometheus import MetricFamily, render, CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE
+from logging_setup import configure_logging
 
 # Загружаем переменные окружения из .env файла
 load_dotenv(override=True)
 
+# Настройка логирования (logging_setup.py) - после .env, чтобы учитывались LOG_*
+configure_logging('api')
+logger = logging.getLogger(__name__)
+
 # Создаем Flask приложение
 app = Flask(__name__)
 
-# Создаем LLM для OpenAI
-openai_llm = ChatOpenAI(
-    model='gpt-4o-mini',
-    temperature=0.7
-)
-
-
-def get_db_connection():
-    """Получает подключение к Supabase PostgreSQL."""
-    database_url = os.getenv('DATABASE_URL')
-    if not database_url:
-        raise ValueError("DATABASE_URL not found in environment variables")
-    return psycopg2.connect(database_url)
+# Максимальная длина ключа идемпотентности
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
 
 
-def save_to_db(topic: str, content: str, author: str = None, date: str = None):
-    """Сохраняет результат генерации в Supabase."""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO blog_posts (topic, author, date, content, status)
-            VALUES (%s, %s, %s, %s, 'completed')
-            RETURNING id
-        ''', (topic, author, date, str(content)))
-        post_id = cursor.fetchone()[0]
-        conn.commit()
-        cursor.close()
-        conn.close()
-        logger.info(f"✅ Результат сохранен в Supabase с ID: {post_id}")
-        return post_id
-    except Exception as e:
-        logger.error(f"❌ Ошибка при сохранении в БД: {str(e)}", exc_info=True)
-        raise
+def validate_task_item(item):
+    """
+    Проверяет задачу из запроса: тело /webhook/start-blogpost или элемент пачки /webhook/start-blogposts.
 
+    Returns:
+        Кортеж (topic, author, date)
 
-def create_task_in_db(topic: str, author: str = None, date: str = None):
-    """Создает задачу со статусом 'pending' в Supabase."""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO blog_posts (topic, author, date, content, status)
-            VALUES (%s, %s, %s, '', 'pending')
-            RETURNING id
-        ''', (topic, author, date))
-        task_id = cursor.fetchone()[0]
-        conn.commit()
-        cursor.close()
-        conn.close()
-        logger.info(f"✅ Задача создана в Supabase с ID: {task_id}, тема: '{topic}'")
-        return task_id
-    except Exception as e:
-        logger.error(f"❌ Ошибка при создании задачи в БД: {str(e)}", exc_info=True)
-        raise
+    Raises:
+        ValueError: с описанием ошибки для ответа клиенту
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Item must be an object")
+    topic = item.get('topic')
+    if topic is None:
+        raise ValueError("Missing required field 'topic'")
+    if not isinstance(topic, str):
+        raise ValueError("Field 'topic' must be a string")
+    if not topic.strip():
+        raise ValueError("Field 'topic' cannot be empty")
+    for field in ('author', 'date'):
+        if item.get(field) is not None and not isinstance(item[field], str):
+            raise ValueError(f"Field '{field}' must be a string")
+    return topic.strip(), item.get('author'), item.get('date')
 
 
-def get_pending_task():
-    """Получает первую задачу со статусом 'pending' из Supabase."""
+@app.route('/webhook/start-blogpost', methods=['POST'])
+def start_blogpost():
+    """
+    POST эндпоинт для запуска генерации блог-поста.
+    
+    Ожидает JSON: {'topic': '...', 'author': '...', 'date': '...'}
+    Возвращает: {'status': 'started'} со статусом 200
+    
+    Необязательный ключ идемпотентности (заголовок Idempotency-Key или поле
+    idempotency_key): повтор запроса с тем же ключом, например ретрай Apps Script
+    по таймауту, возвращает исходный task_id со статусом 'duplicate' без новой задачи.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, topic, author, date, created_at
-            FROM blog_posts
-            WHERE status = 'pending'
-            ORDER BY created_at ASC
-            LIMIT 1
-        ''')
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        # Получаем JSON данные из запроса (не JSON - None, а не исключение)
+        data = request.get_json(silent=True)
+        
+        # Тело запроса целиком - только на уровне DEBUG
+        logger.debug(f"📥 Получен новый запрос: {data}")
+        
+        # Те же проверки, что у элементов пачки в /webhook/start-blogposts
+        try:
+            topic, author, date = validate_task_item(data if data is not None else {})
+        except ValueError as e:
+            logger.warning(f"⚠️ Некорректный запрос: {str(e)}")
+            return jsonify({'error': str(e)}), 400
+        
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        if idempotency_key is not None and (not isinstance(idempotency_key, str)
+                                            or len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH):
+            return jsonify({'error': f"Idempotency key must be a string up to {IDEMPOTENCY_KEY_MAX_LENGTH} characters"}), 400
+        
+        # Создаем задачу в БД со статусом 'pending' (или находим созданную по ключу)
+        task_id, created = create_task_with_key(topic, author, date, idempotency_key)
+        
+        if created:
+            logger.info(f"✅ Задача создана с ID: {task_id} для темы: '{topic}'",
+                        extra={'task_id': task_id, 'author': author, 'date': date})
+        
+        # Сразу возвращаем успешный ответ
+        return jsonify({
+            'status': 'started' if created else 'duplicate',
+            'task_id': task_id,
+            'events_url': f'/webhook/tasks/{task_id}/events'
+        }), 200
         
-        if row:
-            return {
-                'id': row[0],
-                'topic': row[1],
-                'author': row[2],
-                'date': row[3],
-                'created_at': row[4]
-            }
-        return None
-    except Exception as e:
-        logger.error(f"❌ Ошибка при получении задачи из БД: {str(e)}", exc_info=True)
-        return None
-
-
-def update_task_status(task_id: int, status: str):
-    """Обновляет статус задачи в Supabase."""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE blog_posts
-            SET status = %s
-            WHERE id = %s
-        ''', (status, task_id))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        logger.info(f"✅ Статус задачи {task_id} обновлен на '{status}'")
     except Exception as e:
-        logger.error(f"❌ Ошибка при обновлении статуса задачи {task_id}: {str(e)}", exc_info=True)
-        raise
+        logger.error(f"❌ Ошибка при обработке запроса: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
 
 
-def update_task_result(task_id: int, content: str, status: str = 'completed'):
-    """Обновляет content и status задачи в Supabase."""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE blog_posts
-            SET content = %s, status = %s
-            WHERE id = %s
-        ''', (str(content), status, task_id))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        logger.info(f"✅ Результат задачи {task_id} обновлен, статус: '{status}'")
-    except Exception as e:
-        logger.error(f"❌ Ошибка при обновлении результата задачи {task_id}: {str(e)}", exc_info=True)
-        raise
+# Максимальное количество задач в одном запросе /webhook/start-blogposts
+BULK_MAX_TASKS = int(os.getenv('BULK_MAX_TASKS', 500))
 
 
-@tool("Поиск в интернете")
-def serper_search(query: str) -> str:
-    """Поиск актуальных новостей и информации в интернете через Serper API."""
-    api_key = os.getenv('SERPER_API_KEY')
-    if not api_key:
-        return "Ошибка: API ключ Serper не найден. Проверьте файл .env"
+@app.route('/webhook/start-blogposts', methods=['POST'])
+def start_blogposts():
+    """
+    POST эндпоинт для запуска генерации пачки блог-постов одним запросом.
     
-    url = "https://google.serper.dev/search"
-    headers = {
-        'X-API-KEY': api_key,
-        'Content-Type': 'application/json'
-    }
-    payload = {
-        'q': query,
-        'num': 10
-    }
+    Ожидает JSON: {'tasks': [{'topic': '...', 'author': '...', 'date': '...'}, ...]}
+    или сразу массив таких объектов. Все корректные элементы создаются одним INSERT;
+    некорректные не мешают остальным и возвращаются с ошибкой.
     
+    Returns:
+        JSON со списком task_ids и результатом по каждому элементу (index и task_id
+        или error); 400 если корректных элементов нет
+    """
     try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        data = response.json()
+        data = request.get_json(silent=True)
+        items = data.get('tasks') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': "Expected a non-empty JSON array of tasks or {'tasks': [...]}"}), 400
+        if len(items) > BULK_MAX_TASKS:
+            return jsonify({'error': f"Too many tasks: {len(items)} (max {BULK_MAX_TASKS})"}), 400
+        
+        logger.info(f"📥 Получена пачка задач: {len(items)}")
         
-        # Форматируем результаты
         results = []
-        if 'organic' in data:
-            for item in data['organic'][:5]:  # Берем первые 5 результатов
-                title = item.get('title', 'Без названия')
-                link = item.get('link', '')
-                snippet = item.get('snippet', '')
-                results.append(f"Название: {title}\nСсылка: {link}\nОписание: {snippet}\n")
-        
-        return "\n".join(results) if results else "Результаты поиска не найдены"
+        valid = []
+        for index, item in enumerate(items):
+            try:
+                valid.append((index, validate_task_item(item)))
+            except ValueError as e:
+                results.append({'index': index, 'error': str(e)})
+        
+        if not valid:
+            logger.warning("⚠️ В пачке нет ни одной корректной задачи")
+            return jsonify({'status': 'rejected', 'task_ids': [], 'created': 0,
+                            'failed': len(results), 'results': results}), 400
+        
+        task_ids = create_tasks_in_db([task for _, task in valid])
+        for (index, _), task_id in zip(valid, task_ids):
+            results.append({'index': index, 'task_id': task_id})
+        results.sort(key=lambda result: result['index'])
+        
+        failed = len(items) - len(task_ids)
+        if failed:
+            logger.warning(f"⚠️ Пропущено некорректных задач: {failed}")
+        logger.info(f"✅ Создано задач: {len(task_ids)}")
+        
+        return jsonify({
+            'status': 'started',
+            'task_ids': task_ids,
+            'created': len(task_ids),
+            'failed': failed,
+            'results': results
+        }), 200
+        
     except Exception as e:
-        return f"Ошибка при поиске: {str(e)}"
+        logger.error(f"❌ Ошибка при обработке пачки задач: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
 
+# Поля, которые можно запросить у списковых эндпоинтов через ?fields=
+LIST_FIELDS = ('id', 'topic', 'author', 'date', 'created_at', 'status', 'excerpt', 'content')
+# Поля по умолчанию: то, что показывает таблица истории, без тела поста
+DEFAULT_LIST_FIELDS = ('id', 'topic', 'author', 'date', 'created_at', 'status')
 
-def create_research_crew(topic: str, llm):
+
+def parse_fields(raw: str, default=DEFAULT_LIST_FIELDS):
     """
-    Создает Crew для исследования заданной темы и написания блог-поста.
-    
-    Args:
-        topic: Тема для поиска новостей и написания блог-поста
-        llm: LLM объект для использования агентами
-    
-    Returns:
-        Crew объект готовый к выполнению
-    """
-    # Создаем агента-исследователя
-    researcher = Agent(
-        role='Исследователь новостей',
-        goal=f'Найти актуальные и релевантные новости про {topic} в интернете',
-        backstory=f'''Ты опытный исследователь, специализирующийся на поиске и анализе 
-        информации в интернете. Ты умеешь находить самые свежие и важные новости 
-        по теме "{topic}", анализировать их и предоставлять структурированную информацию.''',
-        verbose=True,
-        allow_delegation=False,
-        tools=[serper_search],
-        llm=llm
-    )
-    
-    # Создаем агента-писателя
-    writer = Agent(
-        role='Блог-писатель',
-        goal=f'Написать интересный и информативный пост для блога на русском языке о теме "{topic}" на основе найденных новостей',
-        backstory='''Ты талантливый блог-писатель, который специализируется на 
-        написании информативных статей. Ты умеешь структурировать информацию, 
-        делать ее понятной для широкой аудитории и писать увлекательные тексты 
-        на русском языке.''',
-        verbose=True,
-        allow_delegation=False,
-        llm=llm
-    )
-    
-    # Создаем задачу для исследования
-    research_task = Task(
-        description=f'''Найди в интернете последние новости (за последние 1-2 недели) 
-        про {topic}. Собери информацию о 3-5 самых интересных и важных новостях. 
-        Включи в результат:
-        - Название новости
-        - Источник и дату публикации
-        - Краткое описание содержания
-        - Почему эта новость важна''',
-        agent=researcher,
-        expected_output=f'Структурированный список из 3-5 новостей про {topic} с названиями, источниками, датами и описаниями'
-    )
-    
-    # Создаем задачу для написания поста
-    writing_task = Task(
-        description=f'''Используй результаты исследования новостей про {topic}, чтобы 
-        написать короткий блог-пост на русском языке. Пост должен быть:
-        - Информативным и интересным
-        - Структурированным (с заголовком и несколькими абзацами)
-        - Написанным для широкой аудитории
-        - Объемом примерно 300-500 слов
-        - Включать ключевые моменты из найденных новостей
-        - Основанным на информации, которую собрал исследователь''',
-        agent=writer,
-        context=[research_task],
-        expected_output=f'Полноценный блог-пост на русском языке объемом 300-500 слов про {topic} с заголовком и структурированным содержанием'
-    )
-    
-    # Создаем crew (команду)
-    crew = Crew(
-        agents=[researcher, writer],
-        tasks=[research_task, writing_task],
-        process=Process.sequential,
-        verbose=True
-    )
-    
-    return crew
+    Разбирает параметр fields (через запятую) в список колонок; пустой - default.
 
+    Raises:
+        ValueError: если запрошено неизвестное поле
+    """
+    if not raw:
+        return list(default)
+    fields = []
+    for field in raw.split(','):
+        field = field.strip()
+        if not field:
+            continue
+        if field not in LIST_FIELDS:
+            raise ValueError(f"Unknown field '{field}'. Allowed: {', '.join(LIST_FIELDS)}")
+        if field not in fields:
+            fields.append(field)
+    return fields or list(default)
 
-def run_agents_async(topic: str, author: str = None, date: str = None):
+
+def parse_non_negative_int(raw: str, name: str, default: int) -> int:
     """
-    Асинхронно запускает агентов для генерации блог-поста.
-    
-    Args:
-        topic: Тема для исследования
-        author: Автор (опционально, для логирования)
-        date: Дата (опционально, для логирования)
+    Разбирает целочисленный query параметр не меньше нуля; пустой - default.
+
+    Raises:
+        ValueError: если значение не целое или отрицательное
     """
+    if raw is None or raw == '':
+        return default
     try:
-        logger.info(f"Запуск агентов для темы: {topic} (author: {author}, date: {date})")
-        
-        crew = create_research_crew(topic, openai_llm)
-        result = crew.kickoff()
-        
-        # Сохраняем результат в Supabase
-        post_id = save_to_db(topic, result, author, date)
-        
-        logger.info(f"✅ Генерация завершена для темы '{topic}'. Результат сохранен в Supabase с ID: {post_id}")
-        logger.info(f"Результат (первые 200 символов): {str(result)[:200]}...")
-        
-    except Exception as e:
-        logger.error(f"❌ Ошибка при генерации блог-поста для темы '{topic}': {str(e)}", exc_info=True)
+        value = int(raw)
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise ValueError(f"Parameter '{name}' must be a non-negative integer")
+    return value
 
 
-@app.route('/webhook/start-blogpost', methods=['POST'])
-def start_blogpost():
+def select_columns(fields) -> list:
+    """Колонки для SELECT: запрошенные поля плюс id и created_at, нужные для курсора."""
+    return ['id', 'created_at'] + [field for field in fields if field not in ('id', 'created_at')]
+
+
+def serialize_row(columns, fields, row) -> dict:
+    """Собирает словарь ответа из строки SELECT только с запрошенными полями."""
+    values = dict(zip(columns, row))
+    if values.get('created_at') is not None:
+        values['created_at'] = values['created_at'].isoformat()
+    return {field: values[field] for field in fields}
+
+
+TASK_STATUSES = ('pending', 'processing', 'completed', 'failed')
+
+
+# Завершенные посты больше не меняются: клиенты и прокси могут хранить их сколько угодно
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def results_version() -> str:
     """
-    POST эндпоинт для запуска генерации блог-поста.
-    
-    Ожидает JSON: {'topic': '...', 'author': '...', 'date': '...'}
-    Возвращает: {'status': 'started'} со статусом 200
+    Версия данных blog_posts для ETag списков: время последнего изменения
+    (max(updated_at), см. migrations/008_blog_posts_updated_at.sql) и последний id.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT max(updated_at), max(id) FROM blog_posts')
+            updated_at, last_id = cursor.fetchone()
+    return f"{updated_at.isoformat() if updated_at else ''}:{last_id or 0}"
+
+
+def make_etag(*parts) -> str:
+    """Непрозрачное значение ETag (без кавычек) из частей версии."""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:32]
+
+
+def not_modified(etag: str, cache_control: str = 'no-cache'):
+    """Ответ 304 для If-None-Match, совпавшего с текущим ETag."""
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def cached_list(view):
+    """
+    Условные GET и короткий кэш для списковых эндпоинтов.
+
+    Ключ кэша - путь с query строкой. При промахе сначала читается версия данных
+    (results_version), и если она совпадает с If-None-Match, сразу отдается 304
+    без запроса страницы. Успешные ответы сохраняются в get_response_cache() вместе с ETag.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = get_response_cache()
+        key = request.full_path
+        cached = cache.get(key)
+        if cached is None:
+            try:
+                version = results_version()
+            except Exception as e:
+                logger.error(f"❌ Ошибка при чтении версии результатов: {str(e)}", exc_info=True)
+                return jsonify({'error': str(e)}), 500
+            etag = make_etag(version, key)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+            result = view(*args, **kwargs)
+            response, status = result if isinstance(result, tuple) else (result, 200)
+            if status != 200:
+                return response, status
+            cached = (etag, response.get_data())
+            cache.set(key, cached)
+
+        etag, body = cached
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
+        response = Response(body, status=200, mimetype='application/json')
+        response.set_etag(etag, weak=True)
+        # Клиенты могут хранить ответ, но должны сверять ETag перед использованием
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
+
+def encode_cursor(created_at, post_id: int) -> str:
+    """Кодирует позицию последней строки страницы в непрозрачный курсор."""
+    payload = json.dumps({'c': created_at.isoformat() if created_at else None, 'i': post_id})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """
+    Разбирает курсор из encode_cursor.
+
+    Returns:
+        Кортеж (created_at, id)
+
+    Raises:
+        ValueError: если курсор поврежден
     """
     try:
-        # Получаем JSON данные из запроса
-        data = request.get_json()
-        
-        # Логируем входящий запрос
-        logger.info(f"📥 Получен новый запрос: {data}")
-        
-        # Проверяем наличие обязательного поля topic
-        if not data or 'topic' not in data:
-            logger.warning("⚠️ Отсутствует обязательное поле 'topic' в запросе")
-            return jsonify({'error': "Missing required field 'topic'"}), 400
-        
-        topic = data['topic']
-        author = data.get('author', None)
-        date = data.get('date', None)
-        
-        # Проверяем, что topic не пустой
-        if not topic or not topic.strip():
-            logger.warning("⚠️ Поле 'topic' пустое")
-            return jsonify({'error': "Field 'topic' cannot be empty"}), 400
-        
-        logger.info(f"🚀 Создание задачи для темы: '{topic}'")
-        if author:
-            logger.info(f"   Автор: {author}")
-        if date:
-            logger.info(f"   Дата: {date}")
-        
-        # Создаем задачу в БД со статусом 'pending'
-        task_id = create_task_in_db(topic.strip(), author, date)
-        
-        logger.info(f"✅ Задача создана с ID: {task_id} для темы: '{topic}'")
-        
-        # Сразу возвращаем успешный ответ
-        return jsonify({'status': 'started', 'task_id': task_id}), 200
-        
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        created_at = datetime.fromisoformat(payload['c']) if payload['c'] else None
+        return created_at, int(payload['i'])
     except Exception as e:
-        logger.error(f"❌ Ошибка при обработке запроса: {str(e)}", exc_info=True)
-        return jsonify({'error': str(e)}), 500
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def estimate_count(cursor, where_sql: str, params) -> int:
+    """
+    Быстрая оценка количества строк без COUNT(*): без фильтра - pg_class.reltuples,
+    с фильтром - оценка планировщика из EXPLAIN.
+    """
+    if not where_sql:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = 'blog_posts'::regclass")
+        row = cursor.fetchone()
+        # reltuples = -1, пока таблицу ни разу не анализировали
+        if row and row[0] >= 0:
+            return int(row[0])
+    cursor.execute(f'EXPLAIN (FORMAT JSON) SELECT 1 FROM blog_posts {where_sql}', params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
 
 
 @app.route('/webhook/results', methods=['GET'])
+@cached_list
 def get_results():
     """
     GET эндпоинт для получения всех результатов или с фильтрацией.
     
+    Пагинация по курсору (created_at, id): каждая следующая страница стоит столько же,
+    сколько первая. Старый параметр offset поддерживается для совместимости.
+    
     Query параметры:
         - topic (опционально): фильтр по теме
+        - status (опционально): pending, processing, completed или failed
         - limit (опционально, по умолчанию 50): количество результатов
-        - offset (опционально, по умолчанию 0): смещение для пагинации
+        - cursor (опционально): next_cursor из предыдущего ответа
+        - offset (опционально, устаревший): смещение для пагинации
+        - total (опционально, по умолчанию estimate): exact - точный COUNT(*),
+          estimate - быстрая оценка, none - не считать
+        - fields (опционально): поля через запятую из LIST_FIELDS; по умолчанию
+          id, topic, author, date, created_at, status. Полный текст (content) лучше
+          брать из /webhook/results/<id>, для превью есть excerpt
     
     Returns:
-        JSON с массивом результатов и count
+        JSON с массивом результатов, count, total и next_cursor (null на последней странице)
     """
     try:
         topic_filter = request.args.get('topic', None)
+        status_filter = request.args.get('status', None)
+        if status_filter and status_filter not in TASK_STATUSES:
+            return jsonify({'error': f"Parameter 'status' must be one of: {', '.join(TASK_STATUSES)}"}), 400
         limit = int(request.args.get('limit', 50))
-        offset = int(request.args.get('offset', 0))
+        offset = request.args.get('offset', None)
+        offset = int(offset) if offset is not None else None
+        total_mode = request.args.get('total', 'estimate')
+        if total_mode not in ('exact', 'estimate', 'none'):
+            return jsonify({'error': "Parameter 'total' must be one of: exact, estimate, none"}), 400
+        try:
+            fields = parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        columns = select_columns(fields)
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        page_cursor = request.args.get('cursor', None)
+        try:
+            after = decode_cursor(page_cursor) if page_cursor else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Строим запрос в зависимости от наличия фильтра
+        # Условие фильтра (общее для страницы и подсчета) и условие курсора
+        filters = []
+        filter_params = []
         if topic_filter:
-            cursor.execute('''
-                SELECT id, topic, author, date, content, created_at, status
-                FROM blog_posts
-                WHERE topic ILIKE %s
-                ORDER BY created_at DESC
-                LIMIT %s OFFSET %s
-            ''', (f'%{topic_filter}%', limit, offset))
-            
-            # СНАЧАЛА получаем результаты первого запроса
-            rows = cursor.fetchall()
-            
-            # ПОТОМ получаем общее количество для подсчета
-            cursor.execute('''
-                SELECT COUNT(*) FROM blog_posts WHERE topic ILIKE %s
-            ''', (f'%{topic_filter}%',))
-            total_count = cursor.fetchone()[0]
-        else:
-            cursor.execute('''
-                SELECT id, topic, author, date, content, created_at, status
-                FROM blog_posts
-                ORDER BY created_at DESC
-                LIMIT %s OFFSET %s
-            ''', (limit, offset))
-            
-            # СНАЧАЛА получаем результаты первого запроса
-            rows = cursor.fetchall()
-            
-            # ПОТОМ получаем общее количество
-            cursor.execute('SELECT COUNT(*) FROM blog_posts')
-            total_count = cursor.fetchone()[0]
-        results = []
-        for row in rows:
-            results.append({
-                'id': row[0],
-                'topic': row[1],
-                'author': row[2],
-                'date': row[3],
-                'content': row[4],
-                'created_at': row[5].isoformat() if row[5] else None,
-                'status': row[6]
-            })
+            filters.append('topic ILIKE %s')
+            filter_params.append(f'%{topic_filter}%')
+        if status_filter:
+            filters.append('status = %s')
+            filter_params.append(status_filter)
+        filter_sql = f"WHERE {' AND '.join(filters)}" if filters else ''
+        
+        conditions = list(filters)
+        page_params = list(filter_params)
+        if after:
+            conditions.append('(created_at, id) < (%s, %s)')
+            page_params.extend(after)
+        page_where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
+        # Берем на одну строку больше, чтобы понять, есть ли следующая страница
+        page_params.append(limit + 1)
+        offset_sql = ''
+        if offset and not after:
+            offset_sql = 'OFFSET %s'
+            page_params.append(offset)
+        
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f'''
+                    SELECT {', '.join(columns)}
+                    FROM blog_posts
+                    {page_where}
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s {offset_sql}
+                ''', page_params)
+                rows = cursor.fetchall()
+                
+                total_count = None
+                if total_mode == 'exact':
+                    cursor.execute(f'SELECT COUNT(*) FROM blog_posts {filter_sql}', filter_params)
+                    total_count = cursor.fetchone()[0]
+                elif total_mode == 'estimate':
+                    total_count = estimate_count(cursor, filter_sql, filter_params)
         
-        cursor.close()
-        conn.close()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0]) if has_more and rows else None
+        
+        results = [serialize_row(columns, fields, row) for row in rows]
         
         return jsonify({
             'results': results,
             'count': len(results),
             'total': total_count,
+            'total_is_estimate': total_mode == 'estimate',
             'limit': limit,
-            'offset': offset
+            'offset': offset or 0,
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -422,29 +467,33 @@ def get_result_by_id(post_id):
     """
     GET эндпоинт для получения результата по ID.
     
+    Поддерживает If-None-Match: ETag строится из id и updated_at поста.
+    Завершенные посты отдаются с immutable заголовками кэширования.
+    
     Args:
         post_id: ID блог-поста
     
     Returns:
-        JSON с результатом или 404 если не найден
+        JSON с результатом, 304 если ETag совпал, или 404 если не найден
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, topic, author, date, content, created_at, status
-            FROM blog_posts
-            WHERE id = %s
-        ''', (post_id,))
-        
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT id, topic, author, date, content, created_at, status, updated_at
+                    FROM blog_posts
+                    WHERE id = %s
+                ''', (post_id,))
+                row = cursor.fetchone()
         
         if not row:
             return jsonify({'error': 'Blog post not found'}), 404
         
+        etag = make_etag(row[0], row[7].isoformat() if row[7] else '')
+        cache_control = IMMUTABLE_CACHE_CONTROL if row[6] == 'completed' else 'no-cache'
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag, cache_control)
+        
         result = {
             'id': row[0],
             'topic': row[1],
@@ -455,7 +504,10 @@ def get_result_by_id(post_id):
             'status': row[6]
         }
         
-        return jsonify(result), 200
+        response = jsonify(result)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = cache_control
+        return response, 200
         
     except Exception as e:
         logger.error(f"❌ Ошибка при получении результата по ID {post_id}: {str(e)}", exc_info=True)
@@ -463,30 +515,394 @@ def get_result_by_id(post_id):
 
 
 @app.route('/webhook/results/latest', methods=['GET'])
+@cached_list
 def get_latest_results():
     """
     GET эндпоинт для получения последних N результатов.
     
     Query параметры:
         - limit (опционально, по умолчанию 10): количество последних результатов
+        - fields (опционально): поля через запятую, как в /webhook/results
     
     Returns:
         JSON с массивом последних результатов
     """
     try:
         limit = int(request.args.get('limit', 10))
+        try:
+            fields = parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        columns = select_columns(fields)
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f'''
+                    SELECT {', '.join(columns)}
+                    FROM blog_posts
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
+                ''', (limit,))
+                rows = cursor.fetchall()
         
-        cursor.execute('''
-            SELECT id, topic, author, date, content, created_at, status
-            FROM blog_posts
-            ORDER BY created_at DESC
-            LIMIT %s
-        ''', (limit,))
+        results = [serialize_row(columns, fields, row) for row in rows]
+        
+        return jsonify({
+            'results': results,
+            'count': len(results),
+            'limit': limit
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка при получении последних результатов: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+# Статусы, после которых задача больше не меняется
+TERMINAL_STATUSES = ('completed', 'failed')
+# Как часто слать keepalive в SSE и заодно перечитывать состояние задачи (в секундах)
+TASK_EVENTS_KEEPALIVE = 15
+# Максимальная длительность одного SSE-соединения; EventSource затем переподключается сам
+TASK_EVENTS_MAX_DURATION = int(os.getenv('TASK_EVENTS_MAX_DURATION', 600))
+TASK_WAIT_MAX_TIMEOUT = 60
+
+
+def fetch_task_state(task_id: int):
+    """
+    Текущее состояние задачи: id, topic, status и content для завершенной задачи.
+
+    Returns:
+        Словарь или None, если задачи нет
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                SELECT id, topic, status,
+                       CASE WHEN status IN %s THEN content END
+                FROM blog_posts
+                WHERE id = %s
+            ''', (TERMINAL_STATUSES, task_id))
+            row = cursor.fetchone()
+    if not row:
+        return None
+    state = {'id': row[0], 'topic': row[1], 'status': row[2]}
+    if row[2] in TERMINAL_STATUSES:
+        state['content'] = row[3]
+    return state
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Форматирует одно событие server-sent events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.route('/webhook/tasks/<int:task_id>/events', methods=['GET'])
+def task_events(task_id):
+    """
+    SSE поток смены статуса задачи вместо опроса /webhook/results/<id>.
+    
+    Сразу отправляет текущий статус (событие status), затем каждую смену статуса,
+    как только worker ее запишет (уведомления через NOTIFY, см. task_events.py).
+    Когда задача завершена, отправляет событие result с content и закрывает поток.
+    
+    Args:
+        task_id: ID задачи
+    
+    Returns:
+        Поток text/event-stream или 404 если задача не найдена
+    """
+    hub = get_task_event_hub()
+    # Подписываемся до чтения состояния, чтобы не пропустить смену статуса между ними
+    events = hub.subscribe(task_id)
+    try:
+        state = fetch_task_state(task_id)
+    except Exception as e:
+        hub.unsubscribe(task_id, events)
+        logger.error(f"❌ Ошибка при получении статуса задачи {task_id}: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+    if state is None:
+        hub.unsubscribe(task_id, events)
+        return jsonify({'error': 'Task not found'}), 404
+    
+    def stream(current):
+        try:
+            yield 'retry: 3000\n\n'
+            yield format_sse('result' if current['status'] in TERMINAL_STATUSES else 'status', current)
+            deadline = time.monotonic() + TASK_EVENTS_MAX_DURATION
+            while current['status'] not in TERMINAL_STATUSES and time.monotonic() < deadline:
+                try:
+                    events.get(timeout=TASK_EVENTS_KEEPALIVE)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                # Перечитываем и по таймауту: уведомление могло потеряться при переподключении LISTEN
+                latest = fetch_task_state(task_id)
+                if latest is None:
+                    break
+                if latest['status'] != current['status']:
+                    current = latest
+                    yield format_sse('result' if current['status'] in TERMINAL_STATUSES else 'status', current)
+        except Exception as e:
+            logger.error(f"❌ Ошибка в потоке событий задачи {task_id}: {str(e)}", exc_info=True)
+    
+    response = Response(
+        stream_with_context(stream(state)),
+        mimetype='text/event-stream',
+        # X-Accel-Buffering: nginx и прокси Railway не должны копить события в буфере
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Сервер закрывает ответ всегда, даже если клиент отключился до первого чтения
+    # и генератор так и не запустился (тогда его finally не выполнился бы)
+    response.call_on_close(lambda: hub.unsubscribe(task_id, events))
+    return response
+
+
+@app.route('/webhook/tasks/<int:task_id>/wait', methods=['GET'])
+def wait_task(task_id):
+    """
+    Long-poll для клиентов без SSE: отвечает, как только статус задачи
+    отличается от известного клиенту, или по истечении timeout.
+    
+    Query параметры:
+        - status (опционально): статус, который клиент уже знает; без него ответ сразу
+        - timeout (опционально, по умолчанию 30, не больше 60): сколько ждать в секундах
+    
+    Returns:
+        JSON с состоянием задачи и флагом changed, или 404 если задача не найдена
+    """
+    known_status = request.args.get('status')
+    try:
+        timeout = float(request.args.get('timeout', 30))
+    except ValueError:
+        timeout = None
+    if timeout is None or not 0 <= timeout < float('inf'):
+        return jsonify({'error': "Parameter 'timeout' must be a non-negative number of seconds"}), 400
+    timeout = min(timeout, TASK_WAIT_MAX_TIMEOUT)
+    hub = get_task_event_hub()
+    events = hub.subscribe(task_id)
+    try:
+        state = fetch_task_state(task_id)
+        if state is None:
+            return jsonify({'error': 'Task not found'}), 404
+        
+        deadline = time.monotonic() + timeout
+        while state['status'] == known_status and state['status'] not in TERMINAL_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                events.get(timeout=min(remaining, TASK_EVENTS_KEEPALIVE))
+            except queue.Empty:
+                pass
+            state = fetch_task_state(task_id)
+            if state is None:
+                return jsonify({'error': 'Task not found'}), 404
+        
+        state['changed'] = state['status'] != known_status
+        return jsonify(state), 200
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка при ожидании задачи {task_id}: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        hub.unsubscribe(task_id, events)
+
+
+# Поля выгрузки по умолчанию: вся запись, включая текст поста
+DEFAULT_EXPORT_FIELDS = ('id', 'topic', 'author', 'date', 'created_at', 'status', 'content')
+# Сколько строк за раз забирать с сервера через серверный курсор
+EXPORT_ITERSIZE = int(os.getenv('EXPORT_ITERSIZE', 1000))
+
+
+def parse_timestamp(raw: str, name: str):
+    """
+    Разбирает дату или дату-время в формате ISO 8601 из query параметра.
+
+    Raises:
+        ValueError: если значение не в формате ISO 8601
+    """
+    try:
+        return datetime.fromisoformat(raw)
+    except ValueError as e:
+        raise ValueError(f"Parameter '{name}' must be an ISO 8601 date or datetime") from e
+
+
+def iter_export_rows(columns, where_sql: str, params):
+    """
+    Отдает строки выгрузки по одной через именованный (серверный) курсор:
+    в памяти одновременно не больше EXPORT_ITERSIZE строк, сколько бы их ни было.
+    Соединение из пула занято до конца выгрузки.
+    """
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor(name=f'export_{uuid.uuid4().hex}') as cursor:
+                cursor.itersize = EXPORT_ITERSIZE
+                cursor.execute(f'''
+                    SELECT {', '.join(columns)}
+                    FROM blog_posts
+                    {where_sql}
+                    ORDER BY created_at, id
+                ''', params)
+                for row in cursor:
+                    yield row
+    except Exception as e:
+        # Заголовки ответа уже отправлены, поэтому ошибку можно только залогировать
+        logger.error(f"❌ Ошибка во время выгрузки: {str(e)}", exc_info=True)
+        raise
+
+
+def export_ndjson(columns, fields, rows):
+    """Форматирует строки в NDJSON пачками по EXPORT_ITERSIZE строк."""
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(serialize_row(columns, fields, row), ensure_ascii=False))
+        if len(chunk) >= EXPORT_ITERSIZE:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+
+
+def export_csv(columns, fields, rows):
+    """Форматирует строки в CSV с заголовком пачками по EXPORT_ITERSIZE строк."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    written = 0
+    for row in rows:
+        values = serialize_row(columns, fields, row)
+        writer.writerow([values[field] for field in fields])
+        written += 1
+        if written % EXPORT_ITERSIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+@app.route('/webhook/export', methods=['GET'])
+def export_results():
+    """
+    GET эндпоинт для потоковой выгрузки блог-постов в NDJSON или CSV.
+    
+    Строки читаются серверным курсором и сразу отправляются клиенту, поэтому
+    потребление памяти не зависит от размера выгрузки. Порядок - по created_at, id.
+    
+    Query параметры:
+        - format (опционально, по умолчанию ndjson): ndjson или csv
+        - from, to (опционально): границы created_at в ISO 8601 (from включительно, to - нет)
+        - status (опционально): статус блог-поста
+        - topic (опционально): фильтр по теме (ILIKE поиск)
+        - fields (опционально): поля через запятую, по умолчанию вся запись
+    
+    Returns:
+        Потоковый ответ application/x-ndjson или text/csv
+    """
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'csv'):
+            return jsonify({'error': "Parameter 'format' must be one of: ndjson, csv"}), 400
+        
+        conditions = []
+        params = []
+        try:
+            fields = parse_fields(request.args.get('fields'), default=DEFAULT_EXPORT_FIELDS)
+            if request.args.get('from'):
+                conditions.append('created_at >= %s')
+                params.append(parse_timestamp(request.args['from'], 'from'))
+            if request.args.get('to'):
+                conditions.append('created_at < %s')
+                params.append(parse_timestamp(request.args['to'], 'to'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if request.args.get('status'):
+            if request.args['status'] not in TASK_STATUSES:
+                return jsonify({'error': f"Parameter 'status' must be one of: {', '.join(TASK_STATUSES)}"}), 400
+            conditions.append('status = %s')
+            params.append(request.args['status'])
+        if request.args.get('topic'):
+            conditions.append('topic ILIKE %s')
+            params.append(f"%{request.args['topic']}%")
+        where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
+        columns = select_columns(fields)
+        rows = iter_export_rows(columns, where_sql, params)
+        if export_format == 'csv':
+            body, mimetype = export_csv(columns, fields, rows), 'text/csv'
+        else:
+            body, mimetype = export_ndjson(columns, fields, rows), 'application/x-ndjson'
+        
+        filename = f"blog_posts_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка при выгрузке результатов: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+# Конфигурация полнотекстового поиска: в Postgres 'russian' стеммит кириллицу
+# русским стеммером, а латиницу - английским, так что покрывает оба языка
+SEARCH_TS_CONFIG = 'russian'
+SEARCH_MAX_LIMIT = 100
+
+
+@app.route('/webhook/search', methods=['GET'])
+def search_results():
+    """
+    GET эндпоинт для поиска по темам и текстам блог-постов.
+    
+    Совпадения ищутся полнотекстово по колонке search_vector (тема весит больше
+    текста) и нечетко по теме через триграммы, так что опечатки в теме тоже находятся.
+    Индексы создает migrations/007_blog_posts_search.sql.
+    
+    Query параметры:
+        - q (обязательно): поисковый запрос, синтаксис websearch ("ai agents" -crypto OR llm)
+        - limit (опционально, по умолчанию 20, не больше 100): количество результатов
+        - offset (опционально): смещение для пагинации
+    
+    Returns:
+        JSON с результатами по убыванию релевантности; в snippet найденные слова выделены <b></b>
+    """
+    try:
+        query = (request.args.get('q') or '').strip()
+        if not query:
+            return jsonify({'error': "Parameter 'q' is required"}), 400
+        try:
+            limit = min(parse_non_negative_int(request.args.get('limit'), 'limit', 20), SEARCH_MAX_LIMIT)
+            offset = parse_non_negative_int(request.args.get('offset'), 'offset', 0)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                # Сначала ранжируем и отрезаем страницу по индексам, и только для
+                # нее строим ts_headline - он разбирает весь текст поста
+                cursor.execute('''
+                    WITH q AS (
+                        SELECT websearch_to_tsquery(%(config)s::regconfig, %(query)s) AS tsq
+                    ),
+                    page AS (
+                        SELECT p.id,
+                               ts_rank_cd(p.search_vector, q.tsq) + similarity(p.topic, %(query)s) AS rank
+                        FROM blog_posts p, q
+                        WHERE p.search_vector @@ q.tsq
+                           OR p.topic %% %(query)s
+                        ORDER BY rank DESC, p.created_at DESC, p.id DESC
+                        LIMIT %(limit)s OFFSET %(offset)s
+                    )
+                    SELECT p.id, p.topic, p.author, p.date, p.created_at, p.status, page.rank,
+                           ts_headline(%(config)s::regconfig, coalesce(NULLIF(p.content, ''), p.topic), q.tsq,
+                                       'MaxWords=35, MinWords=15, MaxFragments=2') AS snippet
+                    FROM page
+                    JOIN blog_posts p ON p.id = page.id
+                    CROSS JOIN q
+                    ORDER BY page.rank DESC, p.created_at DESC, p.id DESC
+                ''', {'config': SEARCH_TS_CONFIG, 'query': query, 'limit': limit, 'offset': offset})
+                rows = cursor.fetchall()
         
-        rows = cursor.fetchall()
         results = []
         for row in rows:
             results.append({
@@ -494,22 +910,22 @@ def get_latest_results():
                 'topic': row[1],
                 'author': row[2],
                 'date': row[3],
-                'content': row[4],
-                'created_at': row[5].isoformat() if row[5] else None,
-                'status': row[6]
+                'created_at': row[4].isoformat() if row[4] else None,
+                'status': row[5],
+                'rank': round(float(row[6]), 4),
+                'snippet': row[7]
             })
         
-        cursor.close()
-        conn.close()
-        
         return jsonify({
             'results': results,
             'count': len(results),
-            'limit': limit
+            'query': query,
+            'limit': limit,
+            'offset': offset
         }), 200
         
     except Exception as e:
-        logger.error(f"❌ Ошибка при получении последних результатов: {str(e)}", exc_info=True)
+        logger.error(f"❌ Ошибка при поиске блог-постов: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 
@@ -519,23 +935,128 @@ def health():
     return jsonify({'status': 'ok'}), 200
 
 
-if __name__ == '__main__':
-    # Проверяем наличие необходимых API ключей
-    openai_key = os.getenv('OPENAI_API_KEY')
-    serper_key = os.getenv('SERPER_API_KEY')
+@app.route('/metrics/db', methods=['GET'])
+def db_metrics():
+    """Метрики пула соединений с БД: выдачи, время ожидания, размер пула."""
+    return jsonify(pool_stats()), 200
+
+
+@app.route('/metrics/cache', methods=['GET'])
+def cache_metrics():
+    """Метрики кэша ответов списковых эндпоинтов: попадания, промахи, сбросы."""
+    return jsonify(get_response_cache().stats()), 200
+
+
+@app.route('/metrics/queue', methods=['GET'])
+def queue_metrics():
+    """Метрики очереди в JSON: задачи по статусам, возраст старейшей, пропускная способность, задержка."""
+    try:
+        return jsonify(queue_stats()), 200
+    except Exception as e:
+        logger.error(f"❌ Ошибка при получении метрик очереди: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/metrics/tasks', methods=['GET'])
+def task_event_metrics():
+    """Метрики подписок на статус задач: уведомления, доставки, открытые подписки."""
+    return jsonify(get_task_event_hub().stats()), 200
+
+
+def crew_run_metric_families() -> list:
+    """Семейства метрик прогонов crew из таблицы crew_runs (пишет worker.py)."""
+    aggregates = load_run_aggregates()
+    runs = MetricFamily('blog_crew_runs_total', 'counter', 'Прогоны crew по статусу и использованию кэша исследований')
+    seconds = MetricFamily('blog_crew_run_seconds_total', 'counter', 'Суммарная длительность прогонов crew')
+    llm_calls = MetricFamily('blog_crew_llm_calls_total', 'counter', 'Вызовы LLM в прогонах crew')
+    tokens = MetricFamily('blog_crew_tokens_total', 'counter', 'Токены LLM в прогонах crew')
+    cost = MetricFamily('blog_crew_cost_usd_total', 'counter', 'Оценка стоимости вызовов LLM в долларах')
+    for status, reused, count, total_seconds, calls, prompt, completion, cost_usd in aggregates['totals']:
+        labels = {'status': status or 'unknown', 'reused_research': str(bool(reused)).lower()}
+        runs.add(count, **labels)
+        seconds.add(float(total_seconds), **labels)
+        llm_calls.add(int(calls), **labels)
+        tokens.add(int(prompt), kind='prompt', **labels)
+        tokens.add(int(completion), kind='completion', **labels)
+        cost.add(float(cost_usd), **labels)
     
-    if not openai_key:
-        logger.error("❌ OPENAI_API_KEY не найден в переменных окружения")
-    if not serper_key:
-        logger.error("❌ SERPER_API_KEY не найден в переменных окружения")
+    duration = MetricFamily('blog_crew_run_duration_seconds', 'histogram', 'Длительность прогона crew')
+    duration.add_histogram(aggregates['histogram'])
     
-    if openai_key and serper_key:
+    stage_seconds = MetricFamily('blog_crew_stage_seconds_total', 'counter', 'Время по этапам crew (задачам)')
+    stage_count = MetricFamily('blog_crew_stage_runs_total', 'counter', 'Выполненные этапы crew')
+    stage_llm = MetricFamily('blog_crew_stage_llm_calls_total', 'counter', 'Вызовы LLM по этапам crew')
+    stage_tokens = MetricFamily('blog_crew_stage_tokens_total', 'counter', 'Токены LLM по этапам crew')
+    for stage, count, total_seconds, calls, prompt, completion in aggregates['stages']:
+        stage_count.add(count, stage=stage)
+        stage_seconds.add(float(total_seconds), stage=stage)
+        stage_llm.add(int(calls), stage=stage)
+        stage_tokens.add(int(prompt), stage=stage, kind='prompt')
+        stage_tokens.add(int(completion), stage=stage, kind='completion')
+    
+    tool_calls = MetricFamily('blog_crew_tool_calls_total', 'counter', 'Вызовы инструментов агентов')
+    tool_seconds = MetricFamily('blog_crew_tool_seconds_total', 'counter', 'Суммарное время вызовов инструментов')
+    for tool, ok, count, total_seconds in aggregates['tools']:
+        outcome = 'ok' if ok else 'error'
+        tool_calls.add(count, tool=tool, outcome=outcome)
+        tool_seconds.add(float(total_seconds), tool=tool, outcome=outcome)
+    
+    return [runs, seconds, llm_calls, tokens, cost, duration,
+            stage_count, stage_seconds, stage_llm, stage_tokens, tool_calls, tool_seconds]
+
+
+def api_metric_families() -> list:
+    """Семейства метрик процесса API: пул соединений, кэш ответов, подписки на задачи."""
+    pool = pool_stats()
+    db_pool = MetricFamily('blog_api_db_pool_connections', 'gauge', 'Соединения пула БД процесса API')
+    db_pool.add(pool.get('in_use', 0), state='in_use').add(pool.get('idle', 0), state='idle')
+    db_checkouts = MetricFamily('blog_api_db_pool_checkouts_total', 'counter', 'Выдачи соединений из пула БД')
+    db_checkouts.add(pool.get('checkouts', 0))
+    db_wait = MetricFamily('blog_api_db_pool_wait_seconds_total', 'counter', 'Суммарное ожидание соединения из пула')
+    db_wait.add(float(pool.get('wait_seconds_total', 0.0)))
+    
+    cache = get_response_cache().stats()
+    cache_lookups = MetricFamily('blog_api_response_cache_lookups_total', 'counter', 'Обращения к кэшу ответов списков')
+    cache_lookups.add(cache['hits'], result='hit').add(cache['misses'], result='miss')
+    
+    hub = get_task_event_hub().stats()
+    subscribers = MetricFamily('blog_api_task_event_subscribers', 'gauge', 'Открытые подписки SSE и long-poll')
+    subscribers.add(hub['subscribers'])
+    
+    return [db_pool, db_checkouts, db_wait, cache_lookups, subscribers]
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Метрики в формате Prometheus: очередь задач (queue_metrics.py), прогоны crew
+    из таблицы crew_runs (время по этапам, вызовы инструментов, вызовы LLM, токены,
+    стоимость) и метрики процесса API.
+    """
+    families = []
+    try:
+        families.extend(queue_metric_families())
+    except Exception as e:
+        logger.warning(f"⚠️ Метрики очереди недоступны: {str(e)}")
+    try:
+        families.extend(crew_run_metric_families())
+    except Exception as e:
+        # Без таблицы crew_runs (миграция 010) отдаем хотя бы метрики процесса
+        logger.warning(f"⚠️ Метрики прогонов crew недоступны: {str(e)}")
+    families.extend(api_metric_families())
+    return Response(render(families), mimetype=None, content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+if __name__ == '__main__':
+    # API только работает с БД; ключи OpenAI и Serper нужны worker.py
+    if os.getenv('DATABASE_URL'):
         # Используем PORT из переменных окружения (Railway автоматически устанавливает его)
         port = int(os.getenv('PORT', 5000))
         logger.info("🚀 Запуск API сервера...")
         logger.info(f"📡 Порт: {port}")
         logger.info("📡 Эндпоинт: POST /webhook/start-blogpost")
         logger.info("💚 Health check: GET /health")
-        app.run(host='0.0.0.0', port=port, debug=False)
+        logger.warning("⚠️ Встроенный сервер Flask - только для разработки, в production: gunicorn -c gunicorn.conf.py api:app")
+        app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
     else:
-        logger.error("❌ Не удалось запустить сервер: отсутствуют необходимые API ключи")
+        logger.error("❌ Не удалось запустить сервер: DATABASE_URL не найден в переменных окружения")
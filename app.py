@@ -9,72 +9,24 @@ Streamlit веб-приложение для поиска новостей и н
 - Файлы с секретами (.env, .streamlit/secrets.toml) должны быть в .gitignore
 """
 import os
-import json
-import traceback
-from datetime import datetime
-
-# #region agent log
-try:
-    with open('/Users/pavelkokora/crewai_agent/.cursor/debug.log', 'a') as f:
-        f.write(json.dumps({"id":"log_import_start","timestamp":int(datetime.now().timestamp()*1000),"location":"app.py:13","message":"Starting imports","data":{"step":"import_os_requests"},"sessionId":"debug-session","runId":"run1","hypothesisId":"A"}) + "\n")
-except: pass
-# #endregion
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 import streamlit as st
-
-# #region agent log
-try:
-    with open('/Users/pavelkokora/crewai_agent/.cursor/debug.log', 'a') as f:
-        f.write(json.dumps({"id":"log_import_streamlit","timestamp":int(datetime.now().timestamp()*1000),"location":"app.py:17","message":"Streamlit imported","data":{"step":"import_streamlit"},"sessionId":"debug-session","runId":"run1","hypothesisId":"A"}) + "\n")
-except: pass
-# #endregion
-
 from dotenv import load_dotenv
-
-# #region agent log
-try:
-    with open('/Users/pavelkokora/crewai_agent/.cursor/debug.log', 'a') as f:
-        f.write(json.dumps({"id":"log_before_load_dotenv","timestamp":int(datetime.now().timestamp()*1000),"location":"app.py:22","message":"Before load_dotenv","data":{"step":"before_load_dotenv"},"sessionId":"debug-session","runId":"run1","hypothesisId":"D"}) + "\n")
-except: pass
-# #endregion
+from logging_setup import configure_logging
 
 # Загружаем переменные окружения из .env файла (для локального запуска)
 # ВНИМАНИЕ: .env файл должен быть в .gitignore и НЕ попадать в репозиторий!
-try:
-    load_dotenv(override=True)
-    # #region agent log
-    try:
-        with open('/Users/pavelkokora/crewai_agent/.cursor/debug.log', 'a') as f:
-            f.write(json.dumps({"id":"log_after_load_dotenv","timestamp":int(datetime.now().timestamp()*1000),"location":"app.py:27","message":"After load_dotenv","data":{"step":"load_dotenv_success"},"sessionId":"debug-session","runId":"run1","hypothesisId":"D"}) + "\n")
-    except: pass
-    # #endregion
-except Exception as e:
-    # #region agent log
-    try:
-        with open('/Users/pavelkokora/crewai_agent/.cursor/debug.log', 'a') as f:
-            f.write(json.dumps({"id":"log_load_dotenv_error","timestamp":int(datetime.now().timestamp()*1000),"location":"app.py:30","message":"load_dotenv error","data":{"error":str(e),"traceback":traceback.format_exc()},"sessionId":"debug-session","runId":"run1","hypothesisId":"D"}) + "\n")
-    except: pass
-    # #endregion
-    raise
-
-# #region agent log
-try:
-    with open('/Users/pavelkokora/crewai_agent/.cursor/debug.log', 'a') as f:
-        f.write(json.dumps({"id":"log_before_crewai_import","timestamp":int(datetime.now().timestamp()*1000),"location":"app.py:34","message":"Before CrewAI import","data":{"step":"before_crewai"},"sessionId":"debug-session","runId":"run1","hypothesisId":"A"}) + "\n")
-except: pass
-# #endregion
-
-from crewai import Agent, Task, Crew, Process
-from crewai.tools import tool
-from langchain_openai import ChatOpenAI
-
-# #region agent log
-try:
-    with open('/Users/pavelkokora/crewai_agent/.cursor/debug.log', 'a') as f:
-        f.write(json.dumps({"id":"log_after_all_imports","timestamp":int(datetime.now().timestamp()*1000),"location":"app.py:40","message":"All imports completed","data":{"step":"imports_complete"},"sessionId":"debug-session","runId":"run1","hypothesisId":"A"}) + "\n")
-except: pass
-# #endregion
+load_dotenv(override=True)
+
+# Настройка логирования (logging_setup.py): повторные перезапуски скрипта ее не трогают
+configure_logging('app')
+logger = logging.getLogger(__name__)
 
 
 def get_api_key(key_name: str) -> str | None:
@@ -114,118 +66,209 @@ def get_api_key(key_name: str) -> str | None:
         return value.strip()
     return None
 
-# Создаем кастомный инструмент для поиска через Serper API
-@tool("Поиск в интернете")
-def serper_search(query: str) -> str:
-    """Поиск актуальных новостей и информации в интернете через Serper API. 
-    Используй для поиска последних новостей по указанной теме."""
-    api_key = get_api_key('SERPER_API_KEY')
-    if not api_key:
-        return "Ошибка: API ключ Serper не найден. Проверьте st.secrets или файл .env"
-    
-    url = "https://google.serper.dev/search"
-    headers = {
-        'X-API-KEY': api_key,
-        'Content-Type': 'application/json'
-    }
-    payload = {
-        'q': query,
-        'num': 10
-    }
+
+# Как часто фрагмент прогресса проверяет статус задачи, в секундах. Проверка не ждет,
+# поэтому скрипт Streamlit не занят между проверками и страница откликается на действия
+TASK_POLL_INTERVAL = float(os.getenv('TASK_POLL_INTERVAL', 2))
+# После скольких неудачных проверок подряд прекращать следить за задачей (404 - сразу)
+TASK_POLL_MAX_FAILURES = int(os.getenv('TASK_POLL_MAX_FAILURES', 5))
+# Сколько секунд LocalCrewRunner хранит результат, который никто не забрал (сессия закрыта)
+LOCAL_JOB_RETENTION = 3600
+
+# Подписи статусов задачи для индикатора прогресса
+STATUS_LABELS = {
+    'pending': '⏳ Задача в очереди, ждем свободного агента...',
+    'processing': '🤖 Агенты работают...',
+    'research': '🔎 Исследователь ищет новости...',
+    'writing': '✍️ Писатель пишет блог-пост...',
+    'completed': '✅ Исследование завершено!',
+    'failed': '❌ Не удалось выполнить исследование',
+}
+
+
+@st.cache_resource
+def get_llm(openai_api_key: str):
+    """Клиент OpenAI, общий для всех сессий приложения (создается один раз на ключ)."""
+    # langchain и crewai импортируются только для локальных прогонов: режиму очереди
+    # и вкладке истории они не нужны и не должны замедлять первую отрисовку
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model='gpt-4o-mini',  # Используем gpt-4o-mini - быструю и недорогую модель OpenAI
+        temperature=0.7,
+        openai_api_key=openai_api_key
+    )
+
+
+class LocalCrewRunner:
+    """
+    Фоновое выполнение crew в процессе Streamlit, когда API сервер не указан.
     
-    try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Форматируем результаты
-        results = []
-        if 'organic' in data:
-            for item in data['organic'][:5]:  # Берем первые 5 результатов
-                title = item.get('title', 'Без названия')
-                link = item.get('link', '')
-                snippet = item.get('snippet', '')
-                results.append(f"Название: {title}\nСсылка: {link}\nОписание: {snippet}\n")
+    Задачи живут в пуле потоков вне скрипта Streamlit: перезапуск скрипта
+    (любое действие пользователя) не прерывает их, а результат находится по id задачи.
+    Завершенная задача забывается, как только сессия забрала ее результат (poll),
+    а незабранная - через LOCAL_JOB_RETENTION секунд.
+    
+    Args:
+        max_workers: Сколько crew выполнять одновременно на весь процесс
+    """
+    
+    def __init__(self, max_workers: int = 2):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='crew')
+        self._lock = threading.Lock()
+        self._jobs = {}
+    
+    def _set(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            if job['status'] in ('completed', 'failed'):
+                job['finished_at'] = time.monotonic()
+    
+    def _forget_abandoned(self):
+        expired_before = time.monotonic() - LOCAL_JOB_RETENTION
+        for job_id, job in list(self._jobs.items()):
+            if job.get('finished_at', expired_before) < expired_before:
+                del self._jobs[job_id]
+    
+    def _run(self, job_id: str, topic: str, llm):
+        stages = iter(['writing'])
+        self._set(job_id, status='processing', stage='research')
+        try:
+            from crews import get_research_template
+            # Crew собирается один раз на процесс, тема подставляется при kickoff
+            template = get_research_template(llm)
+            with template.checkout(lambda output: self._set(job_id, stage=next(stages, None))) as crew:
+                result = str(crew.kickoff(inputs={'topic': topic}))
+            with open('blog_post.txt', 'w', encoding='utf-8') as f:
+                f.write(result)
+            self._set(job_id, status='completed', stage=None, content=result)
+        except Exception as e:
+            logger.error(f"❌ Ошибка фонового прогона crew для темы '{topic}': {str(e)}", exc_info=True)
+            self._set(job_id, status='failed', stage=None, error=str(e))
+    
+    def submit(self, topic: str, llm) -> str:
+        """Ставит crew в очередь пула и возвращает id задачи."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._forget_abandoned()
+            self._jobs[job_id] = {'id': job_id, 'topic': topic, 'status': 'pending', 'stage': None}
+        self.executor.submit(self._run, job_id, topic, llm)
+        return job_id
+    
+    def poll(self, job_id: str):
+        """
+        Возвращает состояние задачи без ожидания. Завершенная задача отдается один раз и забывается.
         
-        return "\n".join(results) if results else "Результаты поиска не найдены"
-    except Exception as e:
-        return f"Ошибка при поиске: {str(e)}"
+        Returns:
+            Копия состояния задачи или None, если задача неизвестна (например, после перезапуска приложения)
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] in ('completed', 'failed'):
+                del self._jobs[job_id]
+            return dict(job)
 
 
-def create_research_crew(topic: str, llm):
+@st.cache_resource
+def get_local_runner():
+    """Общий для всех сессий исполнитель crew (LOCAL_CREW_WORKERS потоков, по умолчанию 2)."""
+    return LocalCrewRunner(max_workers=int(os.getenv('LOCAL_CREW_WORKERS', 2)))
+
+
+def submit_blog_post(api_url: str, topic: str, idempotency_key: str):
     """
-    Создает Crew для исследования заданной темы и написания блог-поста.
+    Ставит тему в очередь API сервера через POST /webhook/start-blogpost.
     
     Args:
-        topic: Тема для поиска новостей и написания блог-поста
-        llm: LLM объект для использования агентами
+        api_url: Базовый URL API сервера
+        topic: Тема блог-поста
+        idempotency_key: Ключ идемпотентности: повтор запроса не создаст вторую задачу
     
     Returns:
-        Crew объект готовый к выполнению
+        tuple: (task_id, ошибка) - id задачи или (None, сообщение_об_ошибке)
     """
-    # Создаем агента-исследователя с универсальным backstory
-    researcher = Agent(
-        role='Исследователь новостей',
-        goal=f'Найти актуальные и релевантные новости про {topic} в интернете',
-        backstory=f'''Ты опытный исследователь, специализирующийся на поиске и анализе 
-        информации в интернете. Ты умеешь находить самые свежие и важные новости 
-        по теме "{topic}", анализировать их и предоставлять структурированную информацию.''',
-        verbose=True,
-        allow_delegation=False,
-        tools=[serper_search],
-        llm=llm
-    )
+    try:
+        response = requests.post(
+            f"{api_url.strip().rstrip('/')}/webhook/start-blogpost",
+            json={'topic': topic},
+            headers={'Idempotency-Key': idempotency_key},
+            timeout=10
+        )
+        if response.status_code == 200:
+            return response.json().get('task_id'), None
+        return None, f"Ошибка HTTP {response.status_code}: {response.text[:200]}"
+    except requests.exceptions.RequestException as e:
+        return None, f"Ошибка запроса: {str(e)}"
+
+
+def fetch_task_status(api_url: str, task_id: int):
+    """
+    Проверяет статус задачи через GET /webhook/tasks/<id>/wait без ожидания
+    (без параметра status API отвечает сразу).
     
-    # Создаем агента-писателя с универсальным backstory
-    writer = Agent(
-        role='Блог-писатель',
-        goal=f'Написать интересный и информативный пост для блога на русском языке о теме "{topic}" на основе найденных новостей',
-        backstory='''Ты талантливый блог-писатель, который специализируется на 
-        написании информативных статей. Ты умеешь структурировать информацию, 
-        делать ее понятной для широкой аудитории и писать увлекательные тексты 
-        на русском языке.''',
-        verbose=True,
-        allow_delegation=False,
-        llm=llm
-    )
+    Returns:
+        tuple: (состояние, ошибка, задача_не_найдена) - словарь с status (и content
+        для завершенной задачи) или (None, сообщение_об_ошибке, признак ответа 404)
+    """
+    try:
+        response = requests.get(
+            f"{api_url.strip().rstrip('/')}/webhook/tasks/{task_id}/wait",
+            timeout=10
+        )
+        if response.status_code == 200:
+            return response.json(), None, False
+        return None, f"Ошибка HTTP {response.status_code}: {response.text[:200]}", response.status_code == 404
+    except requests.exceptions.RequestException as e:
+        return None, f"Ошибка запроса: {str(e)}", False
+
+
+@st.fragment(run_every=TASK_POLL_INTERVAL)
+def track_task_progress(api_url: str):
+    """
+    Показывает прогресс задачи из st.session_state.task.
     
-    # Создаем задачу для исследования с динамической темой
-    research_task = Task(
-        description=f'''Найди в интернете последние новости (за последние 1-2 недели) 
-        про {topic}. Собери информацию о 3-5 самых интересных и важных новостях. 
-        Включи в результат:
-        - Название новости
-        - Источник и дату публикации
-        - Краткое описание содержания
-        - Почему эта новость важна''',
-        agent=researcher,
-        expected_output=f'Структурированный список из 3-5 новостей про {topic} с названиями, источниками, датами и описаниями'
-    )
+    Фрагмент перезапускается сам раз в TASK_POLL_INTERVAL секунд и за один прогон
+    делает одну проверку статуса без ожидания, так что остальная страница не блокируется.
+    Сама задача выполняется на worker (через API) или в LocalCrewRunner, поэтому
+    перезапуск скрипта только продолжает проверки по id задачи. Когда задача
+    завершена, перезапускает все приложение, чтобы показать результат.
     
-    # Создаем задачу для написания поста с динамической темой
-    writing_task = Task(
-        description=f'''Используй результаты исследования новостей про {topic}, чтобы 
-        написать короткий блог-пост на русском языке. Пост должен быть:
-        - Информативным и интересным
-        - Структурированным (с заголовком и несколькими абзацами)
-        - Написанным для широкой аудитории
-        - Объемом примерно 300-500 слов
-        - Включать ключевые моменты из найденных новостей
-        - Основанным на информации, которую собрал исследователь''',
-        agent=writer,
-        context=[research_task],  # Используем результаты исследования как контекст
-        expected_output=f'Полноценный блог-пост на русском языке объемом 300-500 слов про {topic} с заголовком и структурированным содержанием'
-    )
+    Сбой одной проверки (таймаут, перезапуск API) не прекращает слежение: фрагмент
+    показывает предупреждение и пробует снова, а сдается после TASK_POLL_MAX_FAILURES
+    сбоев подряд или сразу, если задачи больше нет (404).
+    """
+    task = st.session_state.task
+    if not task:
+        return
+    if task['mode'] == 'api':
+        state, error, gone = fetch_task_status(api_url, task['id'])
+    else:
+        state = get_local_runner().poll(task['id'])
+        error, gone = (None, False) if state else ("Задача не найдена: приложение было перезапущено", True)
+    if error:
+        task['failures'] = task.get('failures', 0) + 1
+        if gone or task['failures'] >= TASK_POLL_MAX_FAILURES:
+            st.session_state.task_error = error
+            st.session_state.task = None
+            st.rerun()
+        st.warning(f"⚠️ Не удалось проверить статус задачи ({task['failures']}/{TASK_POLL_MAX_FAILURES}): {error}")
+        st.status(STATUS_LABELS.get(task.get('stage') or task['status'], task['status']), state='running')
+        return
     
-    # Создаем crew (команду)
-    crew = Crew(
-        agents=[researcher, writer],
-        tasks=[research_task, writing_task],
-        process=Process.sequential,  # Задачи выполняются последовательно
-        verbose=True
-    )
+    task['failures'] = 0
+    task.update(status=state['status'], stage=state.get('stage'))
+    if task['status'] in ('completed', 'failed'):
+        if task['status'] == 'completed':
+            st.session_state.result = state.get('content') or ''
+            st.session_state.last_topic = task['topic']
+        else:
+            st.session_state.task_error = state.get('error') or 'Задача завершилась с ошибкой'
+        st.session_state.task = None
+        st.rerun()
     
-    return crew
+    st.status(STATUS_LABELS.get(task.get('stage') or task['status'], task['status']), state='running')
 
 
 def check_api_keys():
@@ -257,77 +300,123 @@ def check_api_keys():
     return len(missing_keys) == 0, missing_keys
 
 
-def get_blog_posts(api_url: str, limit: int = 50):
+# Размер страницы во вкладке истории
+HISTORY_PAGE_SIZE = 20
+
+# Сколько секунд st.cache_data хранит страницы истории и тексты постов
+HISTORY_CACHE_TTL = int(os.getenv('HISTORY_CACHE_TTL', 30))
+
+# Фильтр по статусу во вкладке истории: подпись -> значение параметра status API
+HISTORY_STATUS_OPTIONS = {
+    'Все': None,
+    'Завершенные': 'completed',
+    'В работе': 'processing',
+    'В очереди': 'pending',
+    'С ошибкой': 'failed',
+}
+
+
+def describe_request_error(api_url: str, error: Exception) -> str:
+    """Сообщение об ошибке запроса к API для интерфейса."""
+    if isinstance(error, requests.exceptions.HTTPError):
+        return f"Ошибка HTTP {error.response.status_code}: {error.response.text[:200]}"
+    if isinstance(error, requests.exceptions.Timeout):
+        return "Таймаут при подключении к API серверу"
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return f"Не удалось подключиться к {api_url}. Проверьте URL."
+    if isinstance(error, requests.exceptions.RequestException):
+        return f"Ошибка запроса: {str(error)}"
+    return f"Неожиданная ошибка: {str(error)}"
+
+
+@st.cache_data(ttl=HISTORY_CACHE_TTL, show_spinner=False)
+def fetch_blog_posts_page(api_url: str, topic: str = None, status: str = None,
+                          cursor: str = None, limit: int = HISTORY_PAGE_SIZE) -> dict:
+    """
+    Одна страница GET /webhook/results без текста постов. Ключ кэша - все аргументы,
+    поэтому перерисовка с теми же фильтрами и курсором не ходит в API.
+    Ошибки не кэшируются: исключение пробрасывается вызывающему.
+    """
+    params = {'limit': limit}
+    if topic:
+        params['topic'] = topic
+    if status:
+        params['status'] = status
+    if cursor:
+        params['cursor'] = cursor
+    response = requests.get(f"{api_url.strip().rstrip('/')}/webhook/results", params=params, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def get_blog_posts(api_url: str, topic: str = None, status: str = None,
+                   cursor: str = None, limit: int = HISTORY_PAGE_SIZE):
     """
-    Получает список блог-постов через GET /webhook/results эндпоинт.
+    Получает страницу блог-постов через GET /webhook/results: фильтры по теме и статусу
+    применяются на сервере, следующая страница - по next_cursor.
     
     Args:
         api_url: Базовый URL API сервера (например, https://your-app.railway.app)
-        limit: Количество результатов для получения (по умолчанию 50)
+        topic: Фильтр по теме (подстрока)
+        status: Фильтр по статусу задачи
+        cursor: next_cursor из предыдущей страницы
+        limit: Количество результатов на странице
     
     Returns:
-        tuple: (список_данных, ошибка) - список словарей с данными блог-постов или (None, сообщение_об_ошибке)
+        tuple: (страница, ошибка) - словарь с results, total и next_cursor или (None, сообщение_об_ошибке)
     """
     if not api_url or not api_url.strip():
         return None, "URL API сервера не указан"
     
     try:
-        # Убираем завершающий слеш, если есть
-        api_url_clean = api_url.strip().rstrip('/')
-        url = f"{api_url_clean}/webhook/results?limit={limit}"
-        
-        response = requests.get(url, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            return data.get('results', []), None
-        else:
-            return None, f"Ошибка HTTP {response.status_code}: {response.text[:200]}"
-    except requests.exceptions.Timeout:
-        return None, "Таймаут при подключении к API серверу"
-    except requests.exceptions.ConnectionError:
-        return None, f"Не удалось подключиться к {api_url}. Проверьте URL."
-    except requests.exceptions.RequestException as e:
-        return None, f"Ошибка запроса: {str(e)}"
+        return fetch_blog_posts_page(api_url, topic or None, status, cursor, limit), None
     except Exception as e:
-        return None, f"Неожиданная ошибка: {str(e)}"
+        return None, describe_request_error(api_url, e)
 
 
-def main():
-    """Основная функция Streamlit приложения."""
-    # #region agent log
-    try:
-        with open('/Users/pavelkokora/crewai_agent/.cursor/debug.log', 'a') as f:
-            f.write(json.dumps({"id":"log_main_start","timestamp":int(datetime.now().timestamp()*1000),"location":"app.py:206","message":"main() called","data":{"step":"main_entry"},"sessionId":"debug-session","runId":"run1","hypothesisId":"B"}) + "\n")
-    except: pass
-    # #endregion
+def request_blog_post(api_url: str, post_id: int) -> dict:
+    """Один блог-пост с полным текстом из GET /webhook/results/<id>."""
+    response = requests.get(f"{api_url.strip().rstrip('/')}/webhook/results/{post_id}", timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+# Завершенный пост больше не меняется, его текст можно брать из кэша
+fetch_completed_blog_post = st.cache_data(ttl=HISTORY_CACHE_TTL, show_spinner=False)(request_blog_post)
+
+
+def get_blog_post(api_url: str, post_id: int, completed: bool = False):
+    """
+    Получает один блог-пост с полным текстом через GET /webhook/results/<id>.
     
-    # #region agent log
-    try:
-        with open('/Users/pavelkokora/crewai_agent/.cursor/debug.log', 'a') as f:
-            f.write(json.dumps({"id":"log_before_set_page_config","timestamp":int(datetime.now().timestamp()*1000),"location":"app.py:210","message":"Before set_page_config","data":{"step":"before_page_config"},"sessionId":"debug-session","runId":"run1","hypothesisId":"C"}) + "\n")
-    except: pass
-    # #endregion
+    Args:
+        api_url: Базовый URL API сервера
+        post_id: ID блог-поста
+        completed: Пост уже завершен - ответ берется из кэша st.cache_data
+    
+    Returns:
+        tuple: (данные, ошибка) - словарь с данными блог-поста или (None, сообщение_об_ошибке)
+    """
+    if not api_url or not api_url.strip():
+        return None, "URL API сервера не указан"
     
+    try:
+        fetch = fetch_completed_blog_post if completed else request_blog_post
+        return fetch(api_url, post_id), None
+    except Exception as e:
+        return None, describe_request_error(api_url, e)
+
+
+def main():
+    """Основная функция Streamlit приложения."""
     try:
         st.set_page_config(
             page_title="CrewAI - Поиск новостей и создание блог-постов",
             page_icon="🚀",
             layout="wide"
         )
-        # #region agent log
-        try:
-            with open('/Users/pavelkokora/crewai_agent/.cursor/debug.log', 'a') as f:
-                f.write(json.dumps({"id":"log_after_set_page_config","timestamp":int(datetime.now().timestamp()*1000),"location":"app.py:220","message":"After set_page_config","data":{"step":"page_config_success"},"sessionId":"debug-session","runId":"run1","hypothesisId":"C"}) + "\n")
-        except: pass
-        # #endregion
     except Exception as e:
-        # #region agent log
-        try:
-            with open('/Users/pavelkokora/crewai_agent/.cursor/debug.log', 'a') as f:
-                f.write(json.dumps({"id":"log_set_page_config_error","timestamp":int(datetime.now().timestamp()*1000),"location":"app.py:223","message":"set_page_config error","data":{"error":str(e),"traceback":traceback.format_exc()},"sessionId":"debug-session","runId":"run1","hypothesisId":"C"}) + "\n")
-        except: pass
-        # #endregion
+        logger.error(f"❌ Ошибка настройки страницы: {str(e)}", exc_info=True)
         st.error(f"Ошибка настройки страницы: {str(e)}")
         return
     
@@ -336,6 +425,10 @@ def main():
         st.session_state.result = None
     if 'last_topic' not in st.session_state:
         st.session_state.last_topic = None
+    if 'task' not in st.session_state:
+        st.session_state.task = None
+    if 'task_error' not in st.session_state:
+        st.session_state.task_error = None
     
     # Sidebar с настройками (webhook URL и API URL)
     with st.sidebar:
@@ -352,13 +445,6 @@ def main():
             help="URL API сервера для просмотра результатов (например, Railway app URL)"
         )
     
-    # #region agent log
-    try:
-        with open('/Users/pavelkokora/crewai_agent/.cursor/debug.log', 'a') as f:
-            f.write(json.dumps({"id":"log_before_title","timestamp":int(datetime.now().timestamp()*1000),"location":"app.py:235","message":"Before st.title","data":{"step":"before_title"},"sessionId":"debug-session","runId":"run1","hypothesisId":"B"}) + "\n")
-    except: pass
-    # #endregion
-    
     # ЗАГОЛОВОК - показывается ПЕРВЫМ при открытии сайта
     st.title("🚀 CrewAI - Поиск новостей и создание блог-постов")
     
@@ -368,13 +454,6 @@ def main():
     with tab1:
         st.markdown("---")
         
-        # #region agent log
-        try:
-            with open('/Users/pavelkokora/crewai_agent/.cursor/debug.log', 'a') as f:
-                f.write(json.dumps({"id":"log_after_title","timestamp":int(datetime.now().timestamp()*1000),"location":"app.py:240","message":"After st.title","data":{"step":"title_displayed"},"sessionId":"debug-session","runId":"run1","hypothesisId":"B"}) + "\n")
-        except: pass
-        # #endregion
-        
         # ПОЛЕ ВВОДА ТЕМЫ - показывается сразу после заголовка
         st.subheader("Введите тему для исследования")
         topic = st.text_input(
@@ -395,85 +474,88 @@ def main():
                 st.warning("⚠️ Пожалуйста, введите тему для исследования")
                 st.stop()
             
-            # БЕЗОПАСНО получаем API ключи (сначала из st.secrets, затем из os.environ)
-            # ВАЖНО: Никогда не выводите ключи через st.write(), print() или в логи!
-            openai_api_key = get_api_key('OPENAI_API_KEY')
-            serper_api_key = get_api_key('SERPER_API_KEY')
-            
-            # Безопасно проверяем API ключи
-            keys_ok, missing_keys = check_api_keys()
-            
-            if not keys_ok:
-                st.error("⚠️ Проблема с API ключами")
-                st.write("Не найдены следующие API ключи:")
-                for key in missing_keys:
-                    st.write(f"- **{key}**")
-                
-                st.write("\n**Где указать ключи:**")
-                st.markdown("""
-                **Для Streamlit Cloud:**
-                - Перейдите в настройки приложения → Secrets
-                - Добавьте ключи в формате:
-                ```toml
-                OPENAI_API_KEY = "ваш_ключ_openai"
-                SERPER_API_KEY = "ваш_ключ_serper"
-                ```
-                
-                **Для локального запуска:**
-                - Создайте файл `.streamlit/secrets.toml` (для Streamlit) или используйте `.env` (для dotenv)
-                - Добавьте ключи в `.streamlit/secrets.toml`:
-                ```toml
-                OPENAI_API_KEY = "ваш_ключ_openai"
-                SERPER_API_KEY = "ваш_ключ_serper"
-                ```
-                или в `.env`:
-                ```
-                OPENAI_API_KEY=ваш_ключ_openai
-                SERPER_API_KEY=ваш_ключ_serper
-                ```
-                """)
-                
-                if 'OPENAI_API_KEY' in missing_keys or 'OPENAI_API_KEY (неверный формат)' in str(missing_keys):
-                    st.info("💡 Ключ OpenAI должен начинаться с `sk-`")
-                st.stop()
-            
-            # Проверяем, что ключ не является примером
-            if openai_api_key and ('your' in openai_api_key.lower() or 'example' in openai_api_key.lower()):
-                st.error("⚠️ Похоже, что вы используете пример ключа вместо реального!")
-                st.write("Пожалуйста, замените ключ на ваш реальный ключ от OpenAI в `st.secrets` или `.env` файле")
-                st.stop()
-            
-            # Устанавливаем ключи в переменные окружения для ChatOpenAI, если они найдены
-            # Это необходимо для работы langchain_openai, но ключи остаются в памяти процесса
-            if openai_api_key:
-                os.environ['OPENAI_API_KEY'] = openai_api_key
-            
-            # Создаем LLM для OpenAI (нужно создавать после получения ключей)
-            openai_llm = ChatOpenAI(
-                model='gpt-4o-mini',  # Используем gpt-4o-mini - быструю и недорогую модель OpenAI
-                temperature=0.7
-            )
-            
-            # Создаем crew и запускаем агентов ТОЛЬКО внутри условия if st.button
-            try:
-                with st.spinner('⏳ Агенты работают...'):
-                    crew = create_research_crew(topic, openai_llm)
-                    result = crew.kickoff()
-                    
-                    # Сохраняем результат в session_state
-                    st.session_state.result = str(result)
-                    st.session_state.last_topic = topic
-                    
-                    # Сохраняем результат в файл
-                    with open('blog_post.txt', 'w', encoding='utf-8') as f:
-                        f.write(str(result))
-                
-                # Показываем сообщение об успешном завершении после spinner
-                st.success("✅ Исследование завершено! Результат отображается ниже.")
-            except Exception as e:
-                st.error(f"❌ Произошла ошибка при выполнении исследования: {str(e)}")
-                st.exception(e)
-                st.stop()
+            st.session_state.task_error = None
+            if api_url and api_url.strip():
+                # Ставим тему в очередь API: crew выполнит worker, а скрипт Streamlit не блокируется.
+                # Ключ идемпотентности один на отправку темы: повторное нажатие после ошибки
+                # или таймаута (задача могла успеть создаться) не создаст вторую задачу
+                pending_submit = st.session_state.get('pending_submit')
+                if not pending_submit or pending_submit['topic'] != topic.strip():
+                    pending_submit = {'topic': topic.strip(), 'key': uuid.uuid4().hex}
+                    st.session_state.pending_submit = pending_submit
+                task_id, error = submit_blog_post(api_url, pending_submit['topic'], pending_submit['key'])
+                if error:
+                    st.error(f"❌ Не удалось поставить задачу в очередь: {error}")
+                    st.stop()
+                # Следующая отправка - новая задача, даже с той же темой
+                st.session_state.pending_submit = None
+                st.session_state.task = {'mode': 'api', 'id': task_id, 'topic': topic, 'status': 'pending'}
+            else:
+                # БЕЗОПАСНО получаем API ключи (сначала из st.secrets, затем из os.environ)
+                # ВАЖНО: Никогда не выводите ключи через st.write(), print() или в логи!
+                openai_api_key = get_api_key('OPENAI_API_KEY')
+                serper_api_key = get_api_key('SERPER_API_KEY')
+
+                # Безопасно проверяем API ключи
+                keys_ok, missing_keys = check_api_keys()
+
+                if not keys_ok:
+                    st.error("⚠️ Проблема с API ключами")
+                    st.write("Не найдены следующие API ключи:")
+                    for key in missing_keys:
+                        st.write(f"- **{key}**")
+
+                    st.write("\n**Где указать ключи:**")
+                    st.markdown("""
+                    **Для Streamlit Cloud:**
+                    - Перейдите в настройки приложения → Secrets
+                    - Добавьте ключи в формате:
+                    ```toml
+                    OPENAI_API_KEY = "ваш_ключ_openai"
+                    SERPER_API_KEY = "ваш_ключ_serper"
+                    ```
+
+                    **Для локального запуска:**
+                    - Создайте файл `.streamlit/secrets.toml` (для Streamlit) или используйте `.env` (для dotenv)
+                    - Добавьте ключи в `.streamlit/secrets.toml`:
+                    ```toml
+                    OPENAI_API_KEY = "ваш_ключ_openai"
+                    SERPER_API_KEY = "ваш_ключ_serper"
+                    ```
+                    или в `.env`:
+                    ```
+                    OPENAI_API_KEY=ваш_ключ_openai
+                    SERPER_API_KEY=ваш_ключ_serper
+                    ```
+                    """)
+
+                    if 'OPENAI_API_KEY' in missing_keys or 'OPENAI_API_KEY (неверный формат)' in str(missing_keys):
+                        st.info("💡 Ключ OpenAI должен начинаться с `sk-`")
+                    st.stop()
+
+                # Проверяем, что ключ не является примером
+                if openai_api_key and ('your' in openai_api_key.lower() or 'example' in openai_api_key.lower()):
+                    st.error("⚠️ Похоже, что вы используете пример ключа вместо реального!")
+                    st.write("Пожалуйста, замените ключ на ваш реальный ключ от OpenAI в `st.secrets` или `.env` файле")
+                    st.stop()
+
+                # Устанавливаем ключи в переменные окружения для ChatOpenAI и клиента Serper, если они найдены
+                # Это необходимо для работы langchain_openai, но ключи остаются в памяти процесса
+                if openai_api_key:
+                    os.environ['OPENAI_API_KEY'] = openai_api_key
+                # Общий клиент Serper (search_client.py) читает ключ из SERPER_API_KEY
+                if serper_api_key:
+                    os.environ['SERPER_API_KEY'] = serper_api_key
+
+                # Запускаем crew в фоновом пуле процесса (общий для всех сессий), клиент OpenAI переиспользуется
+                job_id = get_local_runner().submit(topic, get_llm(openai_api_key))
+                st.session_state.task = {'mode': 'local', 'id': job_id, 'topic': topic, 'status': 'pending'}
+        
+        # Прогресс запущенной задачи: переживает перезапуски скрипта, результат ищется по id задачи
+        if st.session_state.task:
+            track_task_progress(api_url)
+        if st.session_state.task_error:
+            st.error(f"❌ Произошла ошибка при выполнении исследования: {st.session_state.task_error}")
         
         # Отображение результата (показывается после запуска агентов)
         if st.session_state.result:
@@ -537,125 +619,129 @@ def main():
         if not api_url or not api_url.strip():
             st.info("ℹ️ Для просмотра истории результатов укажите URL API сервера в боковой панели (Настройки → API Server URL)")
         else:
-            # Кнопка обновления
-            col1, col2 = st.columns([1, 4])
-            with col1:
-                refresh_button = st.button("🔄 Обновить", use_container_width=True)
+            # Фильтры в форме: запрос уходит по кнопке, а не на каждое изменение поля
+            with st.form('history_filters_form'):
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    filter_topic = st.text_input(
+                        "🔍 Фильтр по теме",
+                        placeholder="Введите тему для поиска...",
+                        help="Поиск по теме выполняется на сервере по всем блог-постам"
+                    )
+                with col2:
+                    filter_status_label = st.selectbox("Статус", list(HISTORY_STATUS_OPTIONS))
+                st.form_submit_button("Применить")
+            
+            filter_topic = filter_topic.strip()
+            filter_status = HISTORY_STATUS_OPTIONS[filter_status_label]
             
-            # Получаем данные
-            if refresh_button or 'blog_posts_data' not in st.session_state:
-                with st.spinner('⏳ Загрузка данных...'):
-                    posts, error = get_blog_posts(api_url)
-                    st.session_state.blog_posts_data = posts
-                    st.session_state.blog_posts_error = error
+            # Стек курсоров страниц: None - первая страница. Новые фильтры - снова с первой
+            if st.session_state.get('history_filters') != (filter_topic, filter_status):
+                st.session_state.history_filters = (filter_topic, filter_status)
+                st.session_state.history_cursors = [None]
+            cursors = st.session_state.history_cursors
             
-            posts = st.session_state.get('blog_posts_data')
-            error = st.session_state.get('blog_posts_error')
+            if st.button("🔄 Обновить"):
+                fetch_blog_posts_page.clear()
+            
+            with st.spinner('⏳ Загрузка данных...'):
+                page, error = get_blog_posts(api_url, filter_topic, filter_status, cursors[-1])
             
             # Отображаем ошибку, если есть
             if error:
                 st.error(f"❌ Ошибка при загрузке данных: {error}")
                 st.info("💡 Проверьте URL API сервера в боковой панели. Пример: https://your-app.railway.app")
                 st.code(f"URL: {api_url}/webhook/results", language="text")
-            elif posts is None:
-                st.error("❌ Ошибка при загрузке данных. Проверьте URL API сервера в настройках.")
-            elif len(posts) == 0:
-                st.info("📭 Пока нет созданных блог-постов. Создайте первый блог-пост во вкладке 'Создать блог-пост'.")
+            elif not page.get('results'):
+                if filter_topic or filter_status:
+                    st.info("🔍 По заданным фильтрам ничего не найдено.")
+                else:
+                    st.info("📭 Пока нет созданных блог-постов. Создайте первый блог-пост во вкладке 'Создать блог-пост'.")
             else:
-                st.success(f"✅ Найдено результатов: {len(posts)}")
+                posts = page['results']
+                total = page.get('total')
+                if total is not None:
+                    st.success(f"✅ Найдено результатов: {'около ' if page.get('total_is_estimate') else ''}{total}")
+                
+                # Подготовка данных для таблицы
+                table_data = []
+                for post in posts:
+                    table_data.append({
+                        'ID': post.get('id', ''),
+                        'Тема': post.get('topic', ''),
+                        'Автор': post.get('author', 'Не указан'),
+                        'Дата': post.get('date', 'Не указана'),
+                        'Создано': post.get('created_at', '')[:19] if post.get('created_at') else '',
+                        'Статус': post.get('status', '')
+                    })
                 
-                # Фильтр по теме
-                filter_topic = st.text_input(
-                    "🔍 Фильтр по теме",
-                    placeholder="Введите тему для поиска...",
-                    help="Отфильтровать результаты по теме"
+                # Отображаем таблицу
+                st.dataframe(
+                    table_data,
+                    use_container_width=True,
+                    hide_index=True
                 )
                 
-                # Фильтруем данные
-                if filter_topic:
-                    filtered_posts = [p for p in posts if filter_topic.lower() in p.get('topic', '').lower()]
-                else:
-                    filtered_posts = posts
+                # Навигация по страницам
+                col1, col2, col3 = st.columns([1, 2, 1])
+                with col1:
+                    if st.button("← Назад", disabled=len(cursors) == 1, use_container_width=True):
+                        cursors.pop()
+                        st.rerun()
+                with col2:
+                    st.caption(f"Страница {len(cursors)}")
+                with col3:
+                    if st.button("Далее →", disabled=not page.get('next_cursor'), use_container_width=True):
+                        cursors.append(page['next_cursor'])
+                        st.rerun()
                 
-                if len(filtered_posts) == 0:
-                    st.info(f"🔍 По запросу '{filter_topic}' ничего не найдено.")
-                else:
-                    # Подготовка данных для таблицы
-                    table_data = []
-                    for post in filtered_posts:
-                        table_data.append({
-                            'ID': post.get('id', ''),
-                            'Тема': post.get('topic', ''),
-                            'Автор': post.get('author', 'Не указан'),
-                            'Дата': post.get('date', 'Не указана'),
-                            'Создано': post.get('created_at', '')[:19] if post.get('created_at') else '',
-                            'Статус': post.get('status', '')
-                        })
-                    
-                    # Отображаем таблицу
-                    st.dataframe(
-                        table_data,
-                        use_container_width=True,
-                        hide_index=True
-                    )
-                    
-                    # Детальный просмотр
-                    st.markdown("---")
-                    st.subheader("📄 Детальный просмотр")
-                    
-                    post_ids = [f"ID: {p['ID']} - {p['Тема']}" for p in table_data]
-                    selected_post_str = st.selectbox(
-                        "Выберите блог-пост для просмотра:",
-                        post_ids
+                # Детальный просмотр
+                st.markdown("---")
+                st.subheader("📄 Детальный просмотр")
+                
+                posts_by_id = {post['id']: post for post in posts}
+                selected_post_id = st.selectbox(
+                    "Выберите блог-пост для просмотра:",
+                    list(posts_by_id),
+                    index=None,
+                    placeholder="Блог-пост не выбран",
+                    format_func=lambda post_id: f"ID: {post_id} - {posts_by_id[post_id].get('topic', '')}"
+                )
+                
+                if selected_post_id is not None:
+                    # Список приходит без текста постов, полный текст загружаем только для выбранного
+                    selected_post, post_error = get_blog_post(
+                        api_url, selected_post_id,
+                        completed=posts_by_id[selected_post_id].get('status') == 'completed'
                     )
                     
-                    if selected_post_str:
-                        selected_post_id = int(selected_post_str.split(' - ')[0].replace('ID: ', ''))
-                        selected_post = next((p for p in filtered_posts if p.get('id') == selected_post_id), None)
+                    if post_error:
+                        st.error(f"❌ {post_error}")
+                    elif selected_post:
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.markdown(f"**Тема:** {selected_post.get('topic', '')}")
+                            st.markdown(f"**Автор:** {selected_post.get('author', 'Не указан')}")
+                        with col2:
+                            st.markdown(f"**Дата:** {selected_post.get('date', 'Не указана')}")
+                            st.markdown(f"**Создано:** {selected_post.get('created_at', '')[:19] if selected_post.get('created_at') else ''}")
                         
-                        if selected_post:
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                st.markdown(f"**Тема:** {selected_post.get('topic', '')}")
-                                st.markdown(f"**Автор:** {selected_post.get('author', 'Не указан')}")
-                            with col2:
-                                st.markdown(f"**Дата:** {selected_post.get('date', 'Не указана')}")
-                                st.markdown(f"**Создано:** {selected_post.get('created_at', '')[:19] if selected_post.get('created_at') else ''}")
-                            
-                            st.markdown("---")
-                            st.markdown("**Содержание:**")
-                            st.markdown(selected_post.get('content', ''))
-                            
-                            # Кнопка скачивания
-                            st.download_button(
-                                label="📥 Скачать блог-пост",
-                                data=selected_post.get('content', ''),
-                                file_name=f"blog_post_{selected_post.get('topic', 'post').replace(' ', '_')}_{selected_post.get('id', '')}.txt",
-                                mime="text/plain"
-                            )
+                        st.markdown("---")
+                        st.markdown("**Содержание:**")
+                        st.markdown(selected_post.get('content', ''))
+                        
+                        # Кнопка скачивания
+                        st.download_button(
+                            label="📥 Скачать блог-пост",
+                            data=selected_post.get('content', ''),
+                            file_name=f"blog_post_{selected_post.get('topic', 'post').replace(' ', '_')}_{selected_post.get('id', '')}.txt",
+                            mime="text/plain"
+                        )
 
 if __name__ == '__main__':
-    # #region agent log
-    try:
-        with open('/Users/pavelkokora/crewai_agent/.cursor/debug.log', 'a') as f:
-            f.write(json.dumps({"id":"log_script_start","timestamp":int(datetime.now().timestamp()*1000),"location":"app.py:361","message":"Script started, calling main()","data":{"step":"script_entry"},"sessionId":"debug-session","runId":"run1","hypothesisId":"A"}) + "\n")
-    except: pass
-    # #endregion
-    
     try:
         main()
-        # #region agent log
-        try:
-            with open('/Users/pavelkokora/crewai_agent/.cursor/debug.log', 'a') as f:
-                f.write(json.dumps({"id":"log_main_complete","timestamp":int(datetime.now().timestamp()*1000),"location":"app.py:367","message":"main() completed","data":{"step":"main_complete"},"sessionId":"debug-session","runId":"run1","hypothesisId":"B"}) + "\n")
-        except: pass
-        # #endregion
     except Exception as e:
-        # #region agent log
-        try:
-            with open('/Users/pavelkokora/crewai_agent/.cursor/debug.log', 'a') as f:
-                f.write(json.dumps({"id":"log_main_exception","timestamp":int(datetime.now().timestamp()*1000),"location":"app.py:370","message":"Exception in main()","data":{"error":str(e),"traceback":traceback.format_exc()},"sessionId":"debug-session","runId":"run1","hypothesisId":"B"}) + "\n")
-        except: pass
-        # #endregion
+        logger.error(f"❌ Критическая ошибка в приложении: {str(e)}", exc_info=True)
         st.error(f"Критическая ошибка: {str(e)}")
         st.exception(e)
@@ -0,0 +1,77 @@
+"""
+Микробенчмарк подготовки crew к прогону, без вызовов LLM и Serper:
+
+- до:    на каждую задачу заново собираются агенты, задачи и Crew (валидация pydantic)
+- после: экземпляр берется из CrewTemplate (crews.py), остается подставить тему
+
+Подстановка темы в обоих случаях измеряется через Crew._interpolate_inputs -
+тот же шаг, который CrewAI выполняет в начале kickoff(inputs=...).
+
+Пример:
+    python crew_benchmark.py --iterations 200
+"""
+import os
+import time
+import argparse
+from crews import build_research_crew, CrewTemplate
+
+TOPICS = ['AI Agents', 'машинное обучение', 'блокчейн', 'квантовые компьютеры']
+
+
+def percentile(values, fraction: float) -> float:
+    """Перцентиль по отсортированному списку (fraction от 0 до 1)."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def measure(prepare, iterations: int) -> list:
+    """Длительности prepare(topic) в секундах, отсортированные по возрастанию."""
+    durations = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        prepare(TOPICS[i % len(TOPICS)])
+        durations.append(time.perf_counter() - started)
+    return sorted(durations)
+
+
+def report(label: str, durations: list):
+    print(f"{label}: среднее {sum(durations) / len(durations) * 1000:.2f} мс, "
+          f"p50 {percentile(durations, 0.5) * 1000:.2f} мс, "
+          f"p95 {percentile(durations, 0.95) * 1000:.2f} мс")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Стоимость подготовки crew к прогону: до и после шаблона')
+    parser.add_argument('--iterations', type=int, default=200, help='Количество подготовок на вариант')
+    args = parser.parse_args(argv)
+
+    # Клиент LLM нужен только для валидации агентов: запросов к OpenAI бенчмарк не делает
+    os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+    from langchain_openai import ChatOpenAI
+    llm = ChatOpenAI(model='gpt-4o-mini', temperature=0.7)
+
+    def rebuild_per_task(topic: str):
+        build_research_crew(llm)._interpolate_inputs({'topic': topic})
+
+    template = CrewTemplate(build_research_crew, llm, ('topic',))
+    template.warm_up()
+
+    def reuse_template(topic: str):
+        with template.checkout() as crew:
+            crew._interpolate_inputs({'topic': topic})
+
+    # Прогрев импортов и кэшей pydantic, чтобы первый вариант не платил за них
+    rebuild_per_task(TOPICS[0])
+    reuse_template(TOPICS[0])
+
+    before = measure(rebuild_per_task, args.iterations)
+    after = measure(reuse_template, args.iterations)
+    report('до (сборка crew на задачу)', before)
+    report('после (шаблон crew)      ', after)
+    print(f"Ускорение подготовки: x{sum(before) / max(sum(after), 1e-9):.1f}, шаблон: {template.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+"""
+Метрики прогонов crew: время каждой задачи (этапа), задержка каждого вызова
+инструмента, количество вызовов LLM, токены и оценка стоимости.
+
+worker.py собирает метрики прогона в RunMetrics и сохраняет их в таблицу crew_runs
+(migrations/010_crew_runs.sql), api.py отдает агрегаты по ней в /metrics.
+Текущий прогон хранится в thread-local: каждый слот worker выполняет свой crew
+в своем потоке, а инструменты и LLM вызываются в том же потоке, что и kickoff().
+
+Токены берутся из ответа каждого вызова litellm.completion (через него CrewAI
+обращается к модели), а не из счетчиков агентов CrewAI: их обработчик litellm
+регистрирует глобально и вызывает в фоновом потоке уже после callback задачи,
+так что токены попадают не в тот этап и смешиваются между слотами.
+"""
+import os
+import json
+import functools
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Цена gpt-4o-mini в долларах за 1M токенов; для другой модели задайте свои
+PROMPT_PRICE_PER_1M = float(os.getenv('LLM_PRICE_PROMPT_PER_1M', 0.15))
+COMPLETION_PRICE_PER_1M = float(os.getenv('LLM_PRICE_COMPLETION_PER_1M', 0.60))
+
+_local = threading.local()
+
+
+def estimate_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    """Оценка стоимости вызовов LLM в долларах по ценам из окружения."""
+    return (prompt_tokens * PROMPT_PRICE_PER_1M + completion_tokens * COMPLETION_PRICE_PER_1M) / 1_000_000
+
+
+class RunMetrics:
+    """
+    Метрики одного прогона crew.
+
+    Задачи crew выполняются последовательно, поэтому текущий этап - первая
+    незавершенная задача: все вызовы LLM и инструментов до ее callback
+    относятся к ней.
+
+    Args:
+        task_id: ID задачи в blog_posts
+        stages: Имена этапов в порядке задач crew, например ['research', 'writing']
+        reused_research: Исследование взято из кэша исследований
+    """
+
+    def __init__(self, task_id: int, stages, reused_research: bool = False):
+        self.task_id = task_id
+        self.reused_research = reused_research
+        self.started_at = time.time()
+        self._started = time.monotonic()
+        self._stage_started = self._started
+        self.stages = [
+            {'name': name, 'seconds': None, 'llm_calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+            for name in stages
+        ]
+        self._current = 0
+        self.tool_calls = []
+        self.total_seconds = None
+        self.status = None
+
+    @property
+    def current_stage(self):
+        return self.stages[min(self._current, len(self.stages) - 1)]
+
+    def task_callback(self, output=None):
+        """Callback для Task(callback=...): закрывает текущий этап."""
+        now = time.monotonic()
+        if self._current < len(self.stages):
+            self.stages[self._current]['seconds'] = now - self._stage_started
+            self._current += 1
+        self._stage_started = now
+
+    def record_tool_call(self, tool: str, seconds: float, ok: bool = True):
+        self.tool_calls.append({
+            'tool': tool,
+            'stage': self.current_stage['name'],
+            'seconds': round(seconds, 4),
+            'ok': ok,
+        })
+
+    def record_llm_call(self, prompt_tokens: int = 0, completion_tokens: int = 0):
+        stage = self.current_stage
+        stage['llm_calls'] += 1
+        stage['prompt_tokens'] += prompt_tokens
+        stage['completion_tokens'] += completion_tokens
+
+    def finish(self, status: str):
+        """Завершает прогон: незакрытый этап получает оставшееся время."""
+        now = time.monotonic()
+        for stage in self.stages[self._current:]:
+            if stage['seconds'] is None:
+                stage['seconds'] = now - self._stage_started
+                self._stage_started = now
+        self.total_seconds = now - self._started
+        self.status = status
+
+    @property
+    def llm_calls(self) -> int:
+        return sum(stage['llm_calls'] for stage in self.stages)
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(stage['prompt_tokens'] for stage in self.stages)
+
+    @property
+    def completion_tokens(self) -> int:
+        return sum(stage['completion_tokens'] for stage in self.stages)
+
+    @property
+    def cost_usd(self) -> float:
+        return estimate_cost(self.prompt_tokens, self.completion_tokens)
+
+    def summary(self) -> str:
+        """Строка для лога: время по этапам, инструменты, токены и стоимость."""
+        stages = ', '.join(f"{stage['name']} {stage['seconds'] or 0:.1f} сек" for stage in self.stages)
+        tool_seconds = sum(call['seconds'] for call in self.tool_calls)
+        return (f"{self.total_seconds or 0:.1f} сек ({stages}); инструменты: {len(self.tool_calls)} вызовов, "
+                f"{tool_seconds:.1f} сек; LLM: {self.llm_calls} вызовов, "
+                f"{self.prompt_tokens}+{self.completion_tokens} токенов, ~${self.cost_usd:.4f}")
+
+    def save(self):
+        """Сохраняет прогон в crew_runs; ошибка записи метрик не ломает задачу."""
+        try:
+            from db import get_db_connection
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute('''
+                        INSERT INTO crew_runs (task_id, started_at, status, reused_research, total_seconds,
+                                               llm_calls, prompt_tokens, completion_tokens, cost_usd,
+                                               stages, tool_calls)
+                        VALUES (%s, to_timestamp(%s), %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ''', (self.task_id, self.started_at, self.status, self.reused_research, self.total_seconds,
+                          self.llm_calls, self.prompt_tokens, self.completion_tokens, self.cost_usd,
+                          json.dumps(self.stages), json.dumps(self.tool_calls)))
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка сохранения метрик прогона задачи {self.task_id}: {str(e)}")
+
+
+def current_run():
+    """RunMetrics прогона, выполняющегося в этом потоке, или None."""
+    return getattr(_local, 'run', None)
+
+
+@contextmanager
+def track_run(metrics: RunMetrics):
+    """Делает metrics текущим прогоном потока на время блока with."""
+    previous = current_run()
+    _local.run = metrics
+    try:
+        yield metrics
+    finally:
+        _local.run = previous
+
+
+@contextmanager
+def timed_tool_call(tool: str):
+    """Замеряет вызов инструмента и записывает его в текущий прогон (если он есть)."""
+    started = time.monotonic()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        run = current_run()
+        if run is not None:
+            run.record_tool_call(tool, time.monotonic() - started, ok)
+
+
+def record_completion_usage(response):
+    """Записывает вызов LLM и его токены (response.usage) в текущий прогон потока, если он есть."""
+    run = current_run()
+    if run is None:
+        return
+    usage = response.get('usage') if isinstance(response, dict) else getattr(response, 'usage', None)
+    get = usage.get if isinstance(usage, dict) else lambda key, default=0: getattr(usage, key, default)
+    run.record_llm_call(int(get('prompt_tokens', 0) or 0), int(get('completion_tokens', 0) or 0))
+
+
+def metered(completion):
+    """Оборачивает функцию вызова LLM: ответ учитывается в текущем прогоне потока."""
+    @functools.wraps(completion)
+    def wrapper(*args, **kwargs):
+        response = completion(*args, **kwargs)
+        record_completion_usage(response)
+        return response
+
+    wrapper.metered = True
+    return wrapper
+
+
+def install_usage_tracking():
+    """
+    Подключает учет вызовов LLM к litellm.completion (один раз на процесс).
+
+    CrewAI вызывает litellm.completion синхронно в потоке kickoff(), поэтому вызов
+    попадает в этап, который выполняется в этом потоке, - без смешивания между слотами.
+    """
+    import litellm
+    if not getattr(litellm.completion, 'metered', False):
+        litellm.completion = metered(litellm.completion)
+
+
+# Границы бакетов гистограммы длительности прогона для /metrics, в секундах
+RUN_DURATION_BUCKETS = (30, 60, 120, 180, 300, 600, 900, 1800)
+
+
+# Прогоны, записанные позже этой задержки, /metrics дочитает на следующем опросе
+RUN_AGGREGATES_SETTLE_SECONDS = float(os.getenv('RUN_AGGREGATES_SETTLE_SECONDS', 10))
+
+# Накопленные агрегаты процесса: каждый опрос /metrics добавляет только прогоны после last_id
+_aggregates_lock = threading.Lock()
+_aggregates = {'last_id': 0, 'totals': {}, 'histogram': None, 'stages': {}, 'tools': {}}
+
+
+def _number(value):
+    return value if isinstance(value, int) else float(value)
+
+
+def _accumulate(target: dict, rows, key_size: int):
+    """Добавляет строки GROUP BY к накопленным суммам: ключ - первые key_size колонок."""
+    for row in rows:
+        key, values = tuple(row[:key_size]), [_number(value) for value in row[key_size:]]
+        previous = target.get(key)
+        target[key] = values if previous is None else [a + b for a, b in zip(previous, values)]
+
+
+def load_run_aggregates() -> dict:
+    """
+    Агрегаты по всем прогонам из crew_runs для /metrics: итоги по статусам,
+    гистограмма длительности, время и токены по этапам и вызовы инструментов.
+
+    Суммы копятся в процессе: первый опрос читает всю таблицу, следующие - только
+    прогоны с id больше последнего учтенного, записанные раньше чем
+    RUN_AGGREGATES_SETTLE_SECONDS назад (migrations/012_crew_runs_recorded_at.sql).
+    """
+    from db import get_db_connection
+    buckets_sql = ', '.join(f'count(*) FILTER (WHERE total_seconds <= {bound})' for bound in RUN_DURATION_BUCKETS)
+    with _aggregates_lock:
+        last_id = _aggregates['last_id']
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT max(id) FROM crew_runs
+                    WHERE id > %s AND recorded_at < now() - make_interval(secs => %s)
+                ''', (last_id, RUN_AGGREGATES_SETTLE_SECONDS))
+                next_id = cursor.fetchone()[0]
+                if next_id is not None:
+                    window = (last_id, next_id)
+                    cursor.execute('''
+                        SELECT status, reused_research, count(*), coalesce(sum(total_seconds), 0),
+                               coalesce(sum(llm_calls), 0), coalesce(sum(prompt_tokens), 0),
+                               coalesce(sum(completion_tokens), 0), coalesce(sum(cost_usd), 0)
+                        FROM crew_runs
+                        WHERE id > %s AND id <= %s
+                        GROUP BY status, reused_research
+                    ''', window)
+                    totals = cursor.fetchall()
+                    cursor.execute(f'''
+                        SELECT {buckets_sql}, count(*), coalesce(sum(total_seconds), 0)
+                        FROM crew_runs
+                        WHERE id > %s AND id <= %s
+                    ''', window)
+                    histogram = cursor.fetchone()
+                    cursor.execute('''
+                        SELECT stage->>'name', count(*), coalesce(sum((stage->>'seconds')::float), 0),
+                               coalesce(sum((stage->>'llm_calls')::int), 0),
+                               coalesce(sum((stage->>'prompt_tokens')::int), 0),
+                               coalesce(sum((stage->>'completion_tokens')::int), 0)
+                        FROM crew_runs, jsonb_array_elements(stages) AS stage
+                        WHERE id > %s AND id <= %s
+                        GROUP BY 1
+                    ''', window)
+                    stages = cursor.fetchall()
+                    cursor.execute('''
+                        SELECT call->>'tool', (call->>'ok')::boolean, count(*),
+                               coalesce(sum((call->>'seconds')::float), 0)
+                        FROM crew_runs, jsonb_array_elements(tool_calls) AS call
+                        WHERE id > %s AND id <= %s
+                        GROUP BY 1, 2
+                    ''', window)
+                    tools = cursor.fetchall()
+        
+        if next_id is not None:
+            _accumulate(_aggregates['totals'], totals, 2)
+            _accumulate(_aggregates['stages'], stages, 1)
+            _accumulate(_aggregates['tools'], tools, 2)
+            histogram = [_number(value) for value in histogram]
+            previous = _aggregates['histogram']
+            _aggregates['histogram'] = histogram if previous is None else [a + b for a, b in zip(previous, histogram)]
+            _aggregates['last_id'] = next_id
+        
+        histogram = _aggregates['histogram'] or [0] * (len(RUN_DURATION_BUCKETS) + 2)
+        return {
+            'totals': [key + tuple(values) for key, values in _aggregates['totals'].items()],
+            'histogram': {
+                'buckets': dict(zip(RUN_DURATION_BUCKETS + ('+Inf',), histogram[:len(RUN_DURATION_BUCKETS)] + [histogram[-2]])),
+                'count': histogram[-2],
+                'sum': float(histogram[-1]),
+            },
+            'stages': [key + tuple(values) for key, values in _aggregates['stages'].items()],
+            'tools': [key + tuple(values) for key, values in _aggregates['tools'].items()],
+        }
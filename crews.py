@@ -0,0 +1,299 @@
+"""
+Команда агентов (crew) для генерации блог-поста: исследователь ищет новости
+через инструменты tools.py, писатель пишет пост на русском языке.
+
+Модуль тянет за собой crewai и langchain, поэтому его импортируют только те,
+кто действительно запускает crew: worker.py и app.py (лениво, при запуске).
+main.py - отдельный скрипт для разового запуска со своим crew, а api.py только
+ставит задачи в очередь; ни тот, ни другой этот модуль не импортируют.
+
+Агенты и задачи описаны шаблонами с плейсхолдерами {topic} (и {research} у писателя):
+CrewTemplate создает crew один раз на процесс и переиспользует его, а тема
+подставляется при запуске через crew.kickoff(inputs={'topic': ...}).
+"""
+import re
+import threading
+from contextlib import contextmanager
+from crewai import Agent, Task, Crew, Process
+from tools import serper_search, serper_multi_search
+
+# Плейсхолдер в текстах агентов и задач, который CrewAI заполняет из kickoff(inputs=...)
+_PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+
+def build_research_crew(llm, task_callback=None):
+    """
+    Создает шаблон Crew для исследования темы и написания блог-поста.
+    Тема в текстах - плейсхолдер {topic}, он заполняется при kickoff(inputs={'topic': ...}).
+    
+    Args:
+        llm: LLM объект для использования агентами
+        task_callback: Необязательный callback по завершении каждой задачи
+    
+    Returns:
+        Crew объект с плейсхолдером {topic}
+    """
+    # Создаем агента-исследователя
+    researcher = Agent(
+        role='Исследователь новостей',
+        goal='Найти актуальные и релевантные новости про {topic} в интернете',
+        backstory='''Ты опытный исследователь, специализирующийся на поиске и анализе 
+        информации в интернете. Ты умеешь находить самые свежие и важные новости 
+        по теме "{topic}", анализировать их и предоставлять структурированную информацию.''',
+        verbose=True,
+        allow_delegation=False,
+        tools=[serper_search, serper_multi_search],
+        # Crew живет весь процесс: кэш инструментов CrewAI без TTL отдавал бы старые новости,
+        # результаты поиска кэширует search_cache.py
+        cache=False,
+        llm=llm
+    )
+    
+    # Создаем агента-писателя
+    writer = Agent(
+        role='Блог-писатель',
+        goal='Написать интересный и информативный пост для блога на русском языке о теме "{topic}" на основе найденных новостей',
+        backstory='''Ты талантливый блог-писатель, который специализируется на 
+        написании информативных статей. Ты умеешь структурировать информацию, 
+        делать ее понятной для широкой аудитории и писать увлекательные тексты 
+        на русском языке.''',
+        verbose=True,
+        allow_delegation=False,
+        llm=llm
+    )
+    
+    # Создаем задачу для исследования
+    research_task = Task(
+        description='''Найди в интернете последние новости (за последние 1-2 недели) 
+        про {topic}. Собери информацию о 3-5 самых интересных и важных новостях. 
+        Включи в результат:
+        - Название новости
+        - Источник и дату публикации
+        - Краткое описание содержания
+        - Почему эта новость важна
+        Если нужно несколько поисковых запросов, передай их одним списком 
+        в инструмент параллельного поиска.''',
+        agent=researcher,
+        expected_output='Структурированный список из 3-5 новостей про {topic} с названиями, источниками, датами и описаниями',
+        callback=task_callback
+    )
+    
+    # Создаем задачу для написания поста
+    writing_task = Task(
+        description='''Используй результаты исследования новостей про {topic}, чтобы 
+        написать короткий блог-пост на русском языке. Пост должен быть:
+        - Информативным и интересным
+        - Структурированным (с заголовком и несколькими абзацами)
+        - Написанным для широкой аудитории
+        - Объемом примерно 300-500 слов
+        - Включать ключевые моменты из найденных новостей
+        - Основанным на информации, которую собрал исследователь''',
+        agent=writer,
+        context=[research_task],
+        expected_output='Полноценный блог-пост на русском языке объемом 300-500 слов про {topic} с заголовком и структурированным содержанием',
+        callback=task_callback
+    )
+    
+    # Создаем crew (команду)
+    return Crew(
+        agents=[researcher, writer],
+        tasks=[research_task, writing_task],
+        process=Process.sequential,
+        cache=False,
+        verbose=True
+    )
+
+
+def build_writing_crew(llm, task_callback=None):
+    """
+    Создает шаблон Crew только с писателем: исследование уже есть в кэше исследований.
+    Плейсхолдеры: {topic} и {research} (готовый результат исследования похожей темы).
+    
+    Args:
+        llm: LLM объект для использования агентом
+        task_callback: Необязательный callback по завершении задачи
+    
+    Returns:
+        Crew объект с плейсхолдерами {topic} и {research}
+    """
+    writer = Agent(
+        role='Блог-писатель',
+        goal='Написать интересный и информативный пост для блога на русском языке о теме "{topic}" на основе найденных новостей',
+        backstory='''Ты талантливый блог-писатель, который специализируется на 
+        написании информативных статей. Ты умеешь структурировать информацию, 
+        делать ее понятной для широкой аудитории и писать увлекательные тексты 
+        на русском языке.''',
+        verbose=True,
+        allow_delegation=False,
+        llm=llm
+    )
+    
+    writing_task = Task(
+        description='''Используй результаты исследования новостей ниже, чтобы 
+        написать короткий блог-пост на русском языке про {topic}. Пост должен быть:
+        - Информативным и интересным
+        - Структурированным (с заголовком и несколькими абзацами)
+        - Написанным для широкой аудитории
+        - Объемом примерно 300-500 слов
+        - Включать ключевые моменты из найденных новостей
+        - Основанным только на информации из исследования
+        
+        Результаты исследования:
+        {research}''',
+        agent=writer,
+        expected_output='Полноценный блог-пост на русском языке объемом 300-500 слов про {topic} с заголовком и структурированным содержанием',
+        callback=task_callback
+    )
+    
+    return Crew(
+        agents=[writer],
+        tasks=[writing_task],
+        process=Process.sequential,
+        cache=False,
+        verbose=True
+    )
+
+
+def get_research_output(crew) -> str:
+    """Возвращает текст результата задачи исследователя (первой задачи crew) после kickoff."""
+    output = crew.tasks[0].output
+    if output is None:
+        return ''
+    return str(getattr(output, 'raw', None) or output)
+
+
+def template_placeholders(crew) -> set:
+    """Имена плейсхолдеров {...} во всех текстах агентов и задач crew."""
+    texts = []
+    for agent in crew.agents:
+        texts.extend([agent.role, agent.goal, agent.backstory])
+    for task in crew.tasks:
+        texts.extend([task.description, task.expected_output])
+    return {name for text in texts if text for name in _PLACEHOLDER.findall(text)}
+
+
+class _PooledCrew:
+    """Экземпляр crew из пула и callback текущего прогона, на который он перенаправляет задачи."""
+
+    def __init__(self):
+        self.crew = None
+        self.task_callback = None
+
+    def on_task_done(self, output):
+        if self.task_callback is not None:
+            self.task_callback(output)
+
+    def reset(self):
+        """
+        Сбрасывает состояние прошлого прогона, которое CrewAI хранит в агентах и задачах.
+
+        Счетчик ошибок агента (_times_executed) только растет: без сброса после
+        max_retry_limit ошибок за все прогоны экземпляра агент перестает повторять
+        вызов. tools_results копит результаты инструментов всех прогонов, а output
+        задачи остался бы от прошлой темы, если новый прогон ее не выполнит.
+        """
+        for agent in self.crew.agents:
+            agent._times_executed = 0
+            agent.tools_results = []
+        for task in self.crew.tasks:
+            task.output = None
+
+
+class CrewTemplate:
+    """
+    Шаблон crew, который собирается один раз и переиспользуется между прогонами.
+    
+    Один объект Crew нельзя запускать из двух потоков сразу (kickoff пишет результаты
+    задач в сам объект), поэтому шаблон держит пул: прогон берет свободный экземпляр
+    или собирает новый и возвращает его после kickoff. Экземпляров столько, сколько
+    было одновременных прогонов (слотов worker или фоновых задач app.py).
+    
+    Args:
+        build: Функция (llm, task_callback) -> Crew с плейсхолдерами в текстах
+        llm: LLM объект для агентов
+        inputs: Имена плейсхолдеров, которые передаются в kickoff(inputs=...)
+    """
+    
+    def __init__(self, build, llm, inputs):
+        self.build = build
+        self.llm = llm
+        self.inputs = frozenset(inputs)
+        self._idle = []
+        self._lock = threading.Lock()
+        self._created = 0
+        self._reused = 0
+    
+    def _create(self) -> _PooledCrew:
+        instance = _PooledCrew()
+        crew = self.build(self.llm, instance.on_task_done)
+        placeholders = template_placeholders(crew)
+        if placeholders != self.inputs:
+            raise ValueError(f"Плейсхолдеры шаблона {self.build.__name__} {sorted(placeholders)} "
+                             f"не совпадают с входами {sorted(self.inputs)}")
+        instance.crew = crew
+        with self._lock:
+            self._created += 1
+        return instance
+    
+    def warm_up(self):
+        """Собирает и проверяет первый экземпляр заранее: ошибка шаблона видна при старте, а не в задаче."""
+        instance = self._create()
+        with self._lock:
+            self._idle.append(instance)
+    
+    @contextmanager
+    def checkout(self, task_callback=None):
+        """
+        Выдает экземпляр crew на время прогона:
+        
+            with template.checkout(metrics.task_callback) as crew:
+                result = crew.kickoff(inputs={'topic': topic})
+        
+        После ошибки в прогоне экземпляр в пул не возвращается.
+        """
+        with self._lock:
+            instance = self._idle.pop() if self._idle else None
+            if instance is not None:
+                self._reused += 1
+        if instance is None:
+            instance = self._create()
+        else:
+            instance.reset()
+        instance.task_callback = task_callback
+        completed = False
+        try:
+            yield instance.crew
+            completed = True
+        finally:
+            instance.task_callback = None
+            if completed:
+                with self._lock:
+                    self._idle.append(instance)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {'created': self._created, 'reused': self._reused, 'idle': len(self._idle)}
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def get_crew_template(build, llm, inputs) -> CrewTemplate:
+    """Шаблон для пары (build, llm), общий для всего процесса."""
+    key = (build, id(llm))
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is None:
+            template = _templates[key] = CrewTemplate(build, llm, inputs)
+    return template
+
+
+def get_research_template(llm) -> CrewTemplate:
+    """Шаблон исследования и написания поста: kickoff(inputs={'topic': ...})."""
+    return get_crew_template(build_research_crew, llm, ('topic',))
+
+
+def get_writing_template(llm) -> CrewTemplate:
+    """Шаблон только с писателем: kickoff(inputs={'topic': ..., 'research': ...})."""
+    return get_crew_template(build_writing_crew, llm, ('topic', 'research'))
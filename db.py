@@ -0,0 +1,678 @@
+"""
+Общий слой доступа к Supabase PostgreSQL для api.py и worker.py.
+Держит ограниченный потокобезопасный пул соединений, чтобы не платить
+за TLS-рукопожатие и аутентификацию на каждый запрос.
+"""
+import os
+import time
+import logging
+import select
+import threading
+from contextlib import contextmanager
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+logger = logging.getLogger(__name__)
+
+# Канал NOTIFY, в который create_task_in_db сообщает о новой задаче
+NEW_TASK_CHANNEL = 'blog_posts_new_task'
+
+# Канал NOTIFY со сменой статуса задач: payload - JSON {"id": ..., "status": ...}.
+# Текст поста в уведомление не кладется (лимит payload 8000 байт)
+TASK_STATUS_CHANNEL = 'blog_posts_task_status'
+
+# Нормализованная тема для склейки дублей: регистр и лишние пробелы не важны.
+# То же выражение используется в индексе из migrations/003_coalesce_duplicate_topics.sql
+NORMALIZED_TOPIC_SQL = r"lower(regexp_replace(btrim({}), '\s+', ' ', 'g'))"
+
+# Новое значение completed_at (migrations/013) для UPDATE со статусом в параметре:
+# время перехода в 'completed', прежнее значение для уже завершенной задачи, иначе NULL
+COMPLETED_AT_SQL = '''CASE WHEN %s <> 'completed' THEN NULL
+                          WHEN status = 'completed' THEN completed_at
+                          ELSE clock_timestamp() END'''
+
+
+class PoolTimeoutError(Exception):
+    """Свободное соединение не появилось за отведенное время ожидания."""
+
+
+class ConnectionPool:
+    """
+    Ограниченный потокобезопасный пул соединений psycopg2.
+
+    Args:
+        dsn: Строка подключения к PostgreSQL
+        min_size: Сколько соединений держать открытыми постоянно
+        max_size: Максимальное количество одновременно открытых соединений
+        max_lifetime: Через сколько секунд соединение пересоздается
+        checkout_timeout: Сколько секунд ждать свободное соединение
+        health_check_interval: Если соединение простаивало дольше этого
+            времени (в секундах), перед выдачей оно проверяется через SELECT 1
+    """
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10,
+                 max_lifetime: float = 1800, checkout_timeout: float = 10,
+                 health_check_interval: float = 30):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Некорректный размер пула: min={min_size}, max={max_size}")
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+
+        self._lock = threading.Condition()
+        # Свободные соединения: список (conn, created_at, last_used_at)
+        self._idle = []
+        # id(conn) -> created_at для всех открытых соединений
+        self._created_at = {}
+        # Открытые соединения плюс те, что открываются прямо сейчас
+        self._size = 0
+        self._closed = False
+
+        self._stats = {
+            'checkouts': 0,
+            'checkout_timeouts': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'connections_created': 0,
+            'connections_closed': 0,
+            'health_check_failures': 0,
+        }
+
+        for _ in range(min_size):
+            self._size += 1
+            conn = self._connect()
+            now = time.monotonic()
+            self._idle.append((conn, now, now))
+
+    def _connect(self):
+        """Открывает новое соединение; место под него уже зарезервировано в _size."""
+        try:
+            conn = psycopg2.connect(self.dsn)
+        except Exception:
+            with self._lock:
+                self._size -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats['connections_created'] += 1
+        return conn
+
+    def _discard(self, conn):
+        """Закрывает соединение и убирает его из учета пула. Вызывается под блокировкой."""
+        if self._created_at.pop(id(conn), None) is not None:
+            self._size -= 1
+            self._stats['connections_closed'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, created_at: float, last_used_at: float) -> bool:
+        """Проверяет, можно ли выдать соединение из пула."""
+        now = time.monotonic()
+        if conn.closed:
+            return False
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            return False
+        if now - last_used_at > self.health_check_interval:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                conn.rollback()
+            except Exception:
+                with self._lock:
+                    self._stats['health_check_failures'] += 1
+                return False
+        return True
+
+    def getconn(self):
+        """
+        Выдает соединение из пула, при необходимости ожидая освобождения.
+
+        Открытие новых соединений и проверка здоровья выполняются вне блокировки,
+        чтобы медленный TLS-handshake не задерживал остальные потоки.
+
+        Raises:
+            PoolTimeoutError: если соединение не освободилось за checkout_timeout
+        """
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        while True:
+            entry = None
+            with self._lock:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Пул соединений закрыт")
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['checkout_timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"Нет свободных соединений с БД за {self.checkout_timeout} сек "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._lock.wait(remaining)
+
+            if entry is None:
+                conn = self._connect()
+                self._record_checkout(started)
+                return conn
+
+            conn, created_at, last_used_at = entry
+            if self._is_healthy(conn, created_at, last_used_at):
+                self._record_checkout(started)
+                return conn
+            with self._lock:
+                self._discard(conn)
+                self._lock.notify()
+
+    def _record_checkout(self, started: float):
+        waited = time.monotonic() - started
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['wait_seconds_total'] += waited
+            self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], waited)
+
+    def putconn(self, conn, discard: bool = False):
+        """Возвращает соединение в пул (или закрывает его, если discard=True)."""
+        with self._lock:
+            if id(conn) not in self._created_at:
+                return
+            if not discard and not conn.closed:
+                try:
+                    # Не оставляем в пуле соединение с открытой транзакцией
+                    if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                except Exception:
+                    discard = True
+            if discard or conn.closed or self._closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, self._created_at[id(conn)], time.monotonic()))
+            self._lock.notify()
+
+    def closeall(self):
+        """Закрывает все свободные соединения и запрещает новые выдачи."""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                conn, _, _ = self._idle.pop()
+                self._discard(conn)
+            self._lock.notify_all()
+
+    def stats(self) -> dict:
+        """Возвращает метрики пула: выдачи, ожидание, размер."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+            stats['max_size'] = self.max_size
+            checkouts = stats['checkouts']
+            stats['wait_seconds_avg'] = stats['wait_seconds_total'] / checkouts if checkouts else 0.0
+            return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Возвращает общий для процесса пул соединений, создавая его при первом обращении."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                database_url = os.getenv('DATABASE_URL')
+                if not database_url:
+                    raise ValueError("DATABASE_URL not found in environment variables")
+                _pool = ConnectionPool(
+                    database_url,
+                    min_size=int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+                    max_size=int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+                    max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+                    checkout_timeout=float(os.getenv('DB_POOL_TIMEOUT', 10)),
+                    health_check_interval=float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', 30)),
+                )
+                logger.info(f"✅ Пул соединений с БД создан (max_size={_pool.max_size})")
+    return _pool
+
+
+def close_pool():
+    """Закрывает общий пул соединений (при остановке процесса)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def pool_stats() -> dict:
+    """Метрики общего пула или пустой словарь, если пул еще не создан."""
+    return _pool.stats() if _pool is not None else {}
+
+
+@contextmanager
+def get_db_connection():
+    """
+    Выдает соединение из общего пула на время блока with.
+
+    При успешном выходе транзакция фиксируется, при исключении откатывается.
+    Соединение, сломавшееся во время работы, закрывается, а не возвращается в пул.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    discard = False
+    try:
+        yield conn
+        conn.commit()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        discard = True
+        raise
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            discard = True
+        raise
+    finally:
+        pool.putconn(conn, discard=discard)
+
+
+class TaskListener(threading.Thread):
+    """
+    Фоновый поток, который слушает канал NOTIFY (по умолчанию NEW_TASK_CHANNEL)
+    и вызывает on_notify при каждой пачке уведомлений.
+
+    Использует отдельное соединение вне пула: оно все время занято ожиданием.
+    При обрыве соединения переподключается и вызывает on_notify, чтобы
+    подписчик перечитал состояние на случай пропущенных уведомлений.
+
+    Args:
+        on_notify: Функция без аргументов, вызывается при уведомлениях и после (пере)подключения
+        stop_event: threading.Event, по которому поток завершает работу
+        reconnect_delay: Пауза перед повторным подключением (в секундах)
+        channel: Канал для LISTEN
+        on_message: Необязательная функция, получает payload каждого уведомления
+    """
+
+    def __init__(self, on_notify, stop_event: threading.Event, reconnect_delay: float = 5,
+                 channel: str = NEW_TASK_CHANNEL, on_message=None):
+        super().__init__(name=f'listener-{channel}', daemon=True)
+        self.on_notify = on_notify
+        self.on_message = on_message
+        self.stop_event = stop_event
+        self.reconnect_delay = reconnect_delay
+        self.channel = channel
+        self.connected = False
+
+    def _listen(self):
+        # LISTEN не работает через pgbouncer в transaction mode (порт 6543 в Supabase),
+        # поэтому для подписки можно указать отдельную прямую строку подключения
+        database_url = os.getenv('DATABASE_LISTEN_URL') or os.getenv('DATABASE_URL')
+        if not database_url:
+            raise ValueError("DATABASE_URL not found in environment variables")
+        conn = psycopg2.connect(database_url)
+        try:
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.channel}')
+            self.connected = True
+            logger.info(f"👂 Подписка на уведомления ({self.channel})")
+            # Пока не слушали, уведомления могли прийти без нашего ведома
+            self.on_notify()
+            while not self.stop_event.is_set():
+                # Просыпаемся раз в секунду, чтобы заметить stop_event
+                if select.select([conn], [], [], 1) == ([], [], []):
+                    continue
+                conn.poll()
+                if conn.notifies:
+                    payloads = [notify.payload for notify in conn.notifies]
+                    conn.notifies.clear()
+                    logger.debug(f"🔔 Уведомления {self.channel}: {payloads}")
+                    if self.on_message is not None:
+                        for payload in payloads:
+                            self.on_message(payload)
+                    self.on_notify()
+        finally:
+            self.connected = False
+            conn.close()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                logger.warning(f"⚠️ Подписка на уведомления прервана: {str(e)}. "
+                               f"Повторное подключение через {self.reconnect_delay} сек")
+                self.stop_event.wait(self.reconnect_delay)
+
+
+def _notify_status(cursor, task_ids, status: str):
+    """Отправляет в TASK_STATUS_CHANNEL смену статуса задач (доставляется после COMMIT)."""
+    if task_ids:
+        cursor.execute('''
+            SELECT pg_notify(%s, json_build_object('id', task_id, 'status', %s)::text)
+            FROM unnest(%s::int[]) AS task_id
+        ''', (TASK_STATUS_CHANNEL, status, list(task_ids)))
+
+
+_write_listeners = []
+
+
+def add_write_listener(callback):
+    """
+    Регистрирует функцию без аргументов, которая вызывается после каждой записи
+    в blog_posts из этого процесса (например, чтобы сбросить кэш ответов API).
+    """
+    _write_listeners.append(callback)
+
+
+def _notify_write():
+    for callback in _write_listeners:
+        try:
+            callback()
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка обработчика записи в blog_posts: {str(e)}")
+
+
+def create_task_in_db(topic: str, author: str = None, date: str = None):
+    """Создает задачу со статусом 'pending' в Supabase."""
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    INSERT INTO blog_posts (topic, author, date, content, status)
+                    VALUES (%s, %s, %s, '', 'pending')
+                    RETURNING id
+                ''', (topic, author, date))
+                task_id = cursor.fetchone()[0]
+                # Уведомления доставляются слушателям только после COMMIT; статус 'pending'
+                # сбрасывает кэш списков в остальных процессах API
+                cursor.execute('SELECT pg_notify(%s, %s)', (NEW_TASK_CHANNEL, str(task_id)))
+                _notify_status(cursor, [task_id], 'pending')
+        _notify_write()
+        logger.info(f"✅ Задача создана в Supabase с ID: {task_id}, тема: '{topic}'")
+        return task_id
+    except Exception as e:
+        logger.error(f"❌ Ошибка при создании задачи в БД: {str(e)}", exc_info=True)
+        raise
+
+
+def create_task_with_key(topic: str, author: str = None, date: str = None, idempotency_key: str = None,
+                         retention: float = None):
+    """
+    Создает задачу 'pending' с ключом идемпотентности (migrations/009_idempotency_key.sql).
+
+    Повтор с тем же ключом в пределах retention секунд не создает новую задачу, а
+    возвращает id исходной. Одновременные повторы безопасны: уникальный индекс
+    заставляет второй INSERT дождаться первого и уйти в ON CONFLICT DO NOTHING.
+    После окончания окна ключ снимается со старой задачи и может быть использован снова.
+
+    Args:
+        retention: Окно хранения ключа в секундах (по умолчанию IDEMPOTENCY_RETENTION или 24 часа)
+
+    Returns:
+        Кортеж (task_id, created): created=False, если вернули уже существующую задачу
+    """
+    if not idempotency_key:
+        return create_task_in_db(topic, author, date), True
+    if retention is None:
+        retention = float(os.getenv('IDEMPOTENCY_RETENTION', 24 * 3600))
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                for _ in range(2):
+                    cursor.execute('''
+                        INSERT INTO blog_posts (topic, author, date, content, status, idempotency_key)
+                        VALUES (%s, %s, %s, '', 'pending', %s)
+                        ON CONFLICT (idempotency_key) WHERE idempotency_key IS NOT NULL DO NOTHING
+                        RETURNING id
+                    ''', (topic, author, date, idempotency_key))
+                    row = cursor.fetchone()
+                    if row:
+                        task_id = row[0]
+                        cursor.execute('SELECT pg_notify(%s, %s)', (NEW_TASK_CHANNEL, str(task_id)))
+                        _notify_status(cursor, [task_id], 'pending')
+                        break
+                    # Ключ уже занят: отдаем исходную задачу или освобождаем ключ, если окно истекло
+                    cursor.execute('''
+                        SELECT id, created_at > NOW() - make_interval(secs => %s)
+                        FROM blog_posts
+                        WHERE idempotency_key = %s
+                    ''', (retention, idempotency_key))
+                    existing = cursor.fetchone()
+                    if existing and existing[1]:
+                        logger.info(f"♻️ Повтор запроса с ключом '{idempotency_key}': задача {existing[0]} уже создана")
+                        return existing[0], False
+                    if existing:
+                        cursor.execute('''
+                            UPDATE blog_posts SET idempotency_key = NULL WHERE id = %s
+                        ''', (existing[0],))
+                else:
+                    # Оба INSERT проиграли гонку с параллельными запросами: ключ занял один
+                    # из них, и повтор должен получить его задачу, а не ошибку
+                    cursor.execute('SELECT id FROM blog_posts WHERE idempotency_key = %s', (idempotency_key,))
+                    existing = cursor.fetchone()
+                    if existing:
+                        logger.info(f"♻️ Повтор запроса с ключом '{idempotency_key}': задача {existing[0]} уже создана")
+                        return existing[0], False
+                    raise RuntimeError(f"Не удалось создать задачу с ключом идемпотентности '{idempotency_key}'")
+        _notify_write()
+        logger.info(f"✅ Задача создана в Supabase с ID: {task_id}, тема: '{topic}', ключ: '{idempotency_key}'")
+        return task_id, True
+    except Exception as e:
+        logger.error(f"❌ Ошибка при создании задачи в БД: {str(e)}", exc_info=True)
+        raise
+
+
+def create_tasks_in_db(tasks):
+    """
+    Создает пачку задач 'pending' одним INSERT с многострочным VALUES.
+
+    Все задачи создаются в одной транзакции, worker будится одним уведомлением.
+
+    Args:
+        tasks: Список кортежей (topic, author, date)
+
+    Returns:
+        Список id созданных задач в порядке входных данных
+    """
+    if not tasks:
+        return []
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                # execute_values режет VALUES на страницы по page_size строк,
+                # поэтому страница равна размеру пачки: один запрос на всю пачку
+                rows = psycopg2.extras.execute_values(cursor, '''
+                    INSERT INTO blog_posts (topic, author, date, content, status)
+                    VALUES %s
+                    RETURNING id
+                ''', list(tasks), template="(%s, %s, %s, '', 'pending')", page_size=len(tasks), fetch=True)
+                # id выдаются последовательностью по порядку строк VALUES, а порядок
+                # RETURNING не гарантирован: сортировка восстанавливает порядок входа
+                task_ids = sorted(row[0] for row in rows)
+                # Worker payload не разбирает, а NOTIFY ограничен 8000 байт: список id
+                # большой пачки туда не влезет, поэтому отправляем только их количество
+                cursor.execute('SELECT pg_notify(%s, %s)', (NEW_TASK_CHANNEL, f'batch:{len(task_ids)}'))
+                _notify_status(cursor, task_ids, 'pending')
+        _notify_write()
+        logger.info(f"✅ Создано задач в Supabase: {len(task_ids)}")
+        return task_ids
+    except Exception as e:
+        logger.error(f"❌ Ошибка при создании пачки задач в БД: {str(e)}", exc_info=True)
+        raise
+
+
+def normalize_topic(topic: str) -> str:
+    """Python-аналог NORMALIZED_TOPIC_SQL."""
+    return ' '.join((topic or '').split()).lower()
+
+
+def _coalesce_duplicates(cursor, tasks, window: float):
+    """
+    Присоединяет к каждой взятой задаче остальные задачи 'pending' с той же
+    нормализованной темой, созданные не позже чем через window секунд после нее.
+
+    Присоединенные строки получают coalesced_into = id основной задачи и статус
+    'processing'; результат основной задачи потом записывается во все строки сразу.
+    Дубли внутри самой пачки тоже присоединяются к самой старой задаче пачки.
+    """
+    primaries = []
+    by_topic = {}
+    for task in tasks:
+        task['attached_ids'] = []
+        primary = by_topic.get(normalize_topic(task['topic']))
+        if primary is None:
+            by_topic[normalize_topic(task['topic'])] = task
+            primaries.append(task)
+        else:
+            primary['attached_ids'].append(task['id'])
+
+    for primary in primaries:
+        if primary['attached_ids']:
+            cursor.execute('''
+                UPDATE blog_posts SET coalesced_into = %s WHERE id = ANY(%s)
+            ''', (primary['id'], primary['attached_ids']))
+        cursor.execute(f'''
+            UPDATE blog_posts
+            SET status = 'processing', coalesced_into = %(primary_id)s
+            WHERE id IN (
+                SELECT id
+                FROM blog_posts
+                WHERE status = 'pending'
+                  AND {NORMALIZED_TOPIC_SQL.format('topic')} = {NORMALIZED_TOPIC_SQL.format('%(topic)s')}
+                  AND created_at <= %(created_at)s + make_interval(secs => %(window)s)
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id
+        ''', {'primary_id': primary['id'], 'topic': primary['topic'],
+              'created_at': primary['created_at'], 'window': window})
+        primary['attached_ids'].extend(sorted(row[0] for row in cursor.fetchall()))
+        if primary['attached_ids']:
+            logger.info(f"🔗 К задаче {primary['id']} присоединены дубли темы '{primary['topic']}': "
+                        f"{', '.join(str(task_id) for task_id in primary['attached_ids'])}")
+    return primaries
+
+
+def claim_pending_tasks(limit: int = 1):
+    """
+    Атомарно забирает до limit самых старых задач 'pending' и переводит их в 'processing'.
+
+    Выбор и смена статуса выполняются одним UPDATE с FOR UPDATE SKIP LOCKED, поэтому
+    несколько реплик worker могут разбирать очередь параллельно: строку, уже
+    заблокированную другим worker, запрос просто пропускает.
+
+    В той же транзакции к каждой задаче присоединяются ожидающие дубли ее темы
+    (окно задается TASK_COALESCE_WINDOW в секундах, 0 - не склеивать), чтобы crew
+    для одной темы запускался один раз.
+
+    Args:
+        limit: Максимальное количество задач за один запрос
+
+    Returns:
+        Список задач (словари id, topic, author, date, created_at, attached_ids)
+        в порядке создания; attached_ids - id присоединенных дублей
+    """
+    window = float(os.getenv('TASK_COALESCE_WINDOW', 900))
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    UPDATE blog_posts
+                    SET status = 'processing'
+                    WHERE id IN (
+                        SELECT id
+                        FROM blog_posts
+                        WHERE status = 'pending'
+                        ORDER BY created_at ASC
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, topic, author, date, created_at
+                ''', (limit,))
+                rows = cursor.fetchall()
+
+                tasks = [
+                    {
+                        'id': row[0],
+                        'topic': row[1],
+                        'author': row[2],
+                        'date': row[3],
+                        'created_at': row[4]
+                    }
+                    for row in rows
+                ]
+                # RETURNING не гарантирует порядок строк
+                tasks.sort(key=lambda task: (task['created_at'] is None, task['created_at'], task['id']))
+                if window > 0:
+                    tasks = _coalesce_duplicates(cursor, tasks, window)
+                else:
+                    for task in tasks:
+                        task['attached_ids'] = []
+                _notify_status(cursor, [task_id for task in tasks for task_id in [task['id']] + task['attached_ids']],
+                               'processing')
+
+        if tasks:
+            _notify_write()
+            logger.info(f"✅ Взято задач из очереди: {len(tasks)} (ID: {', '.join(str(task['id']) for task in tasks)})")
+        else:
+            logger.debug("ℹ️  Задач со статусом 'pending' не найдено")
+        return tasks
+    except Exception as e:
+        logger.error(f"❌ Ошибка при получении задач из БД: {str(e)}", exc_info=True)
+        return []
+
+
+def update_task_status(task_id: int, status: str):
+    """Обновляет статус задачи и присоединенных к ней дублей в Supabase."""
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f'''
+                    UPDATE blog_posts
+                    SET status = %s, completed_at = {COMPLETED_AT_SQL}
+                    WHERE id = %s OR coalesced_into = %s
+                    RETURNING id
+                ''', (status, status, task_id, task_id))
+                _notify_status(cursor, [row[0] for row in cursor.fetchall()], status)
+        _notify_write()
+        logger.info(f"✅ Статус задачи {task_id} обновлен на '{status}'")
+    except Exception as e:
+        logger.error(f"❌ Ошибка при обновлении статуса задачи {task_id}: {str(e)}", exc_info=True)
+        raise
+
+
+def update_task_result(task_id: int, content: str, status: str = 'completed'):
+    """
+    Обновляет content и status задачи в Supabase.
+
+    Результат одним UPDATE (в одной транзакции) записывается и во все присоединенные
+    к задаче дубли (coalesced_into = task_id).
+    """
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f'''
+                    UPDATE blog_posts
+                    SET content = %s, status = %s, completed_at = {COMPLETED_AT_SQL}
+                    WHERE id = %s OR coalesced_into = %s
+                    RETURNING id
+                ''', (str(content), status, status, task_id, task_id))
+                _notify_status(cursor, [row[0] for row in cursor.fetchall()], status)
+        _notify_write()
+        logger.info(f"✅ Результат задачи {task_id} обновлен, статус: '{status}'")
+    except Exception as e:
+        logger.error(f"❌ Ошибка при обновлении результата задачи {task_id}: {str(e)}", exc_info=True)
+        raise
@@ -0,0 +1,58 @@
+"""
+Конфигурация gunicorn для production-запуска api.py:
+
+    gunicorn -c gunicorn.conf.py api:app
+
+Несколько процессов-воркеров с потоками (gthread): потоки нужны, потому что
+SSE (/webhook/tasks/<id>/events), long-poll и потоковая выгрузка держат
+соединение долго, а синхронный воркер обслуживал бы одного такого клиента.
+У каждого процесса свой пул соединений с БД (db.py создает его лениво, уже после fork).
+Пул меньше числа потоков: SSE и long-poll берут соединение только на время чтения статуса,
+а размер пула делит между процессами общий бюджет соединений API_DB_CONNECTIONS.
+
+Все значения переопределяются переменными окружения, см. README.
+"""
+import os
+import multiprocessing
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+worker_class = 'gthread'
+# WEB_CONCURRENCY - стандартная переменная Railway/Heroku для числа процессов
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+# Каждый SSE-поток держит поток воркера до TASK_EVENTS_MAX_DURATION секунд, long-poll - до
+# минуты: потоков должно хватать на подписчиков и еще оставаться на обычные запросы.
+# Ожидающий поток почти ничего не стоит и соединение с БД не держит
+threads = int(os.getenv('GUNICORN_THREADS', 32))
+
+# Бюджет соединений с БД на все процессы API: у каждого пул (db.py) и одно LISTEN-соединение
+# (task_events.py). По умолчанию 30 - половина лимита прямых соединений небольшого проекта
+# Supabase (60), остальное остается worker.py и служебным соединениям Supabase.
+# Процессы наследуют окружение мастера, поэтому размер пула задается здесь, до fork
+_db_connection_budget = int(os.getenv('API_DB_CONNECTIONS', 30))
+os.environ.setdefault('DB_POOL_MAX_SIZE', str(max(2, min(10, _db_connection_budget // workers - 1))))
+
+# В gthread таймаут следит за зависанием процесса, а не за длиной запроса,
+# поэтому долгие SSE-соединения его не задевают
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Периодический перезапуск процессов (страховка от утечек памяти) по умолчанию выключен:
+# при рестарте обрываются keep-alive запросы и SSE-потоки, а при сотнях RPS процесс
+# перезапускался бы каждые несколько секунд. Джиттер - чтобы не все процессы сразу
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+# Приложение импортируется в каждом процессе отдельно: пул БД, LISTEN-поток
+# и кэши не должны создаваться в мастере и наследоваться через fork
+preload_app = False
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def worker_exit(server, worker):
+    from db import close_pool
+    close_pool()
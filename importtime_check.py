@@ -0,0 +1,79 @@
+"""
+Проверка времени холодного старта процесса API: импортирует модуль в чистом
+интерпретаторе с python -X importtime, печатает самые медленные импорты и
+завершается с кодом 1, если превышен бюджет или подтянулся стек агентов
+(crewai, langchain, openai, numpy), которому в web-процессе не место.
+
+Пример:
+    python importtime_check.py                     # api, бюджет 500 мс
+    python importtime_check.py --budget-ms 300 --top 15
+"""
+import sys
+import argparse
+import subprocess
+
+# Модули, которые web-процесс не должен импортировать: их использует только worker.py (crews.py)
+FORBIDDEN_MODULES = ('crewai', 'langchain', 'langchain_core', 'langchain_openai', 'openai', 'tiktoken', 'numpy')
+
+
+def measure_imports(module: str) -> list:
+    """
+    Импортирует module в отдельном процессе с -X importtime.
+
+    Returns:
+        Список (имя модуля, собственное время мкс, кумулятивное время мкс, глубина вложенности)
+    """
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        error = '\n'.join(line for line in completed.stderr.splitlines() if not line.startswith('import time:'))
+        raise RuntimeError(f"import {module} завершился с ошибкой:\n{error}")
+    imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бюджет времени импорта web-процесса')
+    parser.add_argument('--module', default='api', help='Модуль для проверки (по умолчанию api)')
+    parser.add_argument('--budget-ms', type=float, default=500, help='Максимальное время импорта, мс')
+    parser.add_argument('--top', type=int, default=10, help='Сколько самых медленных импортов показать')
+    args = parser.parse_args(argv)
+
+    try:
+        imports = measure_imports(args.module)
+    except RuntimeError as e:
+        print(f"❌ {str(e)}")
+        return 1
+    total_ms = next(cumulative for name, _, cumulative, depth in imports
+                    if name == args.module and depth == 0) / 1000
+    # Импорты первого уровня внутри проверяемого модуля - то, что он тянет напрямую
+    direct = sorted(((name, cumulative) for name, _, cumulative, depth in imports if depth == 1),
+                    key=lambda item: item[1], reverse=True)
+    forbidden = sorted({name for name, *_ in imports if name.split('.')[0] in FORBIDDEN_MODULES})
+
+    print(f"import {args.module}: {total_ms:.0f} мс (бюджет {args.budget_ms:.0f} мс), модулей: {len(imports)}")
+    for name, cumulative in direct[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} мс  {name}")
+
+    failed = False
+    if forbidden:
+        print(f"❌ Импортирован стек агентов: {', '.join(forbidden)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"❌ Превышен бюджет: {total_ms:.0f} мс > {args.budget_ms:.0f} мс")
+        failed = True
+    if not failed:
+        print("✅ В пределах бюджета")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Нагрузочный тест API: смесь запросов истории (как вкладка Streamlit и скрипт
+Google Таблиц) и, по желанию, создания задач. Нужен, чтобы сравнить
+встроенный сервер Flask (python api.py) и gunicorn (gunicorn -c gunicorn.conf.py api:app).
+
+Пример:
+    python loadtest.py --url http://localhost:5000 --concurrency 50 --duration 30
+"""
+import time
+import random
+import argparse
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Доли запросов по умолчанию: в основном чтение истории
+READ_SCENARIO = [
+    ('GET', '/webhook/results?limit=50', 5),
+    ('GET', '/webhook/results/latest?limit=10', 3),
+    ('GET', '/health', 1),
+]
+
+
+def percentile(values, fraction: float) -> float:
+    """Перцентиль по отсортированному списку (fraction от 0 до 1)."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def run_client(base_url: str, scenario, deadline: float, results: list, lock: threading.Lock):
+    """Один клиент: шлет запросы по сценарию до deadline и копит длительности."""
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(pool_maxsize=1))
+    session.mount('https://', HTTPAdapter(pool_maxsize=1))
+    routes = [(method, path) for method, path, weight in scenario for _ in range(weight)]
+    latencies, errors = [], 0
+    while time.monotonic() < deadline:
+        method, path = random.choice(routes)
+        started = time.monotonic()
+        try:
+            if method == 'POST':
+                response = session.post(base_url + path, json={'topic': f'loadtest {random.random()}'}, timeout=30)
+            else:
+                response = session.get(base_url + path, timeout=30)
+            if response.status_code >= 400:
+                errors += 1
+        except requests.RequestException:
+            errors += 1
+        latencies.append(time.monotonic() - started)
+    with lock:
+        results.append((latencies, errors))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Нагрузочный тест API блог-постов')
+    parser.add_argument('--url', default='http://localhost:5000', help='Базовый URL API')
+    parser.add_argument('--concurrency', type=int, default=50, help='Количество одновременных клиентов')
+    parser.add_argument('--duration', type=float, default=30, help='Длительность теста в секундах')
+    parser.add_argument('--with-writes', action='store_true',
+                        help='Добавить POST /webhook/start-blogpost (создает задачи в БД!)')
+    args = parser.parse_args(argv)
+
+    scenario = list(READ_SCENARIO)
+    if args.with_writes:
+        scenario.append(('POST', '/webhook/start-blogpost', 1))
+
+    base_url = args.url.rstrip('/')
+    deadline = time.monotonic() + args.duration
+    results, lock = [], threading.Lock()
+    clients = [
+        threading.Thread(target=run_client, args=(base_url, scenario, deadline, results, lock), daemon=True)
+        for _ in range(args.concurrency)
+    ]
+    started = time.monotonic()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.monotonic() - started
+
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    errors = sum(client_errors for _, client_errors in results)
+    print(f"URL: {base_url}, клиентов: {args.concurrency}, длительность: {elapsed:.1f} сек")
+    print(f"Запросов: {len(latencies)}, ошибок: {errors}, RPS: {len(latencies) / elapsed:.1f}")
+    print(f"Задержка, мс: p50 {percentile(latencies, 0.5) * 1000:.0f}, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.0f}, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.0f}, "
+          f"max {(latencies[-1] if latencies else 0) * 1000:.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Общая настройка логирования для app.py, api.py, worker.py и main.py.
+
+Записи пишутся в JSON (по строке на запись) из фонового потока: корневой логгер
+получает только QueueHandler, а в stderr или файл пишет QueueListener.
+Код, который логирует (обработчик запроса, цикл worker, рендер Streamlit),
+только кладет запись в очередь и никогда не открывает файлы и не ждет диск.
+
+Переменные окружения:
+    LOG_LEVEL            - уровень (по умолчанию INFO)
+    LOG_FORMAT           - json (по умолчанию) или text - прежний человекочитаемый формат
+    LOG_FILE             - путь к файлу; пусто - stderr. Файл открывается один раз
+    LOG_SAMPLE_INTERVAL  - для записей с extra={'sample': 'ключ'} не чаще одной записи
+                           на ключ за столько секунд (0 - без сэмплирования)
+"""
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Атрибуты LogRecord, которые не считаются пользовательскими полями extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'taskName'}
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(threadName)s - %(levelname)s - %(message)s'
+
+_listener = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Запись в одну строку JSON: ts, level, logger, service, thread, message,
+    поля из extra= и exc_info (traceback строкой), если есть.
+    """
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'service': self.service,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Сэмплирование сообщений горячих циклов: запись с extra={'sample': 'ключ'}
+    пропускается не чаще раза в interval секунд на ключ. В пропущенную запись
+    добавляется поле suppressed - сколько таких записей отброшено с прошлой.
+    """
+
+    def __init__(self, interval: float):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, 'sample', None)
+        if key is None or self.interval <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            state = self._last.get(key)
+            if state is not None and now - state[0] < self.interval:
+                state[1] += 1
+                return False
+            record.suppressed = state[1] if state is not None else 0
+            self._last[key] = [now, 0]
+        return True
+
+
+class _StructuredQueueHandler(QueueHandler):
+    """
+    QueueHandler, который сохраняет traceback отдельным полем: стандартный
+    prepare() вклеивает его в текст сообщения.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def _create_sink(log_file: str) -> logging.Handler:
+    if log_file:
+        directory = os.path.dirname(os.path.abspath(log_file))
+        os.makedirs(directory, exist_ok=True)
+        return logging.FileHandler(log_file, encoding='utf-8')
+    return logging.StreamHandler(sys.stderr)
+
+
+def configure_logging(service: str):
+    """
+    Настраивает корневой логгер процесса. Повторные вызовы ничего не делают,
+    поэтому app.py может вызывать функцию при каждом перезапуске скрипта Streamlit.
+
+    Args:
+        service: Имя точки входа для поля service (app, api, worker, main)
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+
+        level = os.getenv('LOG_LEVEL', 'INFO').upper()
+        sink = _create_sink(os.getenv('LOG_FILE', '').strip())
+        if os.getenv('LOG_FORMAT', 'json').lower() == 'text':
+            sink.setFormatter(logging.Formatter(TEXT_FORMAT))
+        else:
+            sink.setFormatter(JsonFormatter(service))
+
+        handler = _StructuredQueueHandler(queue.SimpleQueue())
+        # Отброшенные записи даже не попадают в очередь
+        handler.addFilter(SamplingFilter(float(os.getenv('LOG_SAMPLE_INTERVAL', 60))))
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level)
+
+        _listener = QueueListener(handler.queue, sink, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Дописывает записи из очереди и останавливает фоновый поток (вызывается при выходе)."""
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
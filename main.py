@@ -3,15 +3,18 @@
 Использует OpenAI API в качестве провайдера LLM.
 """
 import os
-import requests
 from dotenv import load_dotenv
 from crewai import Agent, Task, Crew, Process
-from crewai.tools import tool
 from langchain_openai import ChatOpenAI
+from tools import serper_search, serper_multi_search
+from logging_setup import configure_logging
 
 # Загружаем переменные окружения из .env файла
 load_dotenv(override=True)
 
+# Логи CrewAI, инструментов и кэшей - в общий формат (logging_setup.py)
+configure_logging('main')
+
 # Создаем LLM для OpenAI
 # ChatOpenAI автоматически читает OPENAI_API_KEY из переменных окружения
 # ВАЖНО: В файле .env должна быть переменная OPENAI_API_KEY=ваш_ключ
@@ -20,42 +23,6 @@ openai_llm = ChatOpenAI(
     temperature=0.7
 )
 
-# Создаем кастомный инструмент для поиска через Serper API
-@tool("Поиск в интернете")
-def serper_search(query: str) -> str:
-    """Поиск актуальных новостей и информации в интернете через Serper API. Используй для поиска последних новостей про AI Agents."""
-    api_key = os.getenv('SERPER_API_KEY')
-    if not api_key:
-        return "Ошибка: API ключ Serper не найден. Проверьте файл .env"
-    
-    url = "https://google.serper.dev/search"
-    headers = {
-        'X-API-KEY': api_key,
-        'Content-Type': 'application/json'
-    }
-    payload = {
-        'q': query,
-        'num': 10
-    }
-    
-    try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Форматируем результаты
-        results = []
-        if 'organic' in data:
-            for item in data['organic'][:5]:  # Берем первые 5 результатов
-                title = item.get('title', 'Без названия')
-                link = item.get('link', '')
-                snippet = item.get('snippet', '')
-                results.append(f"Название: {title}\nСсылка: {link}\nОписание: {snippet}\n")
-        
-        return "\n".join(results) if results else "Результаты поиска не найдены"
-    except Exception as e:
-        return f"Ошибка при поиске: {str(e)}"
-
 # Создаем агента-исследователя
 researcher = Agent(
     role='Исследователь AI новостей',
@@ -65,7 +32,7 @@ researcher = Agent(
     в области AI Agents, анализировать их и предоставлять структурированную информацию.''',
     verbose=True,
     allow_delegation=False,
-    tools=[serper_search],
+    tools=[serper_search, serper_multi_search],
     llm=openai_llm
 )
 
@@ -90,7 +57,9 @@ research_task = Task(
     - Название новости
     - Источник и дату публикации
     - Краткое описание содержания
-    - Почему эта новость важна''',
+    - Почему эта новость важна
+    Если нужно несколько поисковых запросов, передай их одним списком 
+    в инструмент параллельного поиска.''',
     agent=researcher,
     expected_output='Структурированный список из 3-5 новостей про AI Agents с названиями, источниками, датами и описаниями'
 )
@@ -0,0 +1,5 @@
+-- Частичный индекс для очереди задач: worker выбирает самые старые задачи 'pending'
+-- через UPDATE ... FOR UPDATE SKIP LOCKED (db.claim_pending_tasks).
+CREATE INDEX IF NOT EXISTS idx_blog_posts_pending
+    ON blog_posts (created_at)
+    WHERE status = 'pending';
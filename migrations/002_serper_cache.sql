@@ -0,0 +1,9 @@
+-- Общий кэш результатов Serper для SEARCH_CACHE_BACKEND=postgres (search_cache.py).
+CREATE TABLE IF NOT EXISTS serper_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    stored_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    accessed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_serper_cache_accessed_at ON serper_cache (accessed_at DESC);
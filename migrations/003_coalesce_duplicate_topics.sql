@@ -0,0 +1,14 @@
+-- Склейка дублей: задачи 'pending' с той же нормализованной темой присоединяются к
+-- взятой worker'ом задаче (db.claim_pending_tasks) и получают ее результат.
+ALTER TABLE blog_posts
+    ADD COLUMN IF NOT EXISTS coalesced_into INTEGER REFERENCES blog_posts (id) ON DELETE SET NULL;
+
+-- Поиск ожидающих дублей по нормализованной теме (то же выражение, что db.NORMALIZED_TOPIC_SQL)
+CREATE INDEX IF NOT EXISTS idx_blog_posts_pending_normalized_topic
+    ON blog_posts ((lower(regexp_replace(btrim(topic), '\s+', ' ', 'g'))))
+    WHERE status = 'pending';
+
+-- Раздача результата присоединенным строкам (WHERE id = ... OR coalesced_into = ...)
+CREATE INDEX IF NOT EXISTS idx_blog_posts_coalesced_into
+    ON blog_posts (coalesced_into)
+    WHERE coalesced_into IS NOT NULL;
@@ -0,0 +1,14 @@
+-- Семантический кэш результатов исследования (research_cache.py): результат исследователя
+-- хранится вместе с эмбеддингом темы, worker ищет ближайшую тему по индексу в памяти.
+CREATE TABLE IF NOT EXISTS research_cache (
+    id SERIAL PRIMARY KEY,
+    task_id INTEGER REFERENCES blog_posts (id) ON DELETE SET NULL,
+    topic TEXT NOT NULL,
+    research TEXT NOT NULL,
+    encoder TEXT NOT NULL,
+    embedding REAL[] NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_research_cache_encoder_created_at
+    ON research_cache (encoder, created_at DESC);
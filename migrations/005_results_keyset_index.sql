@@ -0,0 +1,4 @@
+-- Пагинация по курсору в GET /webhook/results: ORDER BY created_at DESC, id DESC
+-- и условие (created_at, id) < (...) идут по одному индексу без сортировки.
+CREATE INDEX IF NOT EXISTS idx_blog_posts_created_at_id
+    ON blog_posts (created_at DESC, id DESC);
@@ -0,0 +1,6 @@
+-- Короткое превью поста для списков (?fields=...,excerpt): первые 280 символов
+-- текста с схлопнутыми пробелами. Колонка вычисляется при записи, так что
+-- списки не читают и не передают полный content.
+ALTER TABLE blog_posts
+    ADD COLUMN IF NOT EXISTS excerpt TEXT
+    GENERATED ALWAYS AS (left(regexp_replace(content, '\s+', ' ', 'g'), 280)) STORED;
@@ -0,0 +1,20 @@
+-- Поиск по блог-постам (GET /webhook/search).
+-- search_vector поддерживается самим Postgres: вычисляется при каждой записи.
+-- Конфигурация 'russian' стеммит кириллицу русским стеммером, а латиницу -
+-- английским (english_stem), поэтому покрывает оба языка. Тема весит больше текста.
+ALTER TABLE blog_posts
+    ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(topic, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(content, '')), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_blog_posts_search_vector
+    ON blog_posts USING GIN (search_vector);
+
+-- Триграммы: нечеткий поиск темы (topic % 'запрос') в /webhook/search и
+-- индексный ILIKE '%...%' для фильтра topic в /webhook/results вместо seq scan.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_blog_posts_topic_trgm
+    ON blog_posts USING GIN (topic gin_trgm_ops);
@@ -0,0 +1,21 @@
+-- Время последнего изменения поста для ETag в /webhook/results и /webhook/results/<id>.
+-- Триггер обновляет колонку при любом UPDATE, в том числе из worker.py.
+-- clock_timestamp(), а не NOW(): время изменения, а не начала транзакции.
+ALTER TABLE blog_posts
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+
+CREATE OR REPLACE FUNCTION blog_posts_set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_blog_posts_updated_at ON blog_posts;
+CREATE TRIGGER trg_blog_posts_updated_at
+    BEFORE UPDATE ON blog_posts
+    FOR EACH ROW EXECUTE FUNCTION blog_posts_set_updated_at();
+
+-- max(updated_at) для версии списков читается по индексу
+CREATE INDEX IF NOT EXISTS idx_blog_posts_updated_at
+    ON blog_posts (updated_at DESC);
@@ -0,0 +1,9 @@
+-- Ключ идемпотентности для POST /webhook/start-blogpost: ретрай того же запроса
+-- (Idempotency-Key) возвращает исходную задачу, а не создает новую.
+-- Уникальный индекс делает проверку безопасной при одновременных повторах.
+ALTER TABLE blog_posts
+    ADD COLUMN IF NOT EXISTS idempotency_key TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_blog_posts_idempotency_key
+    ON blog_posts (idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
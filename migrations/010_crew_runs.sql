@@ -0,0 +1,20 @@
+-- Метрики прогонов crew (crew_metrics.py): пишет worker.py, читает /metrics в api.py.
+-- stages: [{"name", "seconds", "llm_calls", "prompt_tokens", "completion_tokens"}, ...]
+-- tool_calls: [{"tool", "stage", "seconds", "ok"}, ...]
+CREATE TABLE IF NOT EXISTS crew_runs (
+    id BIGSERIAL PRIMARY KEY,
+    task_id INTEGER NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL,
+    status TEXT NOT NULL,
+    reused_research BOOLEAN NOT NULL DEFAULT FALSE,
+    total_seconds DOUBLE PRECISION,
+    llm_calls INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cost_usd NUMERIC(12, 6) NOT NULL DEFAULT 0,
+    stages JSONB NOT NULL DEFAULT '[]',
+    tool_calls JSONB NOT NULL DEFAULT '[]'
+);
+
+CREATE INDEX IF NOT EXISTS idx_crew_runs_task_id ON crew_runs (task_id);
+CREATE INDEX IF NOT EXISTS idx_crew_runs_started_at ON crew_runs (started_at DESC);
@@ -0,0 +1,14 @@
+-- Метрики очереди (queue_metrics.py) без полного сканирования blog_posts.
+-- 'pending' уже покрыт idx_blog_posts_pending (001).
+CREATE INDEX IF NOT EXISTS idx_blog_posts_processing
+    ON blog_posts (created_at)
+    WHERE status = 'processing';
+
+CREATE INDEX IF NOT EXISTS idx_blog_posts_failed
+    ON blog_posts (updated_at)
+    WHERE status = 'failed';
+
+-- Пропускная способность и задержка: завершенные за последнее окно по updated_at
+CREATE INDEX IF NOT EXISTS idx_blog_posts_completed_updated_at
+    ON blog_posts (updated_at)
+    WHERE status = 'completed';
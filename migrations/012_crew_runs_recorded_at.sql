@@ -0,0 +1,5 @@
+-- Время записи прогона в crew_runs: /metrics (crew_metrics.load_run_aggregates)
+-- дочитывает только новые прогоны по id и пропускает записанные последние секунды,
+-- чтобы не потерять строку с меньшим id, чья транзакция еще не закоммичена.
+ALTER TABLE crew_runs
+    ADD COLUMN IF NOT EXISTS recorded_at TIMESTAMPTZ NOT NULL DEFAULT now();
@@ -0,0 +1,17 @@
+-- Время завершения задачи для метрик очереди (queue_metrics.py): updated_at меняется
+-- при любом UPDATE, поэтому задержка и окно пропускной способности по нему неверны.
+-- completed_at пишут update_task_status/update_task_result в db.py при переходе в 'completed'.
+ALTER TABLE blog_posts
+    ADD COLUMN IF NOT EXISTS completed_at TIMESTAMPTZ;
+
+-- Для уже завершенных задач лучшего значения, чем последний UPDATE, нет
+UPDATE blog_posts
+SET completed_at = updated_at
+WHERE status = 'completed' AND completed_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_blog_posts_completed_at
+    ON blog_posts (completed_at)
+    WHERE status = 'completed';
+
+-- Индекс из 011 по updated_at метрикам очереди больше не нужен
+DROP INDEX IF EXISTS idx_blog_posts_completed_updated_at;
@@ -0,0 +1,63 @@
+"""
+Текстовый формат экспозиции Prometheus без клиентской библиотеки:
+эндпоинты /metrics собирают семейства метрик и отдают render(families).
+"""
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _number(value) -> str:
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricFamily:
+    """
+    Одно семейство метрик: имя, тип (counter, gauge, histogram), описание и сэмплы.
+
+    Args:
+        name: Имя метрики, например blog_crew_runs_total
+        metric_type: counter, gauge или histogram
+        help_text: Описание для строки # HELP
+    """
+
+    def __init__(self, name: str, metric_type: str, help_text: str):
+        self.name = name
+        self.metric_type = metric_type
+        self.help_text = help_text
+        self.lines = []
+
+    def add(self, value, **labels):
+        """Добавляет сэмпл counter/gauge с метками."""
+        self.lines.append(f'{self.name}{_labels(labels)} {_number(value)}')
+        return self
+
+    def add_histogram(self, snapshot: dict, **labels):
+        """
+        Добавляет гистограмму из снимка {'buckets': {граница: кумулятивное количество,
+        ..., '+Inf': всего}, 'sum': ..., 'count': ...} (см. LatencyHistogram.snapshot).
+        """
+        for bound, count in snapshot['buckets'].items():
+            self.lines.append(f'{self.name}_bucket{_labels(dict(labels, le=bound))} {_number(count)}')
+        self.lines.append(f'{self.name}_sum{_labels(labels)} {_number(float(snapshot["sum"]))}')
+        self.lines.append(f'{self.name}_count{_labels(labels)} {_number(snapshot["count"])}')
+        return self
+
+    def render(self) -> str:
+        return '\n'.join([f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.metric_type}'] + self.lines)
+
+
+def render(families) -> str:
+    """Склеивает семейства в ответ /metrics."""
+    return '\n'.join(family.render() for family in families) + '\n'
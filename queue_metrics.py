@@ -0,0 +1,81 @@
+"""
+Метрики очереди задач для автомасштабирования worker: количество задач по статусам,
+возраст самой старой задачи 'pending', пропускная способность и сквозная задержка
+от created_at до завершения.
+
+Все запросы идут по частичным индексам (migrations/001, 011 и 013) и ограничены окном
+QUEUE_METRICS_WINDOW, поэтому не сканируют всю таблицу blog_posts.
+"""
+import os
+from db import get_db_connection
+from prometheus import MetricFamily
+
+# Окно для пропускной способности и перцентилей задержки, в секундах
+QUEUE_METRICS_WINDOW = float(os.getenv('QUEUE_METRICS_WINDOW', 900))
+
+QUEUE_STATUSES = ('pending', 'processing', 'failed')
+
+
+def queue_stats(window: float = None) -> dict:
+    """
+    Снимок состояния очереди.
+
+    Returns:
+        Словарь: counts (по статусам), oldest_pending_age_seconds,
+        completed_in_window, completed_per_minute, latency_seconds (p50, p95, p99), window_seconds
+    """
+    window = QUEUE_METRICS_WINDOW if window is None else window
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            # Отдельный COUNT на статус: каждый идет по своему частичному индексу
+            cursor.execute('''
+                SELECT
+                    (SELECT count(*) FROM blog_posts WHERE status = 'pending'),
+                    (SELECT count(*) FROM blog_posts WHERE status = 'processing'),
+                    (SELECT count(*) FROM blog_posts WHERE status = 'failed'),
+                    (SELECT EXTRACT(EPOCH FROM NOW() - min(created_at))
+                     FROM blog_posts WHERE status = 'pending')
+            ''')
+            pending, processing, failed, oldest_age = cursor.fetchone()
+            # Время завершения пишет db.py при переходе в 'completed' (migrations/013)
+            cursor.execute('''
+                SELECT count(*),
+                       percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (
+                           ORDER BY EXTRACT(EPOCH FROM completed_at - created_at))
+                FROM blog_posts
+                WHERE status = 'completed'
+                  AND completed_at > NOW() - make_interval(secs => %s)
+            ''', (window,))
+            completed, percentiles = cursor.fetchone()
+    percentiles = percentiles or [None, None, None]
+    return {
+        'counts': {'pending': pending, 'processing': processing, 'failed': failed},
+        'oldest_pending_age_seconds': float(oldest_age) if oldest_age is not None else 0.0,
+        'completed_in_window': completed,
+        'completed_per_minute': completed / (window / 60) if window else 0.0,
+        'latency_seconds': {
+            quantile: float(value) if value is not None else None
+            for quantile, value in zip(('0.5', '0.95', '0.99'), percentiles)
+        },
+        'window_seconds': window,
+    }
+
+
+def queue_metric_families(stats: dict = None) -> list:
+    """Семейства метрик очереди для /metrics (api.py и HTTP-порт worker.py)."""
+    stats = stats or queue_stats()
+    tasks = MetricFamily('blog_queue_tasks', 'gauge', 'Задачи в очереди по статусу')
+    for status in QUEUE_STATUSES:
+        tasks.add(stats['counts'][status], status=status)
+    oldest = MetricFamily('blog_queue_oldest_pending_age_seconds', 'gauge',
+                          'Возраст самой старой задачи pending (0, если очередь пуста)')
+    oldest.add(stats['oldest_pending_age_seconds'])
+    throughput = MetricFamily('blog_queue_completed_per_minute', 'gauge',
+                              'Завершенные задачи в минуту за окно QUEUE_METRICS_WINDOW')
+    throughput.add(stats['completed_per_minute'])
+    latency = MetricFamily('blog_queue_latency_seconds', 'gauge',
+                           'Сквозная задержка от создания до завершения задачи за окно (перцентили)')
+    for quantile, value in stats['latency_seconds'].items():
+        if value is not None:
+            latency.add(value, quantile=quantile)
+    return [tasks, oldest, throughput, latency]
@@ -0,0 +1,321 @@
+"""
+Семантический кэш результатов исследования: похожие темы ("AI Agents",
+"ai agents news") переиспользуют недавний результат исследователя,
+и worker сразу передает его писателю.
+
+Результаты хранятся в таблице research_cache (migrations/004_research_cache.sql)
+вместе с эмбеддингом темы, а поиск ближайшей темы идет по индексу NumPy в памяти.
+
+Близость эмбеддингов не различает версии и номера ("OpenAI GPT-5" и "OpenAI GPT-4"
+почти совпадают), поэтому попадание засчитывается, только если токены с цифрами
+в темах совпадают точно (см. key_tokens). Кэш выключен по умолчанию: RESEARCH_CACHE_ENABLED=1.
+"""
+import os
+import re
+import math
+import time
+import zlib
+import logging
+import importlib
+import threading
+from collections import namedtuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Токены с цифрами: числа и версии (3.14, 2025) и названия моделей (H100, M3, iOS18)
+_KEY_TOKEN = re.compile(r'\w*\d+(?:[.,]\d+)*\w*')
+
+ResearchHit = namedtuple('ResearchHit', ['task_id', 'topic', 'research', 'similarity', 'age_seconds'])
+
+
+class HashingEncoder:
+    """
+    Локальный энкодер без сети и моделей: слова и символьные триграммы темы
+    хэшируются в вектор фиксированной длины с сублинейным весом TF.
+
+    Устойчив к регистру, порядку слов и словоформам ("agent"/"agents"), но не
+    сопоставляет разные языки - для этого нужен многоязычный энкодер
+    (см. SentenceTransformerEncoder).
+
+    Args:
+        dim: Размерность вектора
+    """
+
+    # Триграммы дают высокую близость темам, отличающимся одним словом, поэтому порог строже
+    default_threshold = 0.95
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f'hashing-{dim}'
+
+    def _features(self, text: str):
+        features = {}
+        for word in re.findall(r'\w+', text.lower()):
+            features[f'w:{word}'] = features.get(f'w:{word}', 0) + 1
+            padded = f'#{word}#'
+            for i in range(len(padded) - 2):
+                gram = f'c:{padded[i:i + 3]}'
+                features[gram] = features.get(gram, 0) + 1
+        return features
+
+    def encode(self, texts):
+        """Возвращает матрицу (len(texts), dim) с L2-нормированными строками."""
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in self._features(text).items():
+                # crc32 стабилен между процессами, в отличие от встроенного hash()
+                digest = zlib.crc32(feature.encode('utf-8'))
+                sign = 1.0 if digest & 0x80000000 else -1.0
+                vectors[row, digest % self.dim] += sign * (1.0 + math.log(count))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class SentenceTransformerEncoder:
+    """
+    Локальная многоязычная модель sentence-transformers (ставится отдельно:
+    pip install sentence-transformers). Сопоставляет "ИИ-агенты" и "AI Agents".
+
+    Args:
+        model_name: Имя или путь модели
+    """
+
+    default_threshold = 0.85
+
+    def __init__(self, model_name: str = 'paraphrase-multilingual-MiniLM-L12-v2'):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.name = f'st-{model_name}'
+
+    def encode(self, texts):
+        vectors = self.model.encode(list(texts), normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def load_encoder(spec: str = None):
+    """
+    Создает энкодер по строке из RESEARCH_CACHE_ENCODER:
+    'hashing' (по умолчанию), 'sentence-transformers[:модель]' или 'модуль:класс'
+    для собственного энкодера с методом encode(texts) и атрибутом name.
+    """
+    spec = (spec or os.getenv('RESEARCH_CACHE_ENCODER', 'hashing')).strip()
+    if spec == 'hashing':
+        return HashingEncoder()
+    if spec.startswith('sentence-transformers'):
+        _, _, model_name = spec.partition(':')
+        return SentenceTransformerEncoder(model_name) if model_name else SentenceTransformerEncoder()
+    module_name, _, class_name = spec.partition(':')
+    if not class_name:
+        raise ValueError(f"Неизвестный RESEARCH_CACHE_ENCODER: {spec}")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def key_tokens(topic: str) -> frozenset:
+    """Токены темы, которые должны совпадать точно: числа, версии и названия с цифрами."""
+    return frozenset(_KEY_TOKEN.findall(topic.lower()))
+
+
+class VectorIndex:
+    """
+    Индекс ближайших соседей на NumPy: векторы нормированы, поэтому
+    косинусная близость - это скалярное произведение.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._entries = []  # (task_id, topic, research, created_at)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, vectors, entries):
+        """Добавляет векторы (n, dim) и соответствующие им записи."""
+        if not entries:
+            return
+        self._vectors = np.vstack([self._vectors, np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)])
+        self._entries.extend(entries)
+
+    def prune(self, min_created_at: float):
+        """Удаляет записи, созданные раньше min_created_at (unix time)."""
+        keep = [i for i, entry in enumerate(self._entries) if entry[3] >= min_created_at]
+        if len(keep) != len(self._entries):
+            self._vectors = self._vectors[keep]
+            self._entries = [self._entries[i] for i in keep]
+
+    def search(self, vector, min_similarity: float):
+        """Возвращает пары (близость, запись) с близостью не ниже min_similarity, от самой близкой."""
+        if not self._entries:
+            return []
+        similarities = self._vectors @ np.asarray(vector, dtype=np.float32)
+        matches = np.flatnonzero(similarities >= min_similarity)
+        matches = matches[np.argsort(-similarities[matches])]
+        return [(float(similarities[i]), self._entries[i]) for i in matches]
+
+
+class ResearchCache:
+    """
+    Кэш результатов исследования с поиском по близости тем.
+
+    Args:
+        encoder: Энкодер тем (см. load_encoder)
+        threshold: Минимальная косинусная близость тем для повторного использования
+        max_age: Окно свежести в секундах: более старые исследования не используются
+        refresh_interval: Как часто подгружать из БД записи других worker (в секундах)
+    """
+
+    def __init__(self, encoder, threshold: float = 0.95, max_age: float = 6 * 3600,
+                 refresh_interval: float = 60):
+        self.encoder = encoder
+        self.threshold = threshold
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._index = None
+        self._last_id = 0
+        self._last_refresh = 0.0
+        self._stats = {'lookups': 0, 'hits': 0, 'misses': 0, 'key_token_mismatches': 0,
+                       'stores': 0, 'saved_seconds': 0.0}
+        # Скользящие средние длительности полного прогона и прогона только писателя
+        self._full_run_seconds = None
+        self._writer_run_seconds = None
+
+    def _refresh(self):
+        """Подгружает из БД свежие записи, появившиеся после последней загрузки. Вызывается под блокировкой."""
+        from db import get_db_connection
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT id, task_id, topic, research, embedding, EXTRACT(EPOCH FROM created_at)
+                    FROM research_cache
+                    WHERE encoder = %s
+                      AND id > %s
+                      AND created_at > NOW() - make_interval(secs => %s)
+                    ORDER BY id
+                ''', (self.encoder.name, self._last_id, self.max_age))
+                rows = cursor.fetchall()
+        if self._index is None:
+            self._index = VectorIndex(len(rows[0][4]) if rows else self.encoder.encode(['']).shape[1])
+        self._index.prune(time.time() - self.max_age)
+        self._index.add(
+            np.array([row[4] for row in rows], dtype=np.float32),
+            [(row[1], row[2], row[3], float(row[5])) for row in rows]
+        )
+        if rows:
+            self._last_id = rows[-1][0]
+        self._last_refresh = time.monotonic()
+
+    def lookup(self, topic: str):
+        """
+        Ищет свежее исследование для похожей темы.
+
+        Returns:
+            ResearchHit или None; ошибки БД считаются промахом
+        """
+        similarity, entry, mismatched = None, None, False
+        try:
+            vector = self.encoder.encode([topic])[0]
+            with self._lock:
+                if self._index is None or time.monotonic() - self._last_refresh > self.refresh_interval:
+                    self._refresh()
+                self._index.prune(time.time() - self.max_age)
+                candidates = self._index.search(vector, self.threshold)
+            # Похожая тема с другой версией или номером - другая тема
+            tokens = key_tokens(topic)
+            for candidate_similarity, candidate in candidates:
+                if key_tokens(candidate[1]) == tokens:
+                    similarity, entry = candidate_similarity, candidate
+                    break
+                mismatched = True
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка поиска в кэше исследований: {str(e)}")
+
+        with self._lock:
+            self._stats['lookups'] += 1
+            if entry is None:
+                self._stats['misses'] += 1
+                if mismatched:
+                    self._stats['key_token_mismatches'] += 1
+                return None
+            self._stats['hits'] += 1
+
+        task_id, cached_topic, research, created_at = entry
+        hit = ResearchHit(task_id, cached_topic, research, similarity, time.time() - created_at)
+        logger.info(f"♻️ Тема '{topic}' похожа на '{cached_topic}' (близость {similarity:.2f}, "
+                    f"исследование {hit.age_seconds / 60:.0f} мин назад) - исследователь пропускается")
+        return hit
+
+    def store(self, task_id: int, topic: str, research: str):
+        """Сохраняет результат исследования темы в БД и в локальный индекс."""
+        if not research or not research.strip():
+            return
+        try:
+            vector = self.encoder.encode([topic])[0]
+            from db import get_db_connection
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute('''
+                        INSERT INTO research_cache (task_id, topic, research, encoder, embedding)
+                        VALUES (%s, %s, %s, %s, %s)
+                    ''', (task_id, topic, research, self.encoder.name, vector.tolist()))
+            with self._lock:
+                self._stats['stores'] += 1
+            # Запись попадет в индекс при следующем обновлении из БД, вместе с записями других worker
+            self._last_refresh = 0.0
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка сохранения в кэш исследований: {str(e)}")
+
+    def record_run(self, seconds: float, reused: bool):
+        """
+        Учитывает длительность прогона crew. Сэкономленное время при попадании
+        оценивается как разница средних длительностей полного прогона и прогона без исследователя.
+        """
+        with self._lock:
+            if reused:
+                self._writer_run_seconds = _moving_average(self._writer_run_seconds, seconds)
+                if self._full_run_seconds is not None:
+                    self._stats['saved_seconds'] += max(0.0, self._full_run_seconds - seconds)
+            else:
+                self._full_run_seconds = _moving_average(self._full_run_seconds, seconds)
+
+    def stats(self) -> dict:
+        """Попадания, промахи, доля попаданий и оценка сэкономленного времени."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['index_size'] = len(self._index) if self._index is not None else 0
+        stats['hit_rate'] = stats['hits'] / stats['lookups'] if stats['lookups'] else 0.0
+        stats['encoder'] = self.encoder.name
+        return stats
+
+
+def _moving_average(current, value: float, alpha: float = 0.2):
+    return value if current is None else (1 - alpha) * current + alpha * value
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_research_cache():
+    """
+    Возвращает общий для процесса кэш исследований или None, если он не включен
+    (RESEARCH_CACHE_ENABLED=1). Настройки: RESEARCH_CACHE_ENCODER,
+    RESEARCH_CACHE_THRESHOLD (по умолчанию - порог энкодера), RESEARCH_CACHE_MAX_AGE.
+    """
+    global _cache
+    if os.getenv('RESEARCH_CACHE_ENABLED', '0').strip().lower() not in ('1', 'true', 'yes', 'on'):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                encoder = load_encoder()
+                _cache = ResearchCache(
+                    encoder,
+                    threshold=float(os.getenv('RESEARCH_CACHE_THRESHOLD') or getattr(encoder, 'default_threshold', 0.95)),
+                    max_age=float(os.getenv('RESEARCH_CACHE_MAX_AGE', 6 * 3600)),
+                )
+                logger.info(f"✅ Кэш исследований: энкодер {_cache.encoder.name}, "
+                            f"порог близости {_cache.threshold}, окно свежести {_cache.max_age:.0f} сек")
+    return _cache
@@ -0,0 +1,98 @@
+"""
+Короткоживущий кэш ответов API в памяти процесса для часто запрашиваемых
+страниц списков (/webhook/results, /webhook/results/latest).
+
+Записи живут RESULTS_CACHE_TTL секунд и сбрасываются целиком при каждой записи
+в blog_posts из этого процесса (db.add_write_listener) и при каждом уведомлении
+в TASK_STATUS_CHANNEL (task_events.TaskEventHub), которое шлют записи worker.py
+и других процессов API. TTL ограничивает устаревание, только если уведомление потерялось.
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    TTL-кэш готовых ответов с ограничением размера (LRU).
+
+    Args:
+        ttl: Время жизни записи в секундах (0 - кэш выключен)
+        max_entries: Максимальное количество записей, лишние вытесняются по LRU
+    """
+
+    def __init__(self, ttl: float = 5, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, key: str):
+        """Возвращает сохраненный ответ или None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[0]
+
+    def set(self, key: str, value):
+        """Сохраняет ответ под ключом."""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Сбрасывает все записи."""
+        with self._lock:
+            self._entries.clear()
+            self._stats['invalidations'] += 1
+
+    def stats(self) -> dict:
+        """Попадания, промахи, сбросы и текущий размер."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Возвращает общий для процесса кэш ответов, настроенный из переменных окружения
+    RESULTS_CACHE_TTL и RESULTS_CACHE_MAX_ENTRIES, и подписывает его на записи в БД
+    этого процесса и на уведомления о смене статуса задач от остальных.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from db import add_write_listener
+                from task_events import get_task_event_hub
+                _cache = ResponseCache(
+                    ttl=float(os.getenv('RESULTS_CACHE_TTL', 5)),
+                    max_entries=int(os.getenv('RESULTS_CACHE_MAX_ENTRIES', 256)),
+                )
+                add_write_listener(_cache.clear)
+                get_task_event_hub().add_listener(_cache.clear)
+                logger.info(f"✅ Кэш ответов API: TTL {_cache.ttl:.0f} сек, до {_cache.max_entries} записей")
+    return _cache
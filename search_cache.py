@@ -0,0 +1,247 @@
+"""
+Кэш результатов поиска Serper с TTL и ограничением размера (LRU).
+Хранилище выбирается переменной SEARCH_CACHE_BACKEND: память процесса, файл SQLite
+или таблица в Postgres (общая для всех worker).
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Приводит поисковый запрос к ключу кэша: регистр, пробелы и порядок слов не важны.
+
+    Пример: '  AI  Agents news' и 'news ai agents' дают один и тот же ключ.
+    """
+    words = query.lower().split()
+    return ' '.join(sorted(words))
+
+
+class SearchCache:
+    """
+    Базовый класс кэша. Ошибки хранилища не ломают поиск: они логируются
+    и считаются промахом.
+
+    Args:
+        ttl: Время жизни записи в секундах
+        max_entries: Максимальное количество записей, лишние вытесняются по LRU
+    """
+
+    backend = 'none'
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'errors': 0}
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get(self, query: str):
+        """Возвращает сохраненный результат для запроса или None."""
+        try:
+            value = self._get(normalize_query(query))
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка чтения кэша поиска: {str(e)}")
+            self._count('errors')
+            value = None
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, query: str, value: str):
+        """Сохраняет результат поиска для запроса."""
+        try:
+            self._set(normalize_query(query), value)
+            self._count('sets')
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка записи в кэш поиска: {str(e)}")
+            self._count('errors')
+
+    def stats(self) -> dict:
+        """Счетчики попаданий и промахов."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['backend'] = self.backend
+        return stats
+
+    def _get(self, key: str):
+        raise NotImplementedError
+
+    def _set(self, key: str, value: str):
+        raise NotImplementedError
+
+
+class NullSearchCache(SearchCache):
+    """Кэш выключен: всегда промах."""
+
+    backend = 'off'
+
+    def _get(self, key: str):
+        return None
+
+    def _set(self, key: str, value: str):
+        pass
+
+
+class MemorySearchCache(SearchCache):
+    """Кэш в памяти процесса."""
+
+    backend = 'memory'
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 1000):
+        super().__init__(ttl, max_entries)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+
+    def _get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteSearchCache(SearchCache):
+    """Кэш в файле SQLite: переживает перезапуск процесса, общий для процессов на одной машине."""
+
+    backend = 'sqlite'
+
+    def __init__(self, path: str, ttl: float = 3600, max_entries: int = 1000):
+        super().__init__(ttl, max_entries)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_search_cache_accessed_at ON search_cache(accessed_at)')
+
+    def _get(self, key: str):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                'SELECT value FROM search_cache WHERE key = ? AND stored_at > ?',
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE search_cache SET accessed_at = ? WHERE key = ?', (now, key))
+            return row[0]
+
+    def _set(self, key: str, value: str):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute('''
+                INSERT INTO search_cache (key, value, stored_at, accessed_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value,
+                    stored_at = excluded.stored_at, accessed_at = excluded.accessed_at
+            ''', (key, value, now, now))
+            self._conn.execute('DELETE FROM search_cache WHERE stored_at <= ?', (now - self.ttl,))
+            self._conn.execute('''
+                DELETE FROM search_cache WHERE key IN (
+                    SELECT key FROM search_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,))
+
+
+class PostgresSearchCache(SearchCache):
+    """
+    Кэш в таблице serper_cache (migrations/002_serper_cache.sql): попадания общие
+    для всех реплик worker. Соединения берутся из общего пула db.py.
+    """
+
+    backend = 'postgres'
+
+    def _get(self, key: str):
+        from db import get_db_connection
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    UPDATE serper_cache
+                    SET accessed_at = NOW()
+                    WHERE key = %s AND stored_at > NOW() - make_interval(secs => %s)
+                    RETURNING value
+                ''', (key, self.ttl))
+                row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: str):
+        from db import get_db_connection
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    INSERT INTO serper_cache (key, value, stored_at, accessed_at)
+                    VALUES (%s, %s, NOW(), NOW())
+                    ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value,
+                        stored_at = EXCLUDED.stored_at, accessed_at = EXCLUDED.accessed_at
+                ''', (key, value))
+                cursor.execute('''
+                    DELETE FROM serper_cache
+                    WHERE stored_at <= NOW() - make_interval(secs => %s)
+                       OR key IN (
+                           SELECT key FROM serper_cache
+                           ORDER BY accessed_at DESC
+                           OFFSET %s
+                       )
+                ''', (self.ttl, self.max_entries))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """
+    Возвращает общий для процесса кэш поиска, настроенный из переменных окружения:
+    SEARCH_CACHE_BACKEND (memory, sqlite, postgres, off), SEARCH_CACHE_TTL,
+    SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_SQLITE_PATH.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                backend = os.getenv('SEARCH_CACHE_BACKEND', 'memory').strip().lower()
+                ttl = float(os.getenv('SEARCH_CACHE_TTL', 3600))
+                max_entries = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 1000))
+                if backend == 'off':
+                    _cache = NullSearchCache(ttl, max_entries)
+                elif backend == 'sqlite':
+                    path = os.getenv('SEARCH_CACHE_SQLITE_PATH', 'search_cache.sqlite3')
+                    _cache = SQLiteSearchCache(path, ttl, max_entries)
+                elif backend == 'postgres':
+                    _cache = PostgresSearchCache(ttl, max_entries)
+                elif backend == 'memory':
+                    _cache = MemorySearchCache(ttl, max_entries)
+                else:
+                    raise ValueError(f"Неизвестный SEARCH_CACHE_BACKEND: {backend}")
+                logger.info(f"✅ Кэш поиска: {backend} (TTL {ttl:.0f} сек, до {max_entries} записей)")
+    return _cache
@@ -0,0 +1,343 @@
+"""
+Общий клиент Serper API для всех точек входа (main.py, app.py, api.py, worker.py).
+Переиспользует keep-alive соединения, ограничивает время ожидания ответа
+и повторяет запрос при 429/5xx с экспоненциальной задержкой и джиттером.
+"""
+import os
+import json
+import time
+import random
+import bisect
+import logging
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from search_cache import get_search_cache, normalize_query
+
+logger = logging.getLogger(__name__)
+
+SERPER_SEARCH_URL = "https://google.serper.dev/search"
+
+# Коды ответа, при которых запрос имеет смысл повторить
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class SearchError(Exception):
+    """Поиск не удался после всех повторов."""
+
+
+class LatencyHistogram:
+    """
+    Потокобезопасная гистограмма длительностей в формате Prometheus
+    (кумулятивные бакеты, сумма и количество наблюдений).
+
+    Args:
+        buckets: Верхние границы бакетов в секундах (по возрастанию)
+    """
+
+    def __init__(self, buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30)):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, seconds: float):
+        """Добавляет одно наблюдение."""
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self._sum += seconds
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        """Возвращает кумулятивные бакеты ('+Inf' - все наблюдения), сумму и количество."""
+        with self._lock:
+            cumulative = {}
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), self._counts):
+                total += count
+                cumulative[str(bound)] = total
+            return {'buckets': cumulative, 'sum': self._sum, 'count': self._count}
+
+
+class SerperClient:
+    """
+    Клиент Serper API с пулом соединений, таймаутами и повторами.
+
+    Args:
+        api_key: Ключ Serper; если не задан, на каждый запрос читается SERPER_API_KEY
+        connect_timeout: Таймаут установки соединения в секундах
+        read_timeout: Таймаут ожидания ответа в секундах
+        max_retries: Сколько раз повторять запрос при 429/5xx и сетевых ошибках
+        backoff_base: Базовая задержка перед повтором в секундах
+        backoff_max: Максимальная задержка перед повтором в секундах
+        pool_maxsize: Сколько keep-alive соединений держать (по числу параллельных потоков)
+    """
+
+    def __init__(self, api_key: str = None, connect_timeout: float = 5, read_timeout: float = 20,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8,
+                 pool_maxsize: int = 10):
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_maxsize = pool_maxsize
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+
+        # Длительность одного HTTP-запроса и всего вызова search() с учетом повторов
+        self.request_latency = LatencyHistogram()
+        self.search_latency = LatencyHistogram()
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'errors': 0}
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def _get_api_key(self):
+        return self.api_key or os.getenv('SERPER_API_KEY')
+
+    def _backoff(self, attempt: int, response=None) -> float:
+        """Задержка перед повтором: Retry-After от сервера или full jitter."""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def search(self, payload):
+        """
+        Выполняет запрос к Serper и возвращает разобранный JSON.
+
+        Args:
+            payload: Тело запроса, например {'q': 'AI Agents', 'num': 10},
+                или список таких словарей для пакетного запроса (ответ - список)
+
+        Raises:
+            SearchError: если ключ не задан или запрос не удался после всех повторов
+        """
+        api_key = self._get_api_key()
+        if not api_key:
+            raise SearchError("API ключ Serper не найден. Проверьте файл .env")
+
+        started = time.monotonic()
+        try:
+            for attempt in range(self.max_retries + 1):
+                response = None
+                request_started = time.monotonic()
+                try:
+                    self._count('requests')
+                    response = self.session.post(
+                        SERPER_SEARCH_URL,
+                        headers={'X-API-KEY': api_key},
+                        json=payload,
+                        timeout=self.timeout
+                    )
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        response.raise_for_status()
+                        return response.json()
+                    error = SearchError(f"Serper вернул HTTP {response.status_code}")
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = e
+                except requests.RequestException as e:
+                    # 4xx (кроме 429) повторять бессмысленно
+                    self._count('errors')
+                    raise SearchError(str(e)) from e
+                finally:
+                    self.request_latency.observe(time.monotonic() - request_started)
+
+                if attempt == self.max_retries:
+                    break
+                delay = self._backoff(attempt, response)
+                self._count('retries')
+                logger.warning(f"⚠️ Ошибка Serper ({error}), повтор {attempt + 1}/{self.max_retries} через {delay:.1f} сек")
+                time.sleep(delay)
+
+            self._count('errors')
+            raise SearchError(f"{error} (после {self.max_retries} повторов)")
+        finally:
+            self.search_latency.observe(time.monotonic() - started)
+
+    def _search_items(self, query: str, num: int, top: int):
+        """Результаты одного запроса списком словарей (title, link, snippet), с кэшем."""
+        # Повторный или почти такой же запрос отдаем из кэша, не тратя квоту Serper
+        items = _load_items(get_search_cache().get(query))
+        if items is not None:
+            return items
+        return self._fetch_items(query, num, top)
+
+    def _fetch_items(self, query: str, num: int, top: int):
+        """Запрашивает результаты у Serper в обход кэша и сохраняет непустой ответ в кэш."""
+        items = extract_items(self.search({'q': query, 'num': num}), top)
+        _store_items(query, items)
+        return items
+
+    def search_text(self, query: str, num: int = 10, top: int = 5) -> str:
+        """
+        Ищет по запросу и возвращает первые top результатов текстом для агента.
+
+        Успешные результаты кэшируются (search_cache.py). Ошибки не выбрасываются,
+        а возвращаются текстом, чтобы агент мог продолжить работу.
+        """
+        if not self._get_api_key():
+            return "Ошибка: API ключ Serper не найден. Проверьте файл .env"
+        try:
+            items = self._search_items(query, num, top)
+        except Exception as e:
+            return f"Ошибка при поиске: {str(e)}"
+        return format_items(items) or "Результаты поиска не найдены"
+
+    def search_many(self, queries, num: int = 10, top: int = 5) -> dict:
+        """
+        Выполняет несколько запросов за время одного: сначала пробует пакетный запрос
+        Serper (массив запросов в одном POST), при ошибке - параллельные одиночные запросы.
+
+        Args:
+            queries: Список поисковых запросов
+            num: Сколько результатов запрашивать у Serper на каждый запрос
+            top: Сколько результатов оставлять на каждый запрос
+
+        Returns:
+            Словарь запрос -> список результатов или исключение, если этот запрос не удался
+        """
+        cache = get_search_cache()
+        results = {}
+        missing = []
+        for query in queries:
+            items = _load_items(cache.get(query))
+            if items is not None:
+                results[query] = items
+            else:
+                missing.append(query)
+        if not missing:
+            return results
+
+        fetched = False
+        if len(missing) > 1:
+            try:
+                batch = self.search([{'q': query, 'num': num} for query in missing])
+                if not isinstance(batch, list) or len(batch) != len(missing):
+                    raise SearchError("Неожиданный ответ на пакетный запрос")
+                for query, data in zip(missing, batch):
+                    results[query] = extract_items(data, top)
+                    _store_items(query, results[query])
+                fetched = True
+            except Exception as e:
+                logger.warning(f"⚠️ Пакетный запрос Serper не удался ({str(e)}), выполняем запросы параллельно")
+
+        if not fetched:
+            with ThreadPoolExecutor(max_workers=min(len(missing), self.pool_maxsize)) as executor:
+                futures = {query: executor.submit(self._fetch_items, query, num, top) for query in missing}
+            for query, future in futures.items():
+                try:
+                    results[query] = future.result()
+                except Exception as error:
+                    results[query] = error
+        return {query: results[query] for query in queries}
+
+    def search_many_text(self, queries, num: int = 10, top: int = 5) -> str:
+        """
+        Выполняет несколько запросов параллельно и возвращает одну сводку для агента:
+        результаты сгруппированы по запросам, повторяющиеся ссылки убраны.
+        """
+        if not self._get_api_key():
+            return "Ошибка: API ключ Serper не найден. Проверьте файл .env"
+
+        # Одинаковые с точностью до регистра, пробелов и порядка слов запросы выполняем один раз
+        unique = {}
+        for query in queries:
+            if query and query.strip():
+                unique.setdefault(normalize_query(query), query.strip())
+        if not unique:
+            return "Ошибка: не передано ни одного поискового запроса"
+
+        results = self.search_many(list(unique.values()), num, top)
+
+        seen_links = set()
+        sections = []
+        for query, items in results.items():
+            if isinstance(items, Exception):
+                sections.append(f"### Запрос: {query}\nОшибка при поиске: {str(items)}\n")
+                continue
+            fresh = []
+            for item in items:
+                if item['link'] and item['link'] in seen_links:
+                    continue
+                seen_links.add(item['link'])
+                fresh.append(item)
+            body = format_items(fresh) or "Новых результатов нет (все ссылки уже встречались выше)\n"
+            sections.append(f"### Запрос: {query}\n{body}")
+        return "\n".join(sections)
+
+    def stats(self) -> dict:
+        """Счетчики запросов, повторов и ошибок плюс гистограммы задержек."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['request_latency_seconds'] = self.request_latency.snapshot()
+        stats['search_latency_seconds'] = self.search_latency.snapshot()
+        return stats
+
+
+def extract_items(data: dict, top: int = 5) -> list:
+    """Достает первые top органических результатов Serper: title, link, snippet."""
+    return [
+        {
+            'title': item.get('title', 'Без названия'),
+            'link': item.get('link', ''),
+            'snippet': item.get('snippet', ''),
+        }
+        for item in data.get('organic', [])[:top]
+    ]
+
+
+def format_items(items: list) -> str:
+    """Форматирует результаты поиска в текст для агента; пустая строка, если результатов нет."""
+    return "\n".join(
+        f"Название: {item['title']}\nСсылка: {item['link']}\nОписание: {item['snippet']}\n"
+        for item in items
+    )
+
+
+def _store_items(query: str, items: list):
+    """Сохраняет непустые результаты запроса в кэш поиска."""
+    if items:
+        get_search_cache().set(query, json.dumps(items, ensure_ascii=False))
+
+
+def _load_items(cached):
+    """Разбирает запись кэша; записи старого формата считаются промахом."""
+    if cached is None:
+        return None
+    try:
+        items = json.loads(cached)
+    except ValueError:
+        return None
+    return items if isinstance(items, list) else None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_search_client() -> SerperClient:
+    """
+    Возвращает общий для процесса клиент Serper, настроенный из переменных окружения:
+    SERPER_CONNECT_TIMEOUT, SERPER_READ_TIMEOUT, SERPER_MAX_RETRIES, SERPER_POOL_SIZE.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SerperClient(
+                    connect_timeout=float(os.getenv('SERPER_CONNECT_TIMEOUT', 5)),
+                    read_timeout=float(os.getenv('SERPER_READ_TIMEOUT', 20)),
+                    max_retries=int(os.getenv('SERPER_MAX_RETRIES', 3)),
+                    pool_maxsize=int(os.getenv('SERPER_POOL_SIZE', 10)),
+                )
+    return _client
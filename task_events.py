@@ -0,0 +1,107 @@
+"""
+Рассылка смены статуса задач подписчикам API (SSE и long-poll в api.py).
+
+Один поток на процесс слушает TASK_STATUS_CHANNEL (LISTEN/NOTIFY), куда worker
+пишет при каждой смене статуса, и будит только тех клиентов, которые ждут эту задачу.
+Сколько бы клиентов ни ждало, соединение для LISTEN одно. Через add_listener на те же
+уведомления подписываются и другие части процесса (сброс кэша ответов API).
+"""
+import json
+import queue
+import logging
+import threading
+from db import TaskListener, TASK_STATUS_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+
+class TaskEventHub:
+    """
+    Подписки на смену статуса задач.
+
+    subscribe() возвращает очередь, в которую попадает новый статус задачи.
+    Статус только будит подписчика: актуальные данные он перечитывает из БД сам,
+    а на случай потерянных уведомлений (переподключение LISTEN) еще и периодически.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # task_id -> set(queue.Queue)
+        self._listeners = []
+        self._stats = {'published': 0, 'delivered': 0}
+
+    def subscribe(self, task_id: int) -> queue.Queue:
+        """Подписывает на задачу; обязательно парный вызов unsubscribe."""
+        events = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(task_id, set()).add(events)
+        return events
+
+    def unsubscribe(self, task_id: int, events: queue.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(task_id)
+            if subscribers is not None:
+                subscribers.discard(events)
+                if not subscribers:
+                    del self._subscribers[task_id]
+
+    def add_listener(self, callback):
+        """
+        Регистрирует функцию без аргументов, которая вызывается после каждой пачки
+        уведомлений о статусе (из любого процесса) и после (пере)подключения LISTEN.
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def notify_listeners(self):
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка обработчика уведомлений о статусе: {str(e)}")
+
+    def publish(self, payload: str):
+        """Разбирает payload из TASK_STATUS_CHANNEL и будит подписчиков задачи."""
+        try:
+            message = json.loads(payload)
+            task_id, status = int(message['id']), message['status']
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"⚠️ Некорректное уведомление о статусе задачи: {payload}")
+            return
+        with self._lock:
+            subscribers = list(self._subscribers.get(task_id, ()))
+            self._stats['published'] += 1
+            self._stats['delivered'] += len(subscribers)
+        for events in subscribers:
+            events.put(status)
+
+    def stats(self) -> dict:
+        """Количество уведомлений, доставок и текущих подписчиков."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['subscribers'] = sum(len(group) for group in self._subscribers.values())
+            stats['tasks'] = len(self._subscribers)
+        return stats
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_task_event_hub() -> TaskEventHub:
+    """Возвращает общий для процесса TaskEventHub; при первом вызове запускает LISTEN."""
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                hub = TaskEventHub()
+                TaskListener(
+                    on_notify=hub.notify_listeners,
+                    on_message=hub.publish,
+                    stop_event=threading.Event(),
+                    channel=TASK_STATUS_CHANNEL,
+                ).start()
+                _hub = hub
+    return _hub
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+import pytest
+from crew_metrics import RunMetrics, track_run, metered
+
+FINAL_ANSWER = 'Thought: I now can give a great answer\nFinal Answer: готово'
+
+
+def fake_completion(prompt_tokens, completion_tokens):
+    usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    return lambda *args, **kwargs: SimpleNamespace(usage=usage)
+
+
+def test_llm_calls_are_attributed_to_current_stage():
+    metrics = RunMetrics(1, ['research', 'writing'])
+    research_call = metered(fake_completion(100, 20))
+    writing_call = metered(fake_completion(300, 50))
+    with track_run(metrics):
+        research_call()
+        research_call()
+        metrics.task_callback()
+        writing_call()
+    metrics.finish('completed')
+
+    research, writing = metrics.stages
+    assert (research['llm_calls'], research['prompt_tokens'], research['completion_tokens']) == (2, 200, 40)
+    assert (writing['llm_calls'], writing['prompt_tokens'], writing['completion_tokens']) == (1, 300, 50)
+    assert metrics.prompt_tokens == 500 and metrics.completion_tokens == 90
+
+
+def test_calls_outside_run_are_not_recorded():
+    metrics = RunMetrics(1, ['writing'])
+    call = metered(fake_completion(10, 5))
+    call()
+    with track_run(metrics):
+        call()
+    call()
+    assert metrics.llm_calls == 1
+
+
+def test_two_stage_crew_run_counts_tokens_for_both_stages(monkeypatch):
+    pytest.importorskip('crewai')
+    litellm = pytest.importorskip('litellm')
+    from crewai import LLM
+    from crews import CrewTemplate, build_research_crew
+
+    monkeypatch.setattr(litellm, 'completion', metered(litellm.completion))
+    template = CrewTemplate(build_research_crew, LLM(model='gpt-4o-mini', mock_response=FINAL_ANSWER), ['topic'])
+    # Второй прогон - на экземпляре из пула, у агентов которого уже есть прошлые счетчики
+    for _ in range(2):
+        metrics = RunMetrics(1, ['research', 'writing'])
+        with track_run(metrics), template.checkout(metrics.task_callback) as crew:
+            crew.kickoff(inputs={'topic': 'Python 3.14'})
+        metrics.finish('completed')
+        for stage in metrics.stages:
+            assert stage['llm_calls'] >= 1
+            assert stage['prompt_tokens'] > 0 and stage['completion_tokens'] > 0
+    assert template.stats()['reused'] == 1
@@ -0,0 +1,24 @@
+import pytest
+
+pytest.importorskip('crewai')
+from crewai import LLM
+from crews import CrewTemplate, build_research_crew
+
+FINAL_ANSWER = 'Thought: I now can give a great answer\nFinal Answer: готово'
+
+
+def test_checkout_resets_state_of_reused_crew():
+    template = CrewTemplate(build_research_crew, LLM(model='gpt-4o-mini', mock_response=FINAL_ANSWER), ['topic'])
+    with template.checkout() as crew:
+        crew.kickoff(inputs={'topic': 'Python 3.14'})
+        # Как после ошибок и вызовов инструментов в прошлых прогонах
+        for agent in crew.agents:
+            agent._times_executed = agent.max_retry_limit
+            agent.tools_results = [{'result': 'старый поиск', 'result_as_answer': True}]
+    with template.checkout() as reused:
+        assert reused is crew
+        assert all(agent._times_executed == 0 and agent.tools_results == [] for agent in reused.agents)
+        assert all(task.output is None for task in reused.tasks)
+        reused.kickoff(inputs={'topic': 'Python 3.15'})
+        assert str(reused.tasks[-1].output.raw) == 'готово'
+    assert template.stats() == {'created': 1, 'reused': 1, 'idle': 1}
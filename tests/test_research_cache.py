@@ -0,0 +1,60 @@
+import time
+import pytest
+from research_cache import HashingEncoder, ResearchCache, VectorIndex, key_tokens, get_research_cache
+
+VERSION_PAIRS = [
+    ('OpenAI GPT-5', 'OpenAI GPT-4'),
+    ('Apple iPhone 17', 'Apple iPhone 16'),
+    ('Python 3.14 release', 'Python 3.13 release'),
+]
+
+
+def make_cache(topics):
+    """Кэш с заранее заполненным индексом, без обращения к БД."""
+    cache = ResearchCache(HashingEncoder(), refresh_interval=3600)
+    now = time.time()
+    vectors = cache.encoder.encode(topics)
+    cache._index = VectorIndex(cache.encoder.dim)
+    cache._index.add(vectors, [(i, topic, f'research {topic}', now) for i, topic in enumerate(topics, 1)])
+    cache._last_refresh = time.monotonic()
+    return cache
+
+
+@pytest.mark.parametrize('cached_topic, topic', VERSION_PAIRS + [(b, a) for a, b in VERSION_PAIRS])
+def test_different_versions_do_not_reuse_research(cached_topic, topic):
+    cache = make_cache([cached_topic])
+    # Даже с заниженным порогом близости номера должны совпадать точно
+    cache.threshold = 0.5
+    assert cache.lookup(topic) is None
+    assert cache.stats()['key_token_mismatches'] == 1
+
+
+@pytest.mark.parametrize('cached_topic, topic', VERSION_PAIRS)
+def test_hashing_threshold_rejects_version_pairs(cached_topic, topic):
+    vectors = HashingEncoder().encode([cached_topic, topic])
+    assert float(vectors[0] @ vectors[1]) < HashingEncoder.default_threshold
+
+
+def test_same_topic_with_same_version_is_reused():
+    cache = make_cache(['OpenAI GPT-5', 'Python 3.14 release'])
+    hit = cache.lookup('openai gpt-5')
+    assert hit is not None
+    assert hit.topic == 'OpenAI GPT-5'
+
+
+def test_matching_version_is_preferred_over_closer_topic():
+    cache = make_cache(['Python 3.13 release', 'Python 3.14 release notes'])
+    cache.threshold = 0.5
+    hit = cache.lookup('Python 3.14 release')
+    assert hit is not None and hit.topic == 'Python 3.14 release notes'
+
+
+def test_key_tokens():
+    assert key_tokens('Python 3.14 release') == {'3.14'}
+    assert key_tokens('NVIDIA H100 vs M3') == {'h100', 'm3'}
+    assert key_tokens('AI Agents') == frozenset()
+
+
+def test_disabled_by_default(monkeypatch):
+    monkeypatch.delenv('RESEARCH_CACHE_ENABLED', raising=False)
+    assert get_research_cache() is None
@@ -0,0 +1,27 @@
+"""
+Инструменты CrewAI, общие для всех точек входа.
+"""
+from crewai.tools import tool
+from search_client import get_search_client
+from crew_metrics import timed_tool_call
+
+# Ограничение на количество запросов в одном вызове параллельного поиска
+MAX_MULTI_SEARCH_QUERIES = 10
+
+
+@tool("Поиск в интернете")
+def serper_search(query: str) -> str:
+    """Поиск актуальных новостей и информации в интернете через Serper API. 
+    Используй для поиска последних новостей по указанной теме."""
+    with timed_tool_call('serper_search'):
+        return get_search_client().search_text(query)
+
+
+@tool("Параллельный поиск в интернете")
+def serper_multi_search(queries: list[str]) -> str:
+    """Поиск сразу по нескольким запросам (список строк, до 10) через Serper API.
+    Запросы выполняются параллельно, результаты объединяются в одну сводку без
+    повторяющихся ссылок. Используй вместо нескольких вызовов обычного поиска,
+    когда нужно проверить разные формулировки или аспекты темы."""
+    with timed_tool_call('serper_multi_search'):
+        return get_search_client().search_many_text(queries[:MAX_MULTI_SEARCH_QUERIES])
@@ -1,270 +1,209 @@
 """
 Worker процесс для выполнения длительных задач генерации блог-постов.
-Периодически проверяет БД на наличие задач со статусом 'pending' и выполняет их.
+Забирает из БД задачи со статусом 'pending' сразу после уведомления (LISTEN/NOTIFY)
+и выполняет их, до --concurrency задач одновременно.
 """
 import os
 import time
+import signal
 import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
-from crewai import Agent, Task, Crew, Process
-from crewai.tools import tool
-import requests
-import psycopg2
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+from crews import get_research_template, get_writing_template, get_research_output
+from search_client import get_search_client
+from search_cache import get_search_cache
+from research_cache import get_research_cache
+from crew_metrics import RunMetrics, track_run, install_usage_tracking
+from queue_metrics import queue_metric_families
+from prometheus import MetricFamily, render, CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE
+from logging_setup import configure_logging
+from db import claim_pending_tasks, update_task_status, update_task_result, close_pool, pool_stats, TaskListener
 
 # Загружаем переменные окружения
 load_dotenv(override=True)
 
-# Создаем LLM для OpenAI
+# Настройка логирования (logging_setup.py) - после .env, чтобы учитывались LOG_*
+configure_logging('worker')
+logger = logging.getLogger(__name__)
+
+# Интервал опроса очереди, когда подписка LISTEN недоступна
+POLL_INTERVAL = 10
+# Резервный интервал опроса при работающей подписке (на случай пропущенных NOTIFY)
+FALLBACK_POLL_INTERVAL = int(os.getenv('WORKER_FALLBACK_POLL_INTERVAL', 300))
+
+# Создаем LLM для OpenAI; вызовы и токены по этапам считает install_usage_tracking() (crew_metrics.py)
 openai_llm = ChatOpenAI(
     model='gpt-4o-mini',
     temperature=0.7
 )
 
 
-def get_db_connection():
-    """Получает подключение к Supabase PostgreSQL."""
-    database_url = os.getenv('DATABASE_URL')
-    if not database_url:
-        raise ValueError("DATABASE_URL not found in environment variables")
-    return psycopg2.connect(database_url)
-
-
-@tool("Поиск в интернете")
-def serper_search(query: str) -> str:
-    """Поиск актуальных новостей и информации в интернете через Serper API."""
-    api_key = os.getenv('SERPER_API_KEY')
-    if not api_key:
-        return "Ошибка: API ключ Serper не найден. Проверьте файл .env"
-    
-    url = "https://google.serper.dev/search"
-    headers = {
-        'X-API-KEY': api_key,
-        'Content-Type': 'application/json'
-    }
-    payload = {
-        'q': query,
-        'num': 10
-    }
-    
-    try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Форматируем результаты
-        results = []
-        if 'organic' in data:
-            for item in data['organic'][:5]:  # Берем первые 5 результатов
-                title = item.get('title', 'Без названия')
-                link = item.get('link', '')
-                snippet = item.get('snippet', '')
-                results.append(f"Название: {title}\nСсылка: {link}\nОписание: {snippet}\n")
-        
-        return "\n".join(results) if results else "Результаты поиска не найдены"
-    except Exception as e:
-        return f"Ошибка при поиске: {str(e)}"
-
-
-def create_research_crew(topic: str, llm):
-    """
-    Создает Crew для исследования заданной темы и написания блог-поста.
-    
-    Args:
-        topic: Тема для поиска новостей и написания блог-поста
-        llm: LLM объект для использования агентами
-    
-    Returns:
-        Crew объект готовый к выполнению
-    """
-    # Создаем агента-исследователя
-    researcher = Agent(
-        role='Исследователь новостей',
-        goal=f'Найти актуальные и релевантные новости про {topic} в интернете',
-        backstory=f'''Ты опытный исследователь, специализирующийся на поиске и анализе 
-        информации в интернете. Ты умеешь находить самые свежие и важные новости 
-        по теме "{topic}", анализировать их и предоставлять структурированную информацию.''',
-        verbose=True,
-        allow_delegation=False,
-        tools=[serper_search],
-        llm=llm
-    )
-    
-    # Создаем агента-писателя
-    writer = Agent(
-        role='Блог-писатель',
-        goal=f'Написать интересный и информативный пост для блога на русском языке о теме "{topic}" на основе найденных новостей',
-        backstory='''Ты талантливый блог-писатель, который специализируется на 
-        написании информативных статей. Ты умеешь структурировать информацию, 
-        делать ее понятной для широкой аудитории и писать увлекательные тексты 
-        на русском языке.''',
-        verbose=True,
-        allow_delegation=False,
-        llm=llm
-    )
-    
-    # Создаем задачу для исследования
-    research_task = Task(
-        description=f'''Найди в интернете последние новости (за последние 1-2 недели) 
-        про {topic}. Собери информацию о 3-5 самых интересных и важных новостях. 
-        Включи в результат:
-        - Название новости
-        - Источник и дату публикации
-        - Краткое описание содержания
-        - Почему эта новость важна''',
-        agent=researcher,
-        expected_output=f'Структурированный список из 3-5 новостей про {topic} с названиями, источниками, датами и описаниями'
-    )
-    
-    # Создаем задачу для написания поста
-    writing_task = Task(
-        description=f'''Используй результаты исследования новостей про {topic}, чтобы 
-        написать короткий блог-пост на русском языке. Пост должен быть:
-        - Информативным и интересным
-        - Структурированным (с заголовком и несколькими абзацами)
-        - Написанным для широкой аудитории
-        - Объемом примерно 300-500 слов
-        - Включать ключевые моменты из найденных новостей
-        - Основанным на информации, которую собрал исследователь''',
-        agent=writer,
-        context=[research_task],
-        expected_output=f'Полноценный блог-пост на русском языке объемом 300-500 слов про {topic} с заголовком и структурированным содержанием'
-    )
-    
-    # Создаем crew (команду)
-    crew = Crew(
-        agents=[researcher, writer],
-        tasks=[research_task, writing_task],
-        process=Process.sequential,
-        verbose=True
-    )
-    
-    return crew
-
-
-def get_pending_task():
-    """Получает первую задачу со статусом 'pending' из Supabase."""
-    try:
-        logger.debug("🔍 Подключение к БД для поиска задач...")
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Сначала проверим количество задач со статусом 'pending'
-        cursor.execute('''
-            SELECT COUNT(*) FROM blog_posts WHERE status = 'pending'
-        ''')
-        pending_count = cursor.fetchone()[0]
-        logger.info(f"📊 Найдено задач со статусом 'pending': {pending_count}")
-        
-        # Получаем первую задачу
-        cursor.execute('''
-            SELECT id, topic, author, date, created_at
-            FROM blog_posts
-            WHERE status = 'pending'
-            ORDER BY created_at ASC
-            LIMIT 1
-        ''')
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        
-        if row:
-            logger.info(f"✅ Задача найдена в БД: ID={row[0]}, тема='{row[1]}'")
-            return {
-                'id': row[0],
-                'topic': row[1],
-                'author': row[2],
-                'date': row[3],
-                'created_at': row[4]
-            }
-        logger.info("ℹ️  Задач со статусом 'pending' не найдено")
-        return None
-    except Exception as e:
-        logger.error(f"❌ Ошибка при получении задачи из БД: {str(e)}", exc_info=True)
-        return None
-
-
-def update_task_status(task_id: int, status: str):
-    """Обновляет статус задачи в Supabase."""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE blog_posts
-            SET status = %s
-            WHERE id = %s
-        ''', (status, task_id))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        logger.info(f"✅ Статус задачи {task_id} обновлен на '{status}'")
-    except Exception as e:
-        logger.error(f"❌ Ошибка при обновлении статуса задачи {task_id}: {str(e)}", exc_info=True)
-        raise
-
-
-def update_task_result(task_id: int, content: str, status: str = 'completed'):
-    """Обновляет content и status задачи в Supabase."""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE blog_posts
-            SET content = %s, status = %s
-            WHERE id = %s
-        ''', (str(content), status, task_id))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        logger.info(f"✅ Результат задачи {task_id} обновлен, статус: '{status}'")
-    except Exception as e:
-        logger.error(f"❌ Ошибка при обновлении результата задачи {task_id}: {str(e)}", exc_info=True)
-        raise
-
-
 def process_task(task):
     """Обрабатывает одну задачу: выполняет генерацию и сохраняет результат."""
     task_id = task['id']
     topic = task['topic']
     author = task.get('author')
     date = task.get('date')
+    metrics = None
     
     try:
         logger.info(f"🚀 Начало обработки задачи {task_id}: тема '{topic}'")
         
-        # Обновляем статус на 'processing'
-        update_task_status(task_id, 'processing')
+        # Для похожей темы со свежим исследованием сразу запускаем писателя
+        research_cache = get_research_cache()
+        hit = research_cache.lookup(topic) if research_cache else None
         
-        # Создаем crew и выполняем генерацию
-        crew = create_research_crew(topic, openai_llm)
-        result = crew.kickoff()
+        # Метрики прогона: время этапов, вызовы инструментов и LLM (crew_metrics.py)
+        metrics = RunMetrics(task_id, ['writing'] if hit else ['research', 'writing'], reused_research=bool(hit))
+        
+        # Берем готовый crew из шаблона процесса (crews.py), тема подставляется при kickoff
+        if hit:
+            template, inputs = get_writing_template(openai_llm), {'topic': topic, 'research': hit.research}
+        else:
+            template, inputs = get_research_template(openai_llm), {'topic': topic}
+        with track_run(metrics), template.checkout(metrics.task_callback) as crew:
+            result = crew.kickoff(inputs=inputs)
+            # Экземпляр вернется в пул после блока: все, что нужно от прогона, читаем здесь
+            research = None if hit else get_research_output(crew)
+        metrics.finish('completed')
+        
+        if research_cache:
+            research_cache.record_run(metrics.total_seconds, reused=bool(hit))
+            if research is not None:
+                research_cache.store(task_id, topic, research)
         
         # Сохраняем результат и обновляем статус на 'completed'
         update_task_result(task_id, str(result), 'completed')
         
         logger.info(f"✅ Задача {task_id} успешно обработана. Тема: '{topic}'")
         logger.info(f"Результат (первые 200 символов): {str(result)[:200]}...")
+        logger.info(f"⏱️  Прогон задачи {task_id}: {metrics.summary()}")
+        logger.info(f"📊 Кэш поиска: {get_search_cache().stats()}")
+        if research_cache:
+            logger.info(f"📊 Кэш исследований: {research_cache.stats()}")
         
     except Exception as e:
         logger.error(f"❌ Ошибка при обработке задачи {task_id}: {str(e)}", exc_info=True)
+        if metrics is not None and metrics.status is None:
+            metrics.finish('failed')
         # Обновляем статус на 'failed'
         try:
             update_task_status(task_id, 'failed')
         except Exception as update_error:
             logger.error(f"❌ Ошибка при обновлении статуса на 'failed': {str(update_error)}", exc_info=True)
+    finally:
+        if metrics is not None and metrics.status is not None:
+            metrics.save()
+
+
+def run_in_slot(slot: int, task):
+    """Выполняет задачу в слоте пула; имя потока попадает в каждую строку лога."""
+    threading.current_thread().name = f"slot-{slot}"
+    started = time.monotonic()
+    logger.info(f"🎰 Слот {slot} занят задачей {task['id']}")
+    try:
+        process_task(task)
+    finally:
+        logger.info(f"🎰 Слот {slot} освобожден после задачи {task['id']} ({time.monotonic() - started:.1f} сек)")
+
+
+def worker_metric_families(concurrency: int, running: dict) -> list:
+    """Метрики процесса worker: занятость слотов, пул БД, клиент и кэш поиска."""
+    slots = MetricFamily('blog_worker_slots', 'gauge', 'Слоты worker по состоянию')
+    busy = len(running)
+    slots.add(busy, state='busy').add(concurrency - busy, state='free')
+    
+    pool = pool_stats()
+    db_pool = MetricFamily('blog_worker_db_pool_connections', 'gauge', 'Соединения пула БД процесса worker')
+    db_pool.add(pool.get('in_use', 0), state='in_use').add(pool.get('idle', 0), state='idle')
+    
+    client = get_search_client().stats()
+    serper_requests = MetricFamily('blog_worker_serper_requests_total', 'counter', 'HTTP-запросы к Serper')
+    serper_requests.add(client['requests'], result='sent').add(client['retries'], result='retry').add(client['errors'], result='error')
+    serper_latency = MetricFamily('blog_worker_serper_request_seconds', 'histogram', 'Длительность HTTP-запроса к Serper')
+    serper_latency.add_histogram(client['request_latency_seconds'])
+    
+    cache = get_search_cache().stats()
+    cache_lookups = MetricFamily('blog_worker_search_cache_lookups_total', 'counter', 'Обращения к кэшу поиска')
+    cache_lookups.add(cache['hits'], result='hit').add(cache['misses'], result='miss')
+    
+    return [slots, db_pool, serper_requests, serper_latency, cache_lookups]
+
+
+def start_metrics_server(port: int, collect):
+    """
+    Запускает в фоновом потоке HTTP-сервер с GET /metrics (формат Prometheus)
+    и GET /health, чтобы автомасштабирование могло опрашивать сам worker.
+    
+    Args:
+        port: Порт для прослушивания
+        collect: Функция без аргументов, возвращает список семейств метрик
+    
+    Returns:
+        ThreadingHTTPServer; остановка - server.shutdown()
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/health':
+                body, status, content_type = b'ok', 200, 'text/plain'
+            elif self.path == '/metrics':
+                try:
+                    body, status, content_type = render(collect()).encode('utf-8'), 200, PROMETHEUS_CONTENT_TYPE
+                except Exception as e:
+                    logger.error(f"❌ Ошибка при сборе метрик: {str(e)}", exc_info=True)
+                    body, status, content_type = str(e).encode('utf-8'), 500, 'text/plain'
+            else:
+                body, status, content_type = b'not found', 404, 'text/plain'
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            logger.debug(f"📈 metrics: {format % args}")
+    
+    server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    logger.info(f"📈 Метрики worker: http://0.0.0.0:{port}/metrics")
+    return server
 
 
-def main():
+def parse_args(argv=None):
+    """Разбирает аргументы командной строки worker процесса."""
+    parser = argparse.ArgumentParser(description="Worker для генерации блог-постов из очереди в Supabase")
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=int(os.getenv('WORKER_CONCURRENCY', 1)),
+        help="Сколько задач выполнять одновременно (по умолчанию WORKER_CONCURRENCY или 1)"
+    )
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=int(os.getenv('WORKER_METRICS_PORT', 0)),
+        help="Порт HTTP-сервера с /metrics (по умолчанию WORKER_METRICS_PORT; 0 - не запускать)"
+    )
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error("--concurrency должен быть не меньше 1")
+    return args
+
+
+def main(argv=None):
     """Основная функция worker процесса."""
+    args = parse_args(argv)
+    concurrency = args.concurrency
+    
     logger.info("🚀 Запуск Worker процесса для обработки задач генерации блог-постов")
-    logger.info("⏱️  Интервал проверки новых задач: 10 секунд")
+    logger.info(f"🎰 Количество слотов для одновременного выполнения задач: {concurrency}")
+    logger.info(f"⏱️  Резервный интервал проверки новых задач: {FALLBACK_POLL_INTERVAL} секунд "
+                f"({POLL_INTERVAL} секунд без LISTEN-подписки)")
     
     # Проверяем наличие необходимых переменных окружения
     database_url = os.getenv('DATABASE_URL')
@@ -285,34 +224,92 @@ def main():
     
     logger.info("✅ Все необходимые переменные окружения найдены")
     
-    # Основной цикл обработки задач
+    # Учет вызовов LLM и токенов по этапам прогона (crew_metrics.py)
+    install_usage_tracking()
+    
+    # Шаблон crew собирается и проверяется до первой задачи (crews.py)
+    get_research_template(openai_llm).warm_up()
+    
+    # Диспетчер спит на wakeup: его будят уведомление о новой задаче (LISTEN),
+    # освободившийся слот, сигнал остановки или истечение интервала опроса
+    stop_event = threading.Event()
+    wakeup = threading.Event()
+    
+    # SIGTERM (остановка dyno на Railway) обрабатываем так же, как Ctrl+C:
+    # новые задачи не берем, дожидаемся выполняющихся
+    def handle_stop_signal(signum, frame):
+        logger.info(f"🛑 Получен сигнал {signal.Signals(signum).name}, новые задачи больше не берутся...")
+        stop_event.set()
+        wakeup.set()
+    
+    signal.signal(signal.SIGTERM, handle_stop_signal)
+    
+    listener = TaskListener(on_notify=wakeup.set, stop_event=stop_event)
+    listener.start()
+    
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    free_slots = list(range(concurrency, 0, -1))
+    running = {}  # future -> slot
+    
+    metrics_server = None
+    if args.metrics_port:
+        metrics_server = start_metrics_server(
+            args.metrics_port,
+            lambda: queue_metric_families() + worker_metric_families(concurrency, running)
+        )
+    
+    # Основной цикл диспетчера: заполняем свободные слоты задачами
     iteration = 0
-    while True:
-        try:
-            iteration += 1
-            logger.info(f"🔄 Итерация {iteration}: Проверка наличия задач со статусом 'pending'...")
-            
-            # Получаем задачу со статусом 'pending'
-            task = get_pending_task()
-            
-            if task:
-                logger.info(f"📋 Найдена задача для обработки: ID={task['id']}, тема='{task['topic']}', создана: {task['created_at']}")
-                process_task(task)
-            else:
-                # Если задач нет, просто ждем
-                logger.info("⏳ Задач для обработки нет, ожидание 10 секунд...")
-            
-            # Ждем 10 секунд перед следующей проверкой
-            logger.info("⏱️  Ожидание 10 секунд перед следующей проверкой...")
-            time.sleep(10)
-            
-        except KeyboardInterrupt:
-            logger.info("🛑 Получен сигнал остановки, завершение работы...")
-            break
-        except Exception as e:
-            logger.error(f"❌ Неожиданная ошибка в основном цикле: {str(e)}", exc_info=True)
-            # Продолжаем работу после ошибки, чтобы worker не останавливался
-            time.sleep(10)
+    try:
+        while not stop_event.is_set():
+            try:
+                iteration += 1
+                wakeup.clear()
+                
+                for future in [future for future in running if future.done()]:
+                    free_slots.append(running.pop(future))
+                
+                # Забираем столько задач, сколько свободных слотов, одним запросом
+                tasks = []
+                if free_slots:
+                    logger.debug(f"🔄 Итерация {iteration}: Проверка наличия задач со статусом 'pending'...")
+                    tasks = claim_pending_tasks(len(free_slots))
+                for task in tasks:
+                    slot = free_slots.pop()
+                    logger.info(f"📋 Найдена задача для обработки: ID={task['id']}, тема='{task['topic']}', создана: {task['created_at']}"
+                                f"{', дубли: ' + str(task['attached_ids']) if task.get('attached_ids') else ''}")
+                    future = executor.submit(run_in_slot, slot, task)
+                    running[future] = slot
+                    future.add_done_callback(lambda _: wakeup.set())
+                
+                # Без LISTEN-подписки опрашиваем очередь часто, с ней - только на случай пропущенных уведомлений
+                poll_interval = FALLBACK_POLL_INTERVAL if listener.connected else POLL_INTERVAL
+                if free_slots and not tasks:
+                    # Если задач нет, ждем уведомления о новой задаче
+                    logger.info(f"⏳ Задач для обработки нет, ожидание новой задачи (не дольше {poll_interval} секунд)...",
+                                extra={'sample': 'worker.idle', 'iteration': iteration})
+                wakeup.wait(poll_interval)
+                
+            except KeyboardInterrupt:
+                logger.info("🛑 Получен сигнал остановки, завершение работы...")
+                stop_event.set()
+            except Exception as e:
+                logger.error(f"❌ Неожиданная ошибка в основном цикле: {str(e)}", exc_info=True)
+                # Продолжаем работу после ошибки, чтобы worker не останавливался
+                stop_event.wait(POLL_INTERVAL)
+    finally:
+        stop_event.set()
+        if running:
+            logger.info(f"⏳ Ожидание завершения {len(running)} выполняющихся задач...")
+        executor.shutdown(wait=True)
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        logger.info(f"📊 Статистика пула соединений с БД: {pool_stats()}")
+        logger.info(f"📊 Кэш поиска: {get_search_cache().stats()}")
+        logger.info(f"📊 Шаблоны crew: исследование {get_research_template(openai_llm).stats()}, "
+                    f"писатель {get_writing_template(openai_llm).stats()}")
+        close_pool()
+        logger.info("👋 Worker остановлен")
 
 
 if __name__ == '__main__':